@@ -0,0 +1,40 @@
+"""
+Доступ к админским командам
+Админские хендлеры живут в отдельном роутере с одним outer-middleware:
+апдейт не от администратора отклоняется до проверки фильтров хендлеров
+роутера и его дочерних роутеров и уходит дальше, в следующие роутеры.
+Поэтому проверка `message.from_user.id != ADMIN_ID` в самих хендлерах
+не нужна, а длинный хвост админских команд обычным пользователям ничего не стоит.
+Без admin_ids администраторы берутся из клуба апдейта (tenants)
+"""
+
+import logging
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+import tenants
+
+def admin_router(admin_ids=None, name='admin'):
+    """Роутер, в который попадают только апдейты от admin_ids (по умолчанию - админов клуба)"""
+    admin_ids = frozenset(admin_ids) if admin_ids is not None else None
+
+    async def admin_only(handler, event, data):
+        user = data.get('event_from_user')
+        allowed = admin_ids if admin_ids is not None else tenants.current().admin_ids
+        if user is None or user.id not in allowed:
+            return UNHANDLED
+        return await handler(event, data)
+
+    router = Router(name=name)
+    router.message.outer_middleware(admin_only)
+    router.callback_query.outer_middleware(admin_only)
+    return router
+
+async def notify_admins(bot, admin_ids, text, **kwargs):
+    """Отправить уведомление каждому администратору; ошибки только логируются"""
+    for admin_id in admin_ids:
+        try:
+            await bot.send_message(admin_id, text, **kwargs)
+        except Exception as e:
+            logging.error(f"Ошибка уведомления админа {admin_id}: {e}")
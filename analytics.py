@@ -0,0 +1,362 @@
+"""
+Хранилище событий воронки
+События пишутся в funnel_events, секционированную по месяцам (created_at),
+название действия хранится один раз в справочнике funnel_actions, а в событии -
+его SMALLINT id. Для отчётов есть представление funnel_analytics с прежними
+колонками (user_id, action, created_at) и клубом события (tenant_id, см. tenants),
+поэтому старые запросы работают как есть, а фильтр по времени отсекает ненужные секции.
+
+Здесь же когорты: воронка по дню первого /start и время до оплаты
+"""
+
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import Json, execute_values
+
+import tenants
+
+# Сколько месяцев хранить события (0 - хранить всё) и на сколько месяцев вперёд
+# заранее создавать секции
+ANALYTICS_RETENTION_MONTHS = int(os.getenv('ANALYTICS_RETENTION_MONTHS', 0))
+PARTITIONS_AHEAD = 2
+
+DEFAULT_PARTITION = 'funnel_events_default'
+
+# Кэш справочника действий: имя -> id
+_action_ids = {}
+
+# ============================================
+# СХЕМА
+# ============================================
+
+def init_schema(cur):
+    """Создаёт справочник, секционированную таблицу и представление.
+    Старая таблица funnel_analytics переносится в funnel_events один раз"""
+    cur.execute('''SELECT relkind FROM pg_class
+                   WHERE oid = to_regclass('funnel_analytics')''')
+    row = cur.fetchone()
+    legacy = row is not None and row['relkind'] == 'r'
+    if legacy:
+        cur.execute('ALTER TABLE funnel_analytics RENAME TO funnel_analytics_legacy')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS funnel_actions
+                 (id SMALLSERIAL PRIMARY KEY,
+                  name TEXT UNIQUE NOT NULL)''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS funnel_events
+                 (created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                  user_id BIGINT,
+                  action_id SMALLINT NOT NULL)
+                 PARTITION BY RANGE (created_at)''')
+    cur.execute(f'''CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION}
+                    PARTITION OF funnel_events DEFAULT''')
+    # События пишутся по возрастанию времени - BRIN почти ничего не весит
+    cur.execute('''CREATE INDEX IF NOT EXISTS funnel_events_created_at_brin
+                   ON funnel_events USING BRIN (created_at)''')
+
+    # Клуб события; события до появления клубов - клуба по умолчанию
+    cur.execute('''ALTER TABLE funnel_events ADD COLUMN IF NOT EXISTS tenant_id TEXT NOT NULL DEFAULT %s''',
+                (tenants.DEFAULT_TENANT,))
+
+    if legacy:
+        _migrate_legacy(cur)
+
+    cur.execute('''CREATE OR REPLACE VIEW funnel_analytics AS
+                   SELECT e.user_id, a.name AS action, e.created_at, e.tenant_id
+                   FROM funnel_events e
+                   JOIN funnel_actions a ON a.id = e.action_id''')
+
+    ensure_partitions(cur)
+    init_cohort_schema(cur)
+
+def _migrate_legacy(cur):
+    cur.execute('''INSERT INTO funnel_actions (name)
+                   SELECT DISTINCT action FROM funnel_analytics_legacy WHERE action IS NOT NULL
+                   ON CONFLICT (name) DO NOTHING''')
+    cur.execute('''SELECT DISTINCT date_trunc('month', created_at)::date AS month
+                   FROM funnel_analytics_legacy WHERE created_at IS NOT NULL''')
+    for row in cur.fetchall():
+        create_partition(cur, row['month'])
+    cur.execute('''INSERT INTO funnel_events (created_at, user_id, action_id)
+                   SELECT COALESCE(l.created_at, NOW()), l.user_id, a.id
+                   FROM funnel_analytics_legacy l
+                   JOIN funnel_actions a ON a.name = l.action''')
+    migrated = cur.rowcount
+    cur.execute('DROP TABLE funnel_analytics_legacy')
+    logging.info(f"Migrated {migrated} funnel_analytics rows to funnel_events")
+
+# ============================================
+# ЗАПИСЬ СОБЫТИЙ
+# ============================================
+
+def action_id(cur, name):
+    """id действия из справочника (новое действие добавляется при первом использовании)"""
+    cached = _action_ids.get(name)
+    if cached is not None:
+        return cached
+    cur.execute('''INSERT INTO funnel_actions (name) VALUES (%s)
+                   ON CONFLICT (name) DO NOTHING''', (name,))
+    cur.execute('SELECT id FROM funnel_actions WHERE name = %s', (name,))
+    _action_ids[name] = cur.fetchone()['id']
+    return _action_ids[name]
+
+def record(cur, user_id, action):
+    """Событие пользователя от имени текущего клуба"""
+    cur.execute('''INSERT INTO funnel_events (created_at, user_id, action_id, tenant_id)
+                   VALUES (NOW(), %s, %s, %s)''',
+                (user_id, action_id(cur, action), tenants.current().tenant_id))
+
+# ============================================
+# СЕКЦИИ
+# ============================================
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def _partition_name(month):
+    return f"funnel_events_{month.year}_{month.month:02d}"
+
+def create_partition(cur, month):
+    """Секция на месяц. События этого месяца, уже попавшие в секцию по умолчанию,
+    переносятся в новую секцию до её подключения"""
+    name = _partition_name(month)
+    cur.execute('SELECT to_regclass(%s) IS NOT NULL AS found', (name,))
+    if cur.fetchone()['found']:
+        return False
+    start, end = month, _add_months(month, 1)
+    cur.execute(f'CREATE TABLE {name} (LIKE funnel_events INCLUDING DEFAULTS)')
+    cur.execute(f'''WITH moved AS (
+                        DELETE FROM {DEFAULT_PARTITION}
+                        WHERE created_at >= %s AND created_at < %s
+                        RETURNING created_at, user_id, action_id, tenant_id
+                    )
+                    INSERT INTO {name} (created_at, user_id, action_id, tenant_id)
+                    SELECT created_at, user_id, action_id, tenant_id FROM moved''', (start, end))
+    cur.execute(f'''ALTER TABLE funnel_events ATTACH PARTITION {name}
+                    FOR VALUES FROM (%s) TO (%s)''', (start, end))
+    logging.info(f"Created partition {name}")
+    return True
+
+def ensure_partitions(cur, today=None):
+    """Секции на текущий месяц и PARTITIONS_AHEAD вперёд, плюс месяцы,
+    события которых оказались в секции по умолчанию"""
+    current = (today or date.today()).replace(day=1)
+    months = {_add_months(current, offset) for offset in range(PARTITIONS_AHEAD + 1)}
+    cur.execute(f'''SELECT DISTINCT date_trunc('month', created_at)::date AS month
+                    FROM {DEFAULT_PARTITION}''')
+    months.update(row['month'] for row in cur.fetchall())
+    return [_partition_name(month) for month in sorted(months) if create_partition(cur, month)]
+
+def drop_expired_partitions(cur, today=None):
+    """Удаляет секции целиком старше ANALYTICS_RETENTION_MONTHS"""
+    if ANALYTICS_RETENTION_MONTHS <= 0:
+        return []
+    cutoff = _add_months((today or date.today()).replace(day=1), -ANALYTICS_RETENTION_MONTHS)
+    cur.execute('''SELECT c.relname AS name
+                   FROM pg_inherits i
+                   JOIN pg_class c ON c.oid = i.inhrelid
+                   WHERE i.inhparent = 'funnel_events'::regclass''')
+    dropped = []
+    for row in cur.fetchall():
+        name = row['name']
+        if name == DEFAULT_PARTITION:
+            continue
+        year, month = name.rsplit('_', 2)[1:]
+        if date(int(year), int(month), 1) < cutoff:
+            cur.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+    return sorted(dropped)
+
+def maintain_partitions(get_db_connection):
+    """Создание будущих секций и удаление устаревших. Возвращает (созданные, удалённые)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    created = ensure_partitions(cur)
+    dropped = drop_expired_partitions(cur)
+    conn.commit()
+    cur.close()
+    conn.close()
+    if created or dropped:
+        logging.info(f"Analytics partitions: created {created}, dropped {dropped}")
+    return created, dropped
+
+# ============================================
+# КОГОРТЫ
+# ============================================
+
+# Сколько дней после первого /start ждём конверсии. Когорта дня "закрыта",
+# когда этот срок прошёл - её цифры уже не изменятся и кэшируются в cohort_cache
+COHORT_HORIZON_DAYS = int(os.getenv('COHORT_HORIZON_DAYS', 14))
+
+# Распределение времени до оплаты: (подпись, верхняя граница в часах)
+TIME_TO_PAY_BUCKETS = [('до 1ч', 1), ('1-24ч', 24), ('1-3д', 72), ('3-7д', 168), ('7д+', None)]
+
+def init_cohort_schema(cur):
+    # Кэш без клуба хранил когорты всех клубов вместе - он пересчитается заново
+    cur.execute('''SELECT to_regclass('cohort_cache') IS NOT NULL
+                          AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                          WHERE table_name = 'cohort_cache'
+                                            AND column_name = 'tenant_id') AS outdated''')
+    if cur.fetchone()['outdated']:
+        cur.execute('DROP TABLE cohort_cache')
+    cur.execute('''CREATE TABLE IF NOT EXISTS cohort_cache
+                 (tenant_id TEXT,
+                  cohort_day DATE,
+                  horizon_days INTEGER,
+                  data JSONB NOT NULL,
+                  computed_at TIMESTAMP DEFAULT NOW(),
+                  PRIMARY KEY (tenant_id, cohort_day, horizon_days))''')
+
+def _cohort_query():
+    buckets = []
+    lower = 0
+    for index, (_, upper) in enumerate(TIME_TO_PAY_BUCKETS):
+        condition = f"paid_h >= {lower}" + (f" AND paid_h < {upper}" if upper else "")
+        buckets.append(f"COUNT(*) FILTER (WHERE {condition}) AS pay_bucket_{index}")
+        lower = upper
+    return f'''
+        WITH firsts AS (
+            SELECT user_id,
+                   MIN(created_at) FILTER (WHERE action = 'started_bot') AS started,
+                   MIN(created_at) FILTER (WHERE action = 'viewed_demo') AS demo,
+                   MIN(created_at) FILTER (WHERE action = 'activated_trial') AS trial
+            FROM funnel_analytics
+            WHERE created_at >= %(scan_from)s AND created_at < %(scan_to)s
+              AND tenant_id = %(tenant)s
+              AND action IN ('started_bot', 'viewed_demo', 'activated_trial')
+            GROUP BY user_id
+        ),
+        paid AS (
+            SELECT user_id, MIN(created_at) AS paid, SUM(amount) AS revenue
+            FROM payments
+            WHERE status = 'completed'
+              AND created_at >= %(scan_from)s AND created_at < %(scan_to)s
+              AND tenant_id = %(tenant)s
+            GROUP BY user_id
+        ),
+        journeys AS (
+            SELECT DATE(f.started) AS cohort_day,
+                   CASE WHEN f.demo >= f.started AND f.demo < f.started + %(horizon)s
+                        THEN TRUE END AS demo,
+                   CASE WHEN f.trial >= f.started AND f.trial < f.started + %(horizon)s
+                        THEN EXTRACT(EPOCH FROM f.trial - f.started) / 3600 END AS trial_h,
+                   CASE WHEN p.paid >= f.started AND p.paid < f.started + %(horizon)s
+                        THEN EXTRACT(EPOCH FROM p.paid - f.started) / 3600 END AS paid_h,
+                   CASE WHEN p.paid >= f.started AND p.paid < f.started + %(horizon)s
+                        THEN p.revenue END AS revenue
+            FROM firsts f
+            LEFT JOIN paid p ON p.user_id = f.user_id
+            WHERE f.started >= %(cohort_from)s AND f.started < %(cohort_to)s
+        )
+        SELECT cohort_day,
+               COUNT(*) AS started,
+               COUNT(demo) AS demo,
+               COUNT(trial_h) AS trial,
+               COUNT(paid_h) AS paid,
+               COALESCE(SUM(revenue), 0)::float AS revenue,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY trial_h) AS trial_median_h,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY paid_h) AS paid_median_h,
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY paid_h) AS paid_p90_h,
+               {', '.join(buckets)}
+        FROM journeys
+        GROUP BY cohort_day
+    '''
+
+def _compute_cohorts(cur, first_day, last_day, horizon, tenant_id):
+    """Все когорты клуба [first_day, last_day] одним проходом по событиям и платежам"""
+    horizon_delta = timedelta(days=horizon)
+    cohort_from = datetime.combine(first_day, datetime.min.time())
+    cohort_to = datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    # Окно сканирования шире окна когорт: назад - чтобы повторный /start старого
+    # пользователя не считался новым, вперёд - чтобы увидеть конверсии в пределах срока
+    cur.execute(_cohort_query(), {
+        'scan_from': cohort_from - horizon_delta,
+        'scan_to': cohort_to + horizon_delta,
+        'cohort_from': cohort_from,
+        'cohort_to': cohort_to,
+        'horizon': horizon_delta,
+        'tenant': tenant_id,
+    })
+    result = {}
+    for row in cur.fetchall():
+        row = dict(row)
+        day = row.pop('cohort_day')
+        row['pay_buckets'] = [row.pop(f'pay_bucket_{index}') for index in range(len(TIME_TO_PAY_BUCKETS))]
+        result[day] = row
+    return result
+
+def cohorts(get_db_connection, days=14, horizon=COHORT_HORIZON_DAYS, today=None, tenant_id=None):
+    """Воронки клуба tenant_id (по умолчанию - текущего) по дням первого /start за последние days дней.
+    Закрытые дни берутся из cohort_cache, остальные считаются одним запросом.
+    Возвращает [(день, данные, закрыта ли когорта)]"""
+    today = today or date.today()
+    tenant_id = tenant_id or tenants.current().tenant_id
+    first_day = today - timedelta(days=days - 1)
+    all_days = [first_day + timedelta(days=offset) for offset in range(days)]
+    closed_before = today - timedelta(days=horizon)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''SELECT cohort_day, data FROM cohort_cache
+                   WHERE tenant_id = %s AND horizon_days = %s
+                     AND cohort_day >= %s AND cohort_day < %s''',
+                (tenant_id, horizon, first_day, closed_before))
+    cached = {row['cohort_day']: row['data'] for row in cur.fetchall()}
+
+    missing = [day for day in all_days if day not in cached]
+    computed = _compute_cohorts(cur, missing[0], missing[-1], horizon, tenant_id) if missing else {}
+
+    empty = {'started': 0, 'demo': 0, 'trial': 0, 'paid': 0, 'revenue': 0.0,
+             'trial_median_h': None, 'paid_median_h': None, 'paid_p90_h': None,
+             'pay_buckets': [0] * len(TIME_TO_PAY_BUCKETS)}
+    to_cache = [(tenant_id, day, horizon, Json(computed.get(day, empty)))
+                for day in missing if day < closed_before]
+    if to_cache:
+        execute_values(cur, '''INSERT INTO cohort_cache (tenant_id, cohort_day, horizon_days, data)
+                               VALUES %s
+                               ON CONFLICT (tenant_id, cohort_day, horizon_days)
+                               DO UPDATE SET data = EXCLUDED.data, computed_at = NOW()''',
+                       to_cache)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    return [(day, cached.get(day) or computed.get(day, empty), day < closed_before)
+            for day in all_days]
+
+def format_cohorts(rows, horizon=COHORT_HORIZON_DAYS):
+    """Таблица когорт для админа (HTML)"""
+    def pct(part, total):
+        return f"{part * 100 / total:.0f}%" if total else "-"
+
+    def hours(value):
+        if value is None:
+            return "-"
+        return f"{value:.0f}ч" if value < 48 else f"{value / 24:.1f}д"
+
+    text = (f"👥 <b>Когорты по дню первого /start</b>\n"
+            f"Конверсия в пределах {horizon} дней, * - когорта ещё открыта\n\n<pre>")
+    text += f"{'день':6} {'старт':>5} {'демо':>5} {'trial':>5} {'оплата':>6} {'медиана':>7}\n"
+    totals = {'started': 0, 'demo': 0, 'trial': 0, 'paid': 0, 'revenue': 0.0}
+    buckets = [0] * len(TIME_TO_PAY_BUCKETS)
+    for day, data, closed in rows:
+        text += (f"{day:%d.%m}{' ' if closed else '*'} {data['started']:>5} "
+                 f"{pct(data['demo'], data['started']):>5} {pct(data['trial'], data['started']):>5} "
+                 f"{pct(data['paid'], data['started']):>6} {hours(data['paid_median_h']):>7}\n")
+        for key in totals:
+            totals[key] += data[key]
+        buckets = [total + count for total, count in zip(buckets, data['pay_buckets'])]
+    text += "</pre>\n"
+
+    text += (f"<b>Итого:</b> {totals['started']} → демо {pct(totals['demo'], totals['started'])}"
+             f" → trial {pct(totals['trial'], totals['started'])}"
+             f" → оплата {pct(totals['paid'], totals['started'])}"
+             f" ({totals['revenue']:.0f}₽)\n")
+    if totals['paid']:
+        text += "\n⏱ <b>Время до оплаты:</b>\n"
+        for (label, _), count in zip(TIME_TO_PAY_BUCKETS, buckets):
+            text += f"• {label}: {count} ({pct(count, totals['paid'])})\n"
+    return text
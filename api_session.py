@@ -0,0 +1,173 @@
+"""
+HTTP-сессия Bot API
+AiohttpSession aiogram с настроенным пулом соединений (keep-alive, кэш DNS,
+лимит одновременных соединений), таймаутами по методам, повторами с джиттером
+и гистограммами задержек по методам для /perf.
+
+Повторы:
+- RetryAfter (flood control) - безопасно для любого метода: запрос не выполнен.
+  Ждём, сколько сказал Telegram, если это не дольше MAX_RETRY_AFTER, иначе
+  отдаём ошибку вызывающему;
+- 5xx - только для методов, повтор которых не создаёт дублей для пользователя:
+  не для отправки сообщений и счетов (send*, copy*, forward*) и инвайт-ссылок (NO_RETRY);
+- сетевые ошибки, включая таймаут чтения, - только для чтения (get*) и идемпотентных
+  методов (IDEMPOTENT): запрос мог дойти до Telegram и выполниться, ответ просто не дошёл.
+RetryAfter любого метода ставит на паузу и лимит отправок send_limiter того бота,
+который его получил: сессия общая для всех клубов, а flood control - на токен бота
+"""
+
+import asyncio
+import bisect
+import contextvars
+import logging
+import os
+import random
+import time
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import (TelegramEntityTooLarge, TelegramNetworkError, TelegramRetryAfter,
+                                TelegramServerError)
+
+from rate_limiter import send_limiter
+
+# Соединения с api.telegram.org: сколько держать одновременно и сколько живёт простаивающее
+API_CONNECTIONS = int(os.getenv('API_CONNECTIONS', 100))
+API_KEEPALIVE = float(os.getenv('API_KEEPALIVE', 60))
+API_DNS_TTL = int(os.getenv('API_DNS_TTL', 300))
+# Таймаут по умолчанию и по методам (с)
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 30))
+METHOD_TIMEOUTS = {
+    'answerCallbackQuery': 5,
+    'sendMessage': 15,
+    'editMessageText': 15,
+    'getChatMember': 10,
+    'banChatMember': 10,
+    'unbanChatMember': 10,
+    'createChatInviteLink': 10,
+    'revokeChatInviteLink': 10,
+    'sendInvoice': 20,
+    'sendDocument': 120,
+}
+API_RETRIES = int(os.getenv('API_RETRIES', 3))
+RETRY_BASE = 0.5
+MAX_RETRY_AFTER = float(os.getenv('MAX_RETRY_AFTER', 10))
+# Повтор после 5xx/таймаута может отправить второе сообщение, выставить второй счёт
+# или выдать вторую ссылку
+NO_RETRY = {'createChatInviteLink'}
+NO_RETRY_PREFIXES = ('send', 'copy', 'forward')
+# Повтор этих методов после сетевой ошибки безопасен, даже если первый запрос выполнился
+IDEMPOTENT = {'answerCallbackQuery', 'answerPreCheckoutQuery', 'banChatMember', 'unbanChatMember',
+              'revokeChatInviteLink', 'editMessageText', 'editMessageReplyMarkup', 'deleteMessage'}
+# Счётчик повторов текущего запроса: delivery ставит [0] перед отправкой
+# и после неё пишет число повторов в журнал доставки
+request_retries = contextvars.ContextVar('request_retries', default=None)
+# Границы корзин гистограммы задержек (мс); последняя корзина - всё, что дольше
+LATENCY_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200, 6400)
+
+def retryable(name, error):
+    """Можно ли повторить метод name после 5xx или сетевой ошибки error"""
+    if name in NO_RETRY or name.startswith(NO_RETRY_PREFIXES):
+        return False
+    # Слишком большой файл - не сетевая ошибка, повтор не поможет
+    if isinstance(error, TelegramEntityTooLarge):
+        return False
+    if isinstance(error, TelegramServerError):
+        return True
+    return name.startswith('get') or name in IDEMPOTENT
+
+class MethodStats:
+    """Гистограмма задержек и счётчики ошибок одного метода Bot API"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.calls = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self.retries = 0
+
+    def observe(self, ms):
+        self.calls += 1
+        self.total_ms += ms
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, ms)] += 1
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q"""
+        rank = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else None
+        return None
+
+class TunedSession(AiohttpSession):
+    """Сессия с пулом соединений, таймаутами по методам, повторами и метриками"""
+
+    def __init__(self, **kwargs):
+        super().__init__(timeout=API_TIMEOUT, **kwargs)
+        self._connector_init.update(
+            limit=API_CONNECTIONS,
+            keepalive_timeout=API_KEEPALIVE,
+            ttl_dns_cache=API_DNS_TTL,
+        )
+        self.stats = {}
+
+    async def make_request(self, bot, method, timeout=None):
+        name = method.__api_method__
+        if name == 'getUpdates':
+            # Long polling: своя задержка по определению и свой цикл повторов
+            return await super().make_request(bot, method, timeout=timeout)
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = MethodStats()
+        if timeout is None:
+            timeout = METHOD_TIMEOUTS.get(name, self.timeout)
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                result = await super().make_request(bot, method, timeout=timeout)
+                stats.observe((time.perf_counter() - started) * 1000)
+                return result
+            except TelegramRetryAfter as e:
+                stats.observe((time.perf_counter() - started) * 1000)
+                # Flood control действует на весь бот - притормаживаем и остальные его отправки
+                send_limiter(bot).pause(e.retry_after)
+                if attempt >= API_RETRIES or e.retry_after > MAX_RETRY_AFTER:
+                    stats.errors += 1
+                    raise
+                delay = e.retry_after + random.uniform(0, RETRY_BASE)
+            except (TelegramServerError, TelegramNetworkError) as e:
+                stats.observe((time.perf_counter() - started) * 1000)
+                if attempt >= API_RETRIES or not retryable(name, e):
+                    stats.errors += 1
+                    raise
+                # Экспоненциальная пауза с полным джиттером
+                delay = random.uniform(0, RETRY_BASE * 2 ** attempt)
+            except Exception:
+                stats.observe((time.perf_counter() - started) * 1000)
+                stats.errors += 1
+                raise
+            attempt += 1
+            stats.retries += 1
+            counter = request_retries.get()
+            if counter is not None:
+                counter[0] += 1
+            logging.warning(f"Bot API {name}: retry {attempt}/{API_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def format_report(self, limit=10):
+        """Задержки Bot API по методам (p50/p95 - верхние границы корзин)"""
+        text = "📡 <b>Bot API</b>\n"
+        items = sorted(self.stats.items(), key=lambda item: item[1].calls, reverse=True)
+        for name, stats in items[:limit]:
+            if not stats.calls:
+                continue
+            p50, p95 = stats.quantile(0.5), stats.quantile(0.95)
+            text += (f"• {name}: {stats.calls}× avg {stats.total_ms / stats.calls:.0f}ms "
+                     f"p50 ≤{p50 or '∞'} p95 ≤{p95 or '∞'}ms, "
+                     f"ошибок {stats.errors}, повторов {stats.retries}\n")
+        if not items:
+            text += "Запросов ещё не было\n"
+        return text
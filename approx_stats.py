@@ -0,0 +1,265 @@
+"""
+Приблизительная статистика для больших таблиц
+Вместо COUNT(*) и COUNT(DISTINCT) по всей истории:
+- счётчики по ключу (действие, тип отзыва), которые фоновая задача
+  дописывает инкрементально от водяного знака;
+- HyperLogLog по user_id событий: регистры считаются в самой базе за один
+  проход по новым строкам, здесь они только объединяются и оцениваются;
+- оценка числа строк из pg_class (reltuples после ANALYZE/autovacuum);
+- доли по выборке TABLESAMPLE вместо полного прохода.
+
+Счётчики и HLL ведутся отдельно для каждого клуба (tenants): источник в
+stats_counters называется '<источник>:<tenant_id>'.
+
+Стандартная ошибка HyperLogLog при HLL_PRECISION = 14 - 1.04 / sqrt(2^14) ≈ 0.8%
+"""
+
+import itertools
+import logging
+import math
+import os
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+import tenants
+
+# APPROX_STATS=1 - отчёты по умолчанию приблизительные (точные - с аргументом exact)
+APPROX_STATS = os.getenv('APPROX_STATS', '0') == '1'
+HLL_PRECISION = 14
+HLL_ERROR = 1.04 / math.sqrt(1 << HLL_PRECISION)
+# Свежий хвост не учитываем, пока не закоммичены все строки с таким временем
+COUNTER_LAG = timedelta(minutes=5)
+# Первичное заполнение идёт окнами, чтобы прогресс сохранялся по частям
+COUNTER_CHUNK = timedelta(days=7)
+# Размер выборки для долей (статусы подписок) в приблизительном /checkdb
+SAMPLE_ROWS = 100000
+
+# Источники счётчиков: что считаем, по какому ключу и по какой колонке времени.
+# В каждой таблице есть tenant_id - счётчики считаются по клубам
+SOURCES = {
+    'events': {'table': 'funnel_analytics', 'key': 'action', 'time': 'created_at', 'distinct': 'user_id'},
+    'feedback': {'table': 'feedback', 'key': 'feedback_type', 'time': 'created_at', 'distinct': None},
+}
+
+# ============================================
+# HYPERLOGLOG
+# ============================================
+
+class HyperLogLog:
+    """Регистры HLL: 2^precision байт, в каждом - максимальный ранг (ведущие нули + 1)"""
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+
+    def add_hash(self, value):
+        """Добавить 64-битный хэш (так же, как это делает register_query в базе)"""
+        value &= (1 << 64) - 1
+        index = value & (self.m - 1)
+        rest = value >> self.precision
+        width = 64 - self.precision
+        rank = width - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge_registers(self, rows):
+        """Объединить регистры [(индекс, ранг)] - результат register_query"""
+        for index, rank in rows:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        # Малые значения - линейный подсчёт по пустым регистрам
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+def register_query(table, column, time_column):
+    """SQL: регистры HLL по column для строк клуба %(tenant)s в окне (since, until].
+    Хэш - hashtextextended (64 бита), ранг - позиция первой единицы в оставшихся битах"""
+    width = 64 - HLL_PRECISION
+    return f'''
+        SELECT (h & {(1 << HLL_PRECISION) - 1})::int AS index,
+               MAX(CASE WHEN w = 0 THEN {width + 1}
+                        ELSE position('1' in w::bit({width})::text) END) AS rank
+        FROM (SELECT hashtextextended({column}::text, 0) AS h,
+                     (hashtextextended({column}::text, 0) >> {HLL_PRECISION})
+                         & {(1 << width) - 1} AS w
+              FROM {table}
+              WHERE tenant_id = %(tenant)s
+                AND {time_column} > %(since)s AND {time_column} <= %(until)s) hashed
+        GROUP BY 1
+    '''
+
+# ============================================
+# СХЕМА И ОБНОВЛЕНИЕ СЧЁТЧИКОВ
+# ============================================
+
+def init_schema(cur):
+    cur.execute('''CREATE TABLE IF NOT EXISTS stats_counters
+                 (source TEXT,
+                  key TEXT,
+                  value BIGINT NOT NULL DEFAULT 0,
+                  PRIMARY KEY (source, key))''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS stats_counter_marks
+                 (source TEXT PRIMARY KEY,
+                  watermark TIMESTAMP NOT NULL,
+                  first_seen TIMESTAMP,
+                  last_seen TIMESTAMP,
+                  registers BYTEA,
+                  updated_at TIMESTAMP DEFAULT NOW())''')
+    # Счётчики до разделения по клубам (источник без клуба) считали все клубы вместе -
+    # их заменят счётчики по клубам, заново собранные с начала истории
+    for table in ('stats_counters', 'stats_counter_marks'):
+        cur.execute(f'DELETE FROM {table} WHERE source = ANY(%s)', (list(SOURCES),))
+
+def source_name(name, tenant_id):
+    """Имя источника счётчиков клуба в stats_counters"""
+    return f"{name}:{tenant_id}"
+
+def _refresh_chunk(cur, name, source, tenant_id, until):
+    """Одно окно (водяной знак, min(until, +COUNTER_CHUNK)] в одной транзакции.
+    Строка водяного знака блокируется, так что параллельный проход (например, поток
+    задачи, переживший таймаут) не посчитает то же окно второй раз.
+    Возвращает новый водяной знак"""
+    cur.execute('''SELECT watermark, registers FROM stats_counter_marks
+                   WHERE source = %s FOR UPDATE''', (name,))
+    mark = cur.fetchone()
+    since = mark['watermark']
+    if since >= until:
+        return since
+    chunk_end = min(until, since + COUNTER_CHUNK)
+    params = {'since': since, 'until': chunk_end, 'tenant': tenant_id}
+
+    cur.execute(f'''SELECT {source['key']} AS key, COUNT(*) AS count, MAX({source['time']}) AS last
+                    FROM {source['table']}
+                    WHERE tenant_id = %(tenant)s
+                      AND {source['time']} > %(since)s AND {source['time']} <= %(until)s
+                    GROUP BY 1''', params)
+    rows = cur.fetchall()
+    if rows:
+        execute_values(cur, '''INSERT INTO stats_counters (source, key, value) VALUES %s
+                              ON CONFLICT (source, key)
+                              DO UPDATE SET value = stats_counters.value + EXCLUDED.value''',
+                       [(name, row['key'] or '', row['count']) for row in rows])
+    last_seen = max((row['last'] for row in rows), default=None)
+
+    registers = None
+    if source['distinct'] and rows:
+        sketch = HyperLogLog(registers=mark['registers'])
+        cur.execute(register_query(source['table'], source['distinct'], source['time']), params)
+        sketch.merge_registers((row['index'], row['rank']) for row in cur.fetchall())
+        registers = bytes(sketch.registers)
+
+    cur.execute('''UPDATE stats_counter_marks
+                   SET watermark = %s,
+                       last_seen = GREATEST(last_seen, %s),
+                       registers = COALESCE(%s, registers),
+                       updated_at = NOW()
+                   WHERE source = %s''', (chunk_end, last_seen, registers, name))
+    return chunk_end
+
+def refresh_counters(get_db_connection):
+    """Дописать счётчики и HLL каждого клуба от водяного знака до (сейчас - COUNTER_LAG)"""
+    for (source_id, source), tenant in itertools.product(SOURCES.items(), tenants.all_tenants()):
+        name = source_name(source_id, tenant.tenant_id)
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''SELECT to_regclass(%s) IS NOT NULL AS found,
+                                  EXISTS (SELECT 1 FROM stats_counter_marks WHERE source = %s) AS marked''',
+                        (source['table'], name))
+            state = cur.fetchone()
+            if not state['found']:
+                # Таблица ещё не создана (например, feedback до первого опроса)
+                conn.rollback()
+                continue
+            if not state['marked']:
+                cur.execute(f'''SELECT MIN({source['time']}) AS first FROM {source['table']}
+                                WHERE tenant_id = %s''', (tenant.tenant_id,))
+                first = cur.fetchone()['first']
+                if first is None:
+                    conn.rollback()
+                    continue
+                cur.execute('''INSERT INTO stats_counter_marks (source, watermark, first_seen)
+                               VALUES (%s, %s, %s)
+                               ON CONFLICT (source) DO NOTHING''',
+                            (name, first - timedelta(seconds=1), first))
+                conn.commit()
+
+            cur.execute('SELECT LOCALTIMESTAMP - %s AS until', (COUNTER_LAG,))
+            until = cur.fetchone()['until']
+            chunks = 1
+            while _refresh_chunk(cur, name, source, tenant.tenant_id, until) < until:
+                conn.commit()
+                chunks += 1
+            conn.commit()
+            if chunks > 1:
+                logging.info(f"Stats counters {name}: caught up in {chunks} chunks")
+        finally:
+            cur.close()
+            conn.close()
+
+# ============================================
+# ЧТЕНИЕ
+# ============================================
+
+def estimated_rows(cur, table):
+    """Оценка числа строк из pg_class, для секционированных таблиц - сумма по секциям"""
+    cur.execute('''SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint AS estimate
+                   FROM pg_class c
+                   WHERE c.oid = to_regclass(%s)
+                      OR c.oid IN (SELECT inhrelid FROM pg_inherits
+                                   WHERE inhparent = to_regclass(%s))''', (table, table))
+    return cur.fetchone()['estimate']
+
+def sample_clause(estimate):
+    """TABLESAMPLE так, чтобы в выборку попало около SAMPLE_ROWS строк; для малых таблиц - без выборки.
+    Возвращает (условие для FROM, множитель для пересчёта на всю таблицу)"""
+    if estimate <= SAMPLE_ROWS:
+        return '', 1.0
+    percent = 100.0 * SAMPLE_ROWS / estimate
+    return f'TABLESAMPLE SYSTEM ({percent:.6f})', 100.0 / percent
+
+def estimated_tenant_rows(cur, table, tenant_id):
+    """Оценка числа строк клуба: оценка pg_class, умноженная на долю клуба в выборке"""
+    sample, scale = sample_clause(estimated_rows(cur, table))
+    cur.execute(f'SELECT COUNT(*) AS count FROM {table} {sample} WHERE tenant_id = %s', (tenant_id,))
+    return int(round(cur.fetchone()['count'] * scale))
+
+def counters(cur, name, tenant_id=None):
+    """{ключ: значение} и отметки источника клуба tenant_id (по умолчанию - текущего):
+    first_seen, last_seen, watermark, оценка уникальных"""
+    name = source_name(name, tenant_id or tenants.current().tenant_id)
+    cur.execute('SELECT key, value FROM stats_counters WHERE source = %s ORDER BY value DESC', (name,))
+    values = {row['key']: row['value'] for row in cur.fetchall()}
+    cur.execute('''SELECT watermark, first_seen, last_seen, registers
+                   FROM stats_counter_marks WHERE source = %s''', (name,))
+    mark = cur.fetchone()
+    info = {'watermark': None, 'first_seen': None, 'last_seen': None, 'distinct': None}
+    if mark:
+        info.update(watermark=mark['watermark'], first_seen=mark['first_seen'], last_seen=mark['last_seen'])
+        if mark['registers']:
+            info['distinct'] = HyperLogLog(registers=mark['registers']).count()
+    return values, info
+
+def wants_approx(text):
+    """Режим по аргументам команды: ~ / approx - приблизительно, exact - точно"""
+    args = set(text.split()[1:]) if text else set()
+    if args & {'~', 'approx'}:
+        return True
+    if 'exact' in args:
+        return False
+    return APPROX_STATS
+
+def error_note(watermark=None):
+    note = f"\n≈ приблизительно: счётчики, оценка pg_class и HLL (±{HLL_ERROR * 100:.1f}%, 1σ)"
+    if watermark:
+        note += f", события до {watermark:%d.%m %H:%M}"
+    return note
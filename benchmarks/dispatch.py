@@ -0,0 +1,150 @@
+"""
+Микробенчмарк диспетчеризации callback-кнопок
+Сравнивает стоимость выбора хендлера для одного callback_query:
+- flat: все кнопки бота одним списком F.data == ... / F.data.startswith(...)
+  в одном роутере (как было, когда хендлеры жили в bot.py);
+- indexed: роутеры handlers/ с CallbackIndex;
+- guarded: то же, но админские роутеры внутри роутера admin_guard, как в
+  handlers.ROUTERS (апдейты идут от обычных пользователей).
+
+Маршруты берутся из настоящих роутеров, хендлеры заменены пустышками, так что
+меряется только путь апдейта через диспетчер (middleware, FSM, фильтры).
+База и Bot API не нужны.
+
+Пример:
+    python benchmarks/dispatch.py --updates 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+import admin_guard
+import db_profiler
+from callback_index import CallbackIndex
+from handlers import feedback, onboarding, payments, faq, broadcast, admin_stats
+
+# Роутеры с CallbackIndex в порядке подключения (handlers.ROUTERS)
+INDEXED_MODULES = (onboarding, payments, faq, broadcast, admin_stats)
+ADMIN_MODULES = (broadcast, admin_stats)
+
+async def noop(callback):
+    return True
+
+def collect_routes():
+    """[(роутер, вид, значение, фильтры)] всех кнопок в порядке подключения роутеров"""
+    routes = []
+    for module in INDEXED_MODULES:
+        for kind, value, entry in module.callbacks.routes():
+            routes.append((module.router.name, kind, value, [item.callback for item in entry.filters or []]))
+    return routes
+
+def build_flat(routes, tail):
+    router = Router(name='flat')
+    for _, kind, value, filters in routes:
+        data_filter = F.data == value if kind == 'exact' else F.data.startswith(value)
+        router.callback_query.register(noop, data_filter, *filters)
+    return [router, tail()]
+
+def build_indexed(routes, tail, guarded=False):
+    indexes = {}
+    for name, kind, value, filters in routes:
+        if name not in indexes:
+            indexes[name] = CallbackIndex(Router(name=name))
+        index = indexes[name]
+        register = index.exact if kind == 'exact' else index.prefix
+        register(value, *filters)(noop)
+    routers = [index.router for index in indexes.values()]
+    if not guarded:
+        return routers + [tail()]
+    # Админ в бенчмарке один и ни один апдейт не от него
+    admin_names = {module.router.name for module in ADMIN_MODULES}
+    admin = admin_guard.admin_router({1})
+    admin.include_routers(*[router for router in routers if router.name in admin_names])
+    return [router for router in routers if router.name not in admin_names] + [tail(), admin]
+
+def feedback_tail():
+    """Роутер обратной связи не индексирован - одинаков во всех вариантах"""
+    router = Router(name='feedback')
+    for handler in feedback.callback_query.handlers:
+        router.callback_query.register(noop, *[item.callback for item in handler.filters or []])
+    return router
+
+def make_update(update_id, data):
+    return Update.model_validate({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': '1', 'data': data,
+            'from': {'id': 1000 + update_id % 100, 'is_bot': False, 'first_name': 'Bench'},
+            'message': {'message_id': 1, 'date': 0, 'text': '...',
+                        'chat': {'id': 1000 + update_id % 100, 'type': 'private'}},
+        },
+    })
+
+async def measure(routers, bot, samples, repeat):
+    dp = Dispatcher(storage=MemoryStorage())
+    db_profiler.setup_middleware(dp)
+    dp.include_routers(*routers)
+    updates = [make_update(index, data) for index, data in enumerate(samples)]
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(updates) * 1e6
+
+async def run(args):
+    bot = Bot(token=os.environ['BOT_TOKEN'])
+    routes = collect_routes()
+    values = [value if kind == 'exact' else value + 'x' for _, kind, value, _ in routes]
+    workloads = {
+        'uniform': [values[index % len(values)] for index in range(args.updates)],
+        'last_route': [values[-1]] * args.updates,
+        'unknown': ['no_such_button'] * args.updates,
+    }
+    report = {'routes': len(routes), 'updates': args.updates, 'us_per_update': {}}
+    for name, samples in workloads.items():
+        flat = await measure(build_flat(routes, feedback_tail), bot, samples, args.repeat)
+        indexed = await measure(build_indexed(routes, feedback_tail), bot, samples, args.repeat)
+        guarded = await measure(build_indexed(routes, feedback_tail, guarded=True), bot, samples, args.repeat)
+        report['us_per_update'][name] = {'flat': round(flat, 1), 'indexed': round(indexed, 1),
+                                         'guarded': round(guarded, 1)}
+    await bot.session.close()
+    return report
+
+def print_report(report):
+    print(f"Кнопок: {report['routes']}, апдейтов на прогон: {report['updates']}")
+    print(f"{'workload':12} {'flat, мкс':>10} {'indexed, мкс':>13} {'guarded, мкс':>13} {'ускорение':>10}")
+    for name, row in report['us_per_update'].items():
+        print(f"{name:12} {row['flat']:>10} {row['indexed']:>13} {row['guarded']:>13} "
+              f"{row['flat'] / row['guarded']:>9.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=5000, help='апдейтов на прогон')
+    parser.add_argument('--repeat', type=int, default=3, help='прогонов, берётся лучший')
+    parser.add_argument('--json', help='сохранить отчёт в JSON-файл')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
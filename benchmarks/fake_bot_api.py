@@ -0,0 +1,157 @@
+"""
+Локальная заглушка Telegram Bot API на aiohttp для бенчмарков
+Отвечает на методы, которые использует бот, отдаёт апдейты через getUpdates
+и считает все вызовы
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {'id': 100000, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+
+def _parse(value):
+    """aiogram отправляет сложные поля как JSON-строки"""
+    if isinstance(value, str) and value[:1] in '{[':
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+class FakeBotAPI:
+    """Заглушка Bot API: очередь апдейтов + журнал вызовов"""
+
+    def __init__(self, host='127.0.0.1', port=8089, latency=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls = Counter()
+        self.invoices = {}
+        self._invoice_waiters = {}
+        self._updates = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # ---------- управление ----------
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def push_update(self, kind, payload):
+        """Кладёт апдейт в очередь getUpdates, возвращает (update_id, время постановки)"""
+        update_id = next(self._update_ids)
+        self._updates.put_nowait({'update_id': update_id, kind: payload})
+        return update_id, time.perf_counter()
+
+    async def wait_invoice(self, chat_id, timeout=30):
+        """Ждёт отправки счёта пользователю, возвращает payload счёта"""
+        if chat_id in self.invoices:
+            return self.invoices.pop(chat_id)
+        waiter = asyncio.get_running_loop().create_future()
+        self._invoice_waiters[chat_id] = waiter
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            self._invoice_waiters.pop(chat_id, None)
+            self.invoices.pop(chat_id, None)
+
+    # ---------- генераторы объектов ----------
+
+    def user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}',
+                'username': f'user{user_id}'}
+
+    def message(self, chat_id, text=None, from_user=None, **extra):
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'},
+                   'from': from_user or BOT_USER}
+        if text is not None:
+            message['text'] = text
+        message.update(extra)
+        return message
+
+    # ---------- обработка методов ----------
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        params = {key: _parse(value) for key, value in (await request.post()).items()}
+        self.calls[method] += 1
+
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(params)})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        handler = getattr(self, f'_method_{method}', None)
+        result = handler(params) if handler else True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, params):
+        timeout = float(params.get('timeout') or 0)
+        limit = int(params.get('limit') or 100)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout or 0.001))
+        except asyncio.TimeoutError:
+            return updates
+        while len(updates) < limit and not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    def _method_getMe(self, params):
+        return BOT_USER
+
+    def _method_sendMessage(self, params):
+        return self.message(int(params['chat_id']), params.get('text', ''))
+
+    def _method_editMessageText(self, params):
+        return self.message(int(params.get('chat_id') or 0), params.get('text', ''))
+
+    def _method_sendDocument(self, params):
+        return self.message(int(params['chat_id']))
+
+    def _method_sendInvoice(self, params):
+        chat_id = int(params['chat_id'])
+        waiter = self._invoice_waiters.get(chat_id)
+        if waiter and not waiter.done():
+            waiter.set_result(params['payload'])
+        else:
+            self.invoices[chat_id] = params['payload']
+        return self.message(chat_id, invoice={
+            'title': params.get('title', ''), 'description': params.get('description', ''),
+            'start_parameter': 'subscription', 'currency': params.get('currency', 'RUB'),
+            'total_amount': 0,
+        })
+
+    def _method_createChatInviteLink(self, params):
+        return {'invite_link': f'https://t.me/+fake{next(self._message_ids)}',
+                'creator': BOT_USER, 'creates_join_request': False,
+                'is_primary': False, 'is_revoked': False,
+                'member_limit': params.get('member_limit')}
+
+    def _method_revokeChatInviteLink(self, params):
+        link = self._method_createChatInviteLink(params)
+        link.update(invite_link=params.get('invite_link'), is_revoked=True)
+        return link
+
+    def _method_getChatMember(self, params):
+        return {'status': 'member', 'user': self.user(int(params['user_id']))}
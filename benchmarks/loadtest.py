@@ -0,0 +1,275 @@
+"""
+Нагрузочный тест хендлеров бота
+Запускает dp против локальной заглушки Bot API и локального PostgreSQL,
+проигрывает синтетические пути /start → демо → trial → счёт → оплата
+и печатает пропускную способность, p50/p99 по хендлерам и число соединений с БД
+
+Пример:
+    BENCH_DATABASE_URL=postgresql://localhost/razvitie_bench \\
+        python benchmarks/loadtest.py --users 200 --rate 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Конфигурация бота должна быть задана до импорта модулей бота
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('CHANNEL_ID', '-1000000000001')
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ['DATABASE_URL'] = os.getenv('BENCH_DATABASE_URL', 'postgresql://localhost/razvitie_bench')
+
+from aiogram.client.telegram import TelegramAPIServer
+
+import db_profiler
+from api_session import TunedSession
+from config import TARIFFS
+from db import init_db, get_db_connection
+from fake_bot_api import FakeBotAPI
+from handlers import setup_routers
+from loader import bot, dp
+
+# Синтетические пользователи живут в отдельном диапазоне id, чтобы их можно было удалить
+SYNTHETIC_USER_BASE = 9_000_000_000
+SYNTHETIC_TABLES = ('users', 'payments', 'funnel_events', 'funnel_messages', 'funnel_progress',
+                    'welcome_messages', 'notifications', 'feedback')
+
+# ============================================
+# МЕТРИКИ
+# ============================================
+
+class Metrics:
+    """Время хендлеров и сквозная задержка апдейтов"""
+
+    def __init__(self):
+        self.enqueued = {}
+        self.handler_ms = defaultdict(list)
+        self.e2e_ms = defaultdict(list)
+        self.errors = 0
+        self.db_backends_peak = 0
+
+    async def middleware(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            finished = time.perf_counter()
+            self.handler_ms[name].append((finished - started) * 1000)
+            update = data.get('event_update')
+            enqueued = self.enqueued.pop(update.update_id, None) if update else None
+            if enqueued is not None:
+                self.e2e_ms[name].append((finished - enqueued) * 1000)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+# ============================================
+# СИНТЕТИЧЕСКИЕ ПУТИ ПОЛЬЗОВАТЕЛЕЙ
+# ============================================
+
+class Journey:
+    """Путь одного пользователя от /start до оплаты"""
+
+    def __init__(self, api, metrics, user_id, think_time, tariff):
+        self.api = api
+        self.metrics = metrics
+        self.user_id = user_id
+        self.user = api.user(user_id)
+        self.think_time = think_time
+        self.tariff = tariff
+
+    def _push(self, kind, payload):
+        update_id, enqueued = self.api.push_update(kind, payload)
+        self.metrics.enqueued[update_id] = enqueued
+
+    async def _pause(self):
+        if self.think_time:
+            await asyncio.sleep(self.think_time)
+
+    def command(self, text):
+        self._push('message', self.api.message(self.user_id, text, from_user=self.user,
+                                               entities=[{'type': 'bot_command', 'offset': 0,
+                                                          'length': len(text)}]))
+
+    def callback(self, data):
+        self._push('callback_query', {
+            'id': f'{self.user_id}:{data}', 'from': self.user, 'chat_instance': str(self.user_id),
+            'data': data, 'message': self.api.message(self.user_id, '...'),
+        })
+
+    async def run(self):
+        self.command('/start')
+        for data in ('show_demo', 'ready_for_trial', 'trial', 'show_tariffs', self.tariff):
+            await self._pause()
+            self.callback(data)
+
+        payload = await self.api.wait_invoice(self.user_id)
+        amount = TARIFFS[self.tariff.replace('_confirmed', '')]['price'] * 100
+        await self._pause()
+        self._push('pre_checkout_query', {
+            'id': f'pcq{self.user_id}', 'from': self.user, 'currency': 'RUB',
+            'total_amount': amount, 'invoice_payload': payload,
+        })
+        await self._pause()
+        self._push('message', self.api.message(self.user_id, from_user=self.user, successful_payment={
+            'currency': 'RUB', 'total_amount': amount, 'invoice_payload': payload,
+            'telegram_payment_charge_id': f'tg{self.user_id}',
+            'provider_payment_charge_id': f'yk{self.user_id}',
+        }))
+
+# ============================================
+# ЗАПУСК
+# ============================================
+
+def cleanup_synthetic_users():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    for table in SYNTHETIC_TABLES:
+        cur.execute(f'DELETE FROM {table} WHERE user_id >= %s', (SYNTHETIC_USER_BASE,))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def count_db_backends():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT COUNT(*) as count FROM pg_stat_activity WHERE datname = current_database()')
+    count = cur.fetchone()['count']
+    cur.close()
+    conn.close()
+    return count - 1
+
+async def sample_db_backends(metrics, stop):
+    while not stop.is_set():
+        metrics.db_backends_peak = max(metrics.db_backends_peak,
+                                       await asyncio.to_thread(count_db_backends))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+async def wait_drained(metrics, timeout):
+    deadline = time.perf_counter() + timeout
+    while metrics.enqueued and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+async def run(args):
+    api = FakeBotAPI(port=args.port, latency=args.api_latency / 1000)
+    await api.start()
+
+    bot.session = TunedSession(api=TelegramAPIServer.from_base(api.base_url))
+    setup_routers(dp)
+
+    metrics = Metrics()
+    for observer in (dp.message, dp.callback_query, dp.pre_checkout_query):
+        observer.middleware(metrics.middleware)
+
+    init_db()
+    cleanup_synthetic_users()
+    db_profiler.reset()
+
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False,
+                                                   close_bot_session=False))
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_db_backends(metrics, stop_sampling))
+
+    tariffs = ('1month', 'forever_confirmed')
+    started = time.perf_counter()
+    journeys = []
+    for index in range(args.users):
+        journey = Journey(api, metrics, SYNTHETIC_USER_BASE + index, args.think / 1000,
+                          tariffs[index % len(tariffs)])
+        journeys.append(asyncio.create_task(journey.run()))
+        await asyncio.sleep(1 / args.rate)
+
+    results = await asyncio.gather(*journeys, return_exceptions=True)
+    await wait_drained(metrics, timeout=30)
+    elapsed = time.perf_counter() - started
+
+    stop_sampling.set()
+    await sampler
+    await dp.stop_polling()
+    await polling
+    await bot.session.close()
+    await api.stop()
+
+    if not args.keep:
+        cleanup_synthetic_users()
+
+    failed_journeys = sum(1 for result in results if isinstance(result, Exception))
+    handled = sum(len(values) for values in metrics.handler_ms.values())
+    report = {
+        'users': args.users,
+        'rate': args.rate,
+        'elapsed_s': round(elapsed, 2),
+        'updates_handled': handled,
+        'throughput_ups': round(handled / elapsed, 1) if elapsed else 0,
+        'failed_journeys': failed_journeys,
+        'handler_errors': metrics.errors,
+        'lost_updates': len(metrics.enqueued),
+        'db_connections_opened': db_profiler.connections_opened(),
+        'db_backends_peak': metrics.db_backends_peak,
+        'api_calls': dict(api.calls),
+        'handlers': {
+            name: {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50), 2),
+                'p99_ms': round(percentile(values, 99), 2),
+                'e2e_p50_ms': round(percentile(metrics.e2e_ms[name], 50), 2),
+                'e2e_p99_ms': round(percentile(metrics.e2e_ms[name], 99), 2),
+            }
+            for name, values in sorted(metrics.handler_ms.items())
+        },
+    }
+    return report
+
+def print_report(report):
+    print(f"Пользователей: {report['users']} @ {report['rate']}/с, "
+          f"время: {report['elapsed_s']}с")
+    print(f"Апдейтов: {report['updates_handled']} "
+          f"({report['throughput_ups']}/с), ошибок хендлеров: {report['handler_errors']}, "
+          f"сорванных путей: {report['failed_journeys']}, потеряно: {report['lost_updates']}")
+    print(f"Соединений с БД открыто: {report['db_connections_opened']}, "
+          f"пик бэкендов: {report['db_backends_peak']}")
+    print()
+    print(f"{'handler':36} {'count':>6} {'p50':>8} {'p99':>8} {'e2e p50':>9} {'e2e p99':>9}")
+    for name, row in report['handlers'].items():
+        print(f"{name:36} {row['count']:>6} {row['p50_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['e2e_p50_ms']:>9} {row['e2e_p99_ms']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help='число синтетических пользователей')
+    parser.add_argument('--rate', type=float, default=10, help='новых пользователей в секунду')
+    parser.add_argument('--think', type=float, default=50, help='пауза между шагами пути, мс')
+    parser.add_argument('--api-latency', type=float, default=0, help='задержка ответа Bot API, мс')
+    parser.add_argument('--port', type=int, default=8089, help='порт заглушки Bot API')
+    parser.add_argument('--json', help='сохранить отчёт в JSON-файл')
+    parser.add_argument('--keep', action='store_true', help='не удалять синтетических пользователей')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
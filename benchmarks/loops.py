@@ -0,0 +1,271 @@
+"""
+Микробенчмарки фоновых циклов на больших таблицах
+Засевает 10k / 100k / 1M синтетических пользователей, строк воронки и платежей,
+прогоняет один проход sales_funnel, check_and_remove_expired, напоминаний
+о неоплаченных счетах и рассылки против заглушки Bot API и записывает время,
+число запросов и пиковый RSS.
+
+Результаты дописываются в benchmarks/results/loops.jsonl с хэшем коммита,
+чтобы сравнивать коммиты между собой.
+
+ВНИМАНИЕ: база BENCH_DATABASE_URL должна быть отдельной - таблицы очищаются.
+
+Примеры:
+    python benchmarks/loops.py run --sizes 10000,100000
+    python benchmarks/loops.py compare            # два последних коммита
+    python benchmarks/loops.py compare abc123 def456
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(BENCH_DIR, 'results', 'loops.jsonl')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('CHANNEL_ID', '-1000000000001')
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ['DATABASE_URL'] = os.getenv('BENCH_DATABASE_URL', 'postgresql://localhost/razvitie_bench')
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+LOOPS = ('sales_funnel', 'check_and_remove_expired', 'remind_pending_payments', 'execute_broadcast')
+SEED_TABLES = ('users', 'payments', 'funnel_messages', 'funnel_progress', 'funnel_events',
+               'notifications', 'welcome_messages')
+SYNTHETIC_USER_BASE = 9_000_000_000
+
+# ============================================
+# ЗАСЕВ ДАННЫХ
+# ============================================
+
+SEED_USERS = '''
+    INSERT INTO users (user_id, username, subscription_until, tariff, created_at)
+    SELECT %(base)s + i, 'bench' || i,
+           c + CASE WHEN i %% 3 = 2 AND i %% 2 = 0 THEN INTERVAL '30 days'
+                    WHEN i %% 3 = 2 THEN INTERVAL '36500 days'
+                    ELSE INTERVAL '7 days' END,
+           CASE WHEN i %% 3 = 2 AND i %% 2 = 0 THEN '1month'
+                WHEN i %% 3 = 2 THEN 'forever'
+                ELSE 'trial' END,
+           c
+    FROM (SELECT i,
+                 LOCALTIMESTAMP - CASE i %% 3
+                     WHEN 0 THEN make_interval(hours => i %% 168)
+                     WHEN 1 THEN make_interval(hours => 168 + i %% 240)
+                     ELSE make_interval(hours => i %% 1440) END AS c
+          FROM generate_series(0, %(n)s - 1) AS i) s
+'''
+
+# Часть воронки уже пройдена: day1 (бит 0) отправлен половине trial-пользователей
+SEED_FUNNEL = '''
+    INSERT INTO funnel_progress (user_id, sent_mask, stage_times)
+    SELECT user_id, 1, ARRAY[created_at + INTERVAL '21 hours']
+    FROM users
+    WHERE tariff = 'trial' AND user_id %% 2 = 0
+      AND created_at < LOCALTIMESTAMP - INTERVAL '21 hours'
+'''
+
+SEED_PAYMENTS = '''
+    INSERT INTO payments (payment_id, user_id, amount, tariff, status, yookassa_id, created_at)
+    SELECT user_id || '_' || tariff || '_bench', user_id,
+           CASE tariff WHEN '1month' THEN 199 ELSE 599 END, tariff,
+           'completed', 'yk' || user_id, created_at
+    FROM users WHERE tariff != 'trial'
+    UNION ALL
+    SELECT user_id || '_1month_pending', user_id, 199, '1month', 'pending', NULL,
+           LOCALTIMESTAMP - make_interval(mins => (60 + user_id %% 60)::int)
+    FROM users WHERE tariff = 'trial' AND user_id %% 20 = 0
+'''
+
+SEED_ANALYTICS = '''
+    INSERT INTO funnel_events (created_at, user_id, action_id)
+    SELECT u.created_at + make_interval(mins => a.n::int), u.user_id, fa.id
+    FROM users u,
+         unnest(ARRAY['started_bot', 'viewed_demo', 'activated_trial']) WITH ORDINALITY AS a(action, n)
+         JOIN funnel_actions fa ON fa.name = a.action
+'''
+
+SEED_ACTIONS = '''
+    INSERT INTO funnel_actions (name)
+    VALUES ('started_bot'), ('viewed_demo'), ('activated_trial')
+    ON CONFLICT (name) DO NOTHING
+'''
+
+def seed(size):
+    import analytics
+    from db import init_db, get_db_connection
+
+    init_db()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('TRUNCATE ' + ', '.join(SEED_TABLES))
+    params = {'base': SYNTHETIC_USER_BASE, 'n': size}
+    for query in (SEED_USERS, SEED_FUNNEL, SEED_PAYMENTS, SEED_ACTIONS, SEED_ANALYTICS):
+        cur.execute(query, params)
+    # События старше текущего месяца попали в секцию по умолчанию - раскладываем по месяцам
+    analytics.ensure_partitions(cur)
+    conn.commit()
+    cur.execute('ANALYZE')
+    conn.commit()
+    cur.close()
+    conn.close()
+
+# ============================================
+# ОДИН ПРОХОД ЦИКЛА (в отдельном процессе ради честного пикового RSS)
+# ============================================
+
+async def run_loop_once(loop_name):
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import db_profiler
+    import jobs
+    from api_session import TunedSession
+    from fake_bot_api import FakeBotAPI
+    from handlers import broadcast
+    from loader import bot
+
+    api = FakeBotAPI(port=int(os.getenv('BENCH_API_PORT', 8090)))
+    await api.start()
+    bot.session = TunedSession(api=TelegramAPIServer.from_base(api.base_url))
+    db_profiler.reset()
+
+    started = time.perf_counter()
+    if loop_name == 'sales_funnel':
+        await jobs.sales_funnel_pass()
+    elif loop_name == 'check_and_remove_expired':
+        await jobs.check_and_remove_expired_pass()
+    elif loop_name == 'remind_pending_payments':
+        await jobs.remind_pending_payments_pass()
+    elif loop_name == 'execute_broadcast':
+        users = broadcast.get_broadcast_recipients('active')
+        await broadcast.send_broadcast(users, 'Benchmark broadcast')
+    else:
+        raise ValueError(f"Unknown loop: {loop_name}")
+    wall = time.perf_counter() - started
+
+    await bot.session.close()
+    await api.stop()
+
+    return {
+        'wall_s': round(wall, 3),
+        'queries': db_profiler.total_queries(),
+        'db_connections': db_profiler.connections_opened(),
+        'api_calls': sum(api.calls.values()),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+# ============================================
+# ХРАНЕНИЕ И СРАВНЕНИЕ РЕЗУЛЬТАТОВ
+# ============================================
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return git('rev-parse', '--short', 'HEAD') or 'unknown', bool(git('status', '--porcelain', '--', '*.py'))
+
+def save_result(record):
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, 'a') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def load_results():
+    if not os.path.exists(RESULTS_FILE):
+        return []
+    with open(RESULTS_FILE) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(commits):
+    results = load_results()
+    if not commits:
+        seen = []
+        for record in results:
+            if record['commit'] not in seen:
+                seen.append(record['commit'])
+        commits = seen[-2:]
+    if not commits:
+        print("Нет сохранённых результатов")
+        return
+
+    # Последний результат для каждого (коммит, цикл, размер)
+    latest = {}
+    for record in results:
+        if record['commit'] in commits:
+            latest[(record['commit'], record['loop'], record['size'])] = record
+
+    header = f"{'loop':26} {'size':>8}"
+    for commit in commits:
+        header += f" | {commit + ' wall_s':>16} {'queries':>9} {'rss_mb':>8}"
+    print(header)
+    for loop_name in LOOPS:
+        sizes = sorted({size for (_, name, size) in latest if name == loop_name})
+        for size in sizes:
+            row = f"{loop_name:26} {size:>8}"
+            for commit in commits:
+                record = latest.get((commit, loop_name, size))
+                if record:
+                    row += f" | {record['wall_s']:>16} {record['queries']:>9} {record['peak_rss_mb']:>8}"
+                else:
+                    row += f" | {'-':>16} {'-':>9} {'-':>8}"
+            print(row)
+
+# ============================================
+# ЗАПУСК
+# ============================================
+
+def run(sizes, loops):
+    commit, dirty = git_revision()
+    for size in sizes:
+        for loop_name in loops:
+            print(f"⏳ {loop_name} @ {size}: засев...", flush=True)
+            seed(size)
+            child = subprocess.run([sys.executable, __file__, '_child', loop_name],
+                                   capture_output=True, text=True)
+            if child.returncode != 0:
+                print(child.stderr[-2000:])
+                continue
+            record = {
+                'commit': commit,
+                'dirty': dirty,
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'loop': loop_name,
+                'size': size,
+                **json.loads(child.stdout.strip().splitlines()[-1]),
+            }
+            save_result(record)
+            print(f"   {record['wall_s']}с, {record['queries']} запросов, "
+                  f"{record['api_calls']} вызовов API, RSS {record['peak_rss_mb']} МБ")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='засеять данные и прогнать циклы')
+    run_parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                            help='размеры через запятую')
+    run_parser.add_argument('--loops', default=','.join(LOOPS), help='циклы через запятую')
+
+    compare_parser = sub.add_parser('compare', help='сравнить результаты коммитов')
+    compare_parser.add_argument('commits', nargs='*')
+
+    child_parser = sub.add_parser('_child')
+    child_parser.add_argument('loop')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run([int(size) for size in args.sizes.split(',')], args.loops.split(','))
+    elif args.command == 'compare':
+        compare(args.commits)
+    else:
+        print(json.dumps(asyncio.run(run_loop_once(args.loop))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Индекс callback_data для роутеров
+Вместо длинного списка F.data == ... у роутера один хендлер callback_query,
+который находит обработчик по точному значению (словарь) или по префиксу
+(словарь на каждую длину префикса). Обработчики хранятся как HandlerObject
+aiogram, так что дополнительные фильтры (состояния FSM) и внедрение
+аргументов (state, bot, ...) работают как у обычных хендлеров.
+
+Порядок: сначала точные значения, затем префиксы от длинного к короткому.
+Если ничего не подошло, апдейт идёт дальше - в следующие роутеры
+"""
+
+from aiogram.dispatcher.event.handler import FilterObject, HandlerObject
+
+class CallbackIndex:
+    """Точные значения и префиксы callback_data одного роутера"""
+
+    def __init__(self, router):
+        self.router = router
+        self._exact = {}
+        self._prefixes = {}
+        self._prefix_lengths = []
+        router.callback_query.register(self._dispatch, self._match)
+
+    # ============================================
+    # РЕГИСТРАЦИЯ
+    # ============================================
+
+    def _entry(self, callback, filters):
+        return HandlerObject(callback=callback, filters=[FilterObject(item) for item in filters])
+
+    def exact(self, data, *filters):
+        """Декоратор: callback_data == data (строка или список строк) и все filters"""
+        values = [data] if isinstance(data, str) else list(data)
+
+        def decorator(callback):
+            entry = self._entry(callback, filters)
+            for value in values:
+                self._exact.setdefault(value, []).append(entry)
+            return callback
+        return decorator
+
+    def prefix(self, prefix, *filters):
+        """Декоратор: callback_data начинается с prefix и все filters"""
+        def decorator(callback):
+            self._prefixes.setdefault(prefix, []).append(self._entry(callback, filters))
+            if len(prefix) not in self._prefix_lengths:
+                self._prefix_lengths.append(len(prefix))
+                self._prefix_lengths.sort(reverse=True)
+            return callback
+        return decorator
+
+    def routes(self):
+        """[(вид, значение, HandlerObject)] в порядке проверки - для бенчмарка и отладки"""
+        items = [('exact', value, entry) for value, entries in self._exact.items() for entry in entries]
+        for length in self._prefix_lengths:
+            items += [('prefix', prefix, entry) for prefix, entries in self._prefixes.items()
+                      if len(prefix) == length for entry in entries]
+        return items
+
+    # ============================================
+    # ДИСПЕТЧЕРИЗАЦИЯ
+    # ============================================
+
+    def _candidates(self, data):
+        yield from self._exact.get(data, ())
+        for length in self._prefix_lengths:
+            if len(data) >= length:
+                yield from self._prefixes.get(data[:length], ())
+
+    async def _match(self, callback, **kwargs):
+        """Фильтр единственного хендлера роутера: найденный обработчик уходит в данные
+        апдейта как callback_route (по нему db_profiler подписывает запросы)"""
+        if callback.data is None:
+            return False
+        for entry in self._candidates(callback.data):
+            passed, data = await entry.check(callback, **kwargs)
+            if passed:
+                return {**data, 'callback_route': entry}
+        return False
+
+    async def _dispatch(self, callback, callback_route, **kwargs):
+        return await callback_route.call(callback, **kwargs)
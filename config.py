@@ -0,0 +1,32 @@
+"""
+Конфигурация из переменных окружения, тарифы и ссылки
+"""
+
+import os
+
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+CHANNEL_ID = os.getenv('CHANNEL_ID')
+ADMIN_ID = int(os.getenv('ADMIN_ID', 0))
+# Все администраторы: ADMIN_IDS="1 2 3" (через пробел или запятую) плюс ADMIN_ID
+ADMIN_IDS = frozenset(
+    {int(item) for item in os.getenv('ADMIN_IDS', '').replace(',', ' ').split()}
+    | ({ADMIN_ID} if ADMIN_ID else set())
+)
+DATABASE_URL = os.getenv('DATABASE_URL')
+# BOT_TOKEN, CHANNEL_ID, ADMIN_IDS и токен провайдера - клуба по умолчанию;
+# остальные клубы задаются JSON в TENANTS (см. tenants.py)
+
+# 🆕 TELEGRAM PAYMENTS - Provider Token от BotFather
+YOOKASSA_PROVIDER_TOKEN = os.getenv('YOOKASSA_PROVIDER_TOKEN', '390540012:LIVE:83850')
+
+# 🆕 Ссылки на демо-контент
+DEMO_VIDEO_URL = "https://t.me/instrukcii_baza"
+DEMO_PHOTOS_URL = "https://t.me/instrukcii_baza"
+REVIEWS_URL = "https://t.me/otzovik_klub"
+
+# Тарифы
+TARIFFS = {
+    'trial': {'name': '7 дней бесплатно', 'days': 7, 'price': 0},
+    '1month': {'name': '1 месяц', 'days': 30, 'price': 199, 'old_price': 499},
+    'forever': {'name': 'Навсегда', 'days': 36500, 'price': 599, 'old_price': 2990}
+}
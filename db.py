@@ -0,0 +1,345 @@
+"""
+Подключение к PostgreSQL, схема и запросы, общие для хендлеров и фоновых задач
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+import analytics
+import approx_stats
+import db_profiler
+import delivery
+import exporter
+import feedback_broadcast
+import invite_pool
+import tenants
+from config import DATABASE_URL
+
+# ========================================
+# ФУНКЦИИ БАЗЫ ДАННЫХ
+# ========================================
+
+def get_db_connection():
+    """Создает подключение к PostgreSQL (с профилированием запросов)"""
+    return psycopg2.connect(DATABASE_URL,
+                            connection_factory=db_profiler.ProfilingConnection,
+                            cursor_factory=db_profiler.ProfilingCursor)
+
+# Версия схемы: увеличить при любом изменении DDL здесь или в init_schema модулей.
+# Если в базе уже эта версия, init_db на старте делает один SELECT вместо всех миграций
+SCHEMA_VERSION = 7
+# Ключ advisory-блокировки: миграцию выполняет один экземпляр, остальные её дожидаются
+SCHEMA_LOCK_ID = 7001
+
+def get_schema_version(cur):
+    cur.execute("SELECT to_regclass('schema_meta') IS NOT NULL AS found")
+    if not cur.fetchone()['found']:
+        return None
+    cur.execute("SELECT value FROM schema_meta WHERE key = 'schema_version'")
+    row = cur.fetchone()
+    return int(row['value']) if row else None
+
+def init_db():
+    """Инициализация таблиц в PostgreSQL. Возвращает True, если схема обновлялась"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    if get_schema_version(cur) == SCHEMA_VERSION:
+        conn.rollback()
+        cur.close()
+        conn.close()
+        return False
+    
+    cur.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEMA_LOCK_ID,))
+    # Пока ждали блокировку, схему мог обновить другой экземпляр
+    if get_schema_version(cur) == SCHEMA_VERSION:
+        conn.rollback()
+        cur.close()
+        conn.close()
+        return False
+    
+    cur.execute('''CREATE TABLE IF NOT EXISTS users
+                 (user_id BIGINT PRIMARY KEY,
+                  username TEXT,
+                  subscription_until TIMESTAMP,
+                  tariff TEXT,
+                  created_at TIMESTAMP)''')
+    
+    cur.execute('''CREATE TABLE IF NOT EXISTS payments
+                 (payment_id TEXT PRIMARY KEY,
+                  user_id BIGINT,
+                  amount REAL,
+                  tariff TEXT,
+                  status TEXT,
+                  yookassa_id TEXT,
+                  created_at TIMESTAMP)''')
+    
+    cur.execute('''CREATE TABLE IF NOT EXISTS notifications
+                 (user_id BIGINT PRIMARY KEY,
+                  last_notified TIMESTAMP)''')
+    
+    cur.execute('''CREATE TABLE IF NOT EXISTS funnel_messages
+                 (id SERIAL PRIMARY KEY,
+                  user_id BIGINT,
+                  message_type TEXT,
+                  sent_at TIMESTAMP,
+                  UNIQUE(user_id, message_type))''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS welcome_messages
+                 (user_id BIGINT PRIMARY KEY,
+                  sent_at TIMESTAMP,
+                  opened BOOLEAN DEFAULT FALSE)''')
+    
+    # Запланированное приветствие: due_at задан, sent_at ещё NULL
+    cur.execute('''ALTER TABLE welcome_messages ADD COLUMN IF NOT EXISTS due_at TIMESTAMP''')
+    # Напоминания о неоплаченных счетах: аренда на время отправки и отметка об отправке
+    cur.execute('''ALTER TABLE payments ADD COLUMN IF NOT EXISTS reminder_lease_until TIMESTAMP''')
+    cur.execute('''ALTER TABLE payments ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMP''')
+    # Статус этапа воронки: claimed - зарезервирован под отправку, sent - отправлен
+    cur.execute('''ALTER TABLE funnel_messages ADD COLUMN IF NOT EXISTS status TEXT DEFAULT 'sent' ''')
+    # Клуб (tenants) пользователя, счёта и приветствия; существующие строки - клуба по умолчанию
+    for table in ('users', 'payments', 'welcome_messages'):
+        cur.execute(f'''ALTER TABLE {table} ADD COLUMN IF NOT EXISTS tenant_id TEXT NOT NULL DEFAULT %s''',
+                    (tenants.DEFAULT_TENANT,))
+
+    # Прогресс воронки одной строкой на пользователя: биты этапов (FUNNEL_STAGE_BITS)
+    # и время отправки этапа в stage_times[бит + 1]
+    cur.execute('''CREATE TABLE IF NOT EXISTS funnel_progress
+                 (user_id BIGINT PRIMARY KEY,
+                  sent_mask INTEGER NOT NULL DEFAULT 0,
+                  claimed_mask INTEGER NOT NULL DEFAULT 0,
+                  stage_times TIMESTAMP[])''')
+    # Резерв этапов действует до claim_lease_until: резерв прерванного прохода не вечен
+    cur.execute('''ALTER TABLE funnel_progress ADD COLUMN IF NOT EXISTS claim_lease_until TIMESTAMP''')
+    migrate_funnel_messages(cur)
+    
+    # События воронки: секции по месяцам + представление funnel_analytics для отчётов
+    analytics.init_schema(cur)
+    # Водяные знаки инкрементальных выгрузок в Parquet
+    exporter.init_schema(cur)
+    # Счётчики и HLL-скетчи для приблизительной статистики
+    approx_stats.init_schema(cur)
+    # Заранее созданные инвайт-ссылки
+    invite_pool.init_schema(cur)
+    # Пользователи, которым нельзя доставить сообщение
+    delivery.init_schema(cur)
+    # Отзывы (своё подключение, модуль feedback_broadcast)
+    feedback_broadcast.create_feedback_table(get_db_connection)
+    
+    cur.execute('''CREATE TABLE IF NOT EXISTS schema_meta
+                 (key TEXT PRIMARY KEY,
+                  value TEXT NOT NULL,
+                  updated_at TIMESTAMP DEFAULT NOW())''')
+    cur.execute('''INSERT INTO schema_meta (key, value) VALUES ('schema_version', %s)
+                   ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()''',
+                (str(SCHEMA_VERSION),))
+    
+    conn.commit()
+    cur.close()
+    conn.close()
+    
+    logging.info(f"Database schema updated to version {SCHEMA_VERSION}")
+    return True
+
+def track_user_action(user_id, action):
+    """Сохраняем действия пользователя для аналитики"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        analytics.record(cur, user_id, action)
+        conn.commit()
+        cur.close()
+        conn.close()
+        logging.info(f"Tracked action: {action} for user {user_id}")
+    except Exception as e:
+        logging.error(f"Error tracking action: {e}")
+
+def add_user(user_id, username, days, tariff):
+    """Добавление/обновление пользователя. Новый пользователь - в клуб текущего апдейта,
+    у существующего клуб не меняется"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    subscription_until = datetime.now() + timedelta(days=days)
+    created_at = datetime.now()
+    
+    cur.execute('''INSERT INTO users 
+                 (user_id, username, subscription_until, tariff, created_at, tenant_id)
+                 VALUES (%s, %s, %s, %s, %s, %s)
+                 ON CONFLICT (user_id) 
+                 DO UPDATE SET subscription_until = %s, tariff = %s''',
+              (user_id, username, subscription_until, tariff, created_at, tenants.current().tenant_id,
+               subscription_until, tariff))
+    
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def get_user(user_id):
+    """Получение данных пользователя"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM users WHERE user_id = %s', (user_id,))
+    user = cur.fetchone()
+    cur.close()
+    conn.close()
+    return user
+
+def is_subscription_active(user_id):
+    """Проверка активности подписки"""
+    user = get_user(user_id)
+    if not user:
+        return False
+    return datetime.now() < user['subscription_until']
+
+def get_expired_users():
+    """Получение пользователей с истекшей подпиской (undeliverable - писать им бесполезно)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(f'''SELECT user_id, username, tenant_id,
+                          NOT {delivery.not_suppressed('users.user_id')} AS undeliverable
+                   FROM users 
+                   WHERE subscription_until < %s''', (datetime.now(),))
+    expired = cur.fetchall()
+    cur.close()
+    conn.close()
+    return expired
+
+def was_notified_recently(user_id):
+    """Проверка, было ли уведомление отправлено недавно (за последние 24 часа)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''SELECT last_notified FROM notifications 
+                   WHERE user_id = %s''', (user_id,))
+    result = cur.fetchone()
+    cur.close()
+    conn.close()
+    
+    if not result:
+        return False
+    
+    last_notified = result['last_notified']
+    time_diff = datetime.now() - last_notified
+    return time_diff.total_seconds() < 86400
+
+def mark_as_notified(user_id):
+    """Отметить что пользователь был уведомлен"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''INSERT INTO notifications (user_id, last_notified)
+                   VALUES (%s, %s)
+                   ON CONFLICT (user_id)
+                   DO UPDATE SET last_notified = %s''',
+                (user_id, datetime.now(), datetime.now()))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+# Сколько живёт резерв этапов воронки - дольше max_runtime прохода, чтобы живой проход
+# не терял свои резервы, но после падения или отмены этапы снова брались следующими проходами
+FUNNEL_CLAIM_LEASE = timedelta(hours=1)
+
+def active_claims(alias):
+    """claimed_mask строки funnel_progress без резервов с истёкшей арендой"""
+    return f"CASE WHEN {alias}.claim_lease_until > LOCALTIMESTAMP THEN {alias}.claimed_mask ELSE 0 END"
+
+# Номера битов этапов воронки в funnel_progress. Номера хранятся в базе -
+# новые этапы только дописываются в конец, существующие не переставляются
+FUNNEL_STAGE_BITS = {
+    stage: bit for bit, stage in enumerate([
+        'day1', 'day2', 'day3', 'day4', 'day5', 'day7_8hours', 'day7_2hours',
+        'expired_immediate', 'expired_day2', 'expired_day5', 'pending_reminder',
+    ])
+}
+
+def migrate_funnel_messages(cur):
+    """Однократный перенос funnel_messages в funnel_progress (старая таблица не удаляется)"""
+    cur.execute('''SELECT NOT EXISTS (SELECT 1 FROM funnel_progress)
+                      AND EXISTS (SELECT 1 FROM funnel_messages) AS needed''')
+    if not cur.fetchone()['needed']:
+        return
+
+    stages = list(FUNNEL_STAGE_BITS.items())
+    execute_values(cur, '''INSERT INTO funnel_progress (user_id, sent_mask)
+                           SELECT fm.user_id, bit_or(1 << s.bit)
+                           FROM funnel_messages fm
+                           JOIN (VALUES %s) AS s(message_type, bit) USING (message_type)
+                           GROUP BY fm.user_id''',
+                   stages, page_size=len(stages))
+    for stage, bit in stages:
+        cur.execute(f'''UPDATE funnel_progress fp SET stage_times[{bit + 1}] = fm.sent_at
+                        FROM funnel_messages fm
+                        WHERE fm.user_id = fp.user_id AND fm.message_type = %s''',
+                    (stage,))
+    logging.info("Funnel progress migrated from funnel_messages")
+
+def get_trial_users_for_funnel():
+    """Получение пользователей в пробном периоде для воронки вместе с битами пройденных этапов"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute(f'''SELECT u.user_id, u.username, u.subscription_until, u.created_at, u.tenant_id,
+                          COALESCE(fp.sent_mask | {active_claims('fp')}, 0) AS funnel_mask
+                   FROM users u
+                   LEFT JOIN funnel_progress fp ON fp.user_id = u.user_id
+                   WHERE u.tariff = %s 
+                   AND u.subscription_until > %s
+                   AND {delivery.not_suppressed('u.user_id')}''',
+                ('trial', datetime.now()))
+    
+    trial_users = cur.fetchall()
+    cur.close()
+    conn.close()
+    return trial_users
+
+def get_expired_trial_users(since=None):
+    """Получение пользователей с истекшим пробным периодом (истекшим не раньше since)
+    вместе с битами пройденных этапов воронки"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute(f'''SELECT u.user_id, u.username, u.subscription_until, u.created_at, u.tenant_id,
+                          COALESCE(fp.sent_mask | {active_claims('fp')}, 0) AS funnel_mask
+                   FROM users u
+                   LEFT JOIN funnel_progress fp ON fp.user_id = u.user_id
+                   WHERE u.tariff = %s 
+                   AND u.subscription_until < %s
+                   AND (%s::timestamp IS NULL OR u.subscription_until > %s)
+                   AND {delivery.not_suppressed('u.user_id')}''',
+                ('trial', datetime.now(), since, since))
+    
+    expired_users = cur.fetchall()
+    cur.close()
+    conn.close()
+    return expired_users
+
+def mark_funnel_stage_sent(cur, user_ids, stage):
+    """Отметить отправку этапа сразу для многих пользователей одним INSERT ... ON CONFLICT"""
+    if not user_ids:
+        return
+    bit = FUNNEL_STAGE_BITS[stage]
+    execute_values(cur, f'''INSERT INTO funnel_progress (user_id, sent_mask, stage_times[{bit + 1}])
+                            VALUES %s
+                            ON CONFLICT (user_id) DO UPDATE
+                            SET sent_mask = funnel_progress.sent_mask | EXCLUDED.sent_mask,
+                                stage_times[{bit + 1}] = EXCLUDED.stage_times[{bit + 1}]''',
+                   [(user_id, 1 << bit, datetime.now()) for user_id in user_ids])
+
+def get_active_subscribers(tenant_id=None):
+    """Получение всех пользователей с активной подпиской (только клуба tenant_id, если задан)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute('''SELECT user_id, username, subscription_until, tariff 
+                   FROM users 
+                   WHERE subscription_until > %s
+                   AND (%s::text IS NULL OR tenant_id = %s)
+                   ORDER BY subscription_until DESC''',
+                (datetime.now(), tenant_id, tenant_id))
+    
+    active_users = cur.fetchall()
+    cur.close()
+    conn.close()
+    return active_users
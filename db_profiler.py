@@ -0,0 +1,271 @@
+"""
+Профилирование SQL-запросов
+Время каждого запроса, лог медленных запросов с планом EXPLAIN и вызывающим кодом.
+Отпечаток SQL и поиск вызывающего кода (обход кадров стека) стоят дороже самого
+замера, поэтому по умолчанию делаются только для медленных запросов; с DB_PROFILE=1
+так профилируется каждый запрос - это нужно для полного /perf и поиска N+1
+"""
+
+import contextvars
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+# Порог медленного запроса (мс) и число одинаковых запросов за один апдейт/проход,
+# после которого считаем это N+1
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 10))
+# Отпечаток и вызывающий код для каждого запроса, а не только для медленных
+PROFILE_ALL_QUERIES = os.getenv('DB_PROFILE', '0') == '1'
+
+# Текущий "потребитель" запросов: имя хендлера или фоновой задачи
+_current_scope = contextvars.ContextVar('db_profile_scope', default=None)
+
+# Агрегированная статистика по отпечаткам запросов за время жизни процесса
+_query_stats = {}
+_connections_opened = 0
+# Все запросы, включая быстрые без отпечатка
+_queries_total = 0
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+
+# ============================================
+# ОТПЕЧАТКИ И СТАТИСТИКА
+# ============================================
+
+def fingerprint(query):
+    """Нормализует SQL: литералы и параметры заменяются на ?, пробелы схлопываются"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = _STRING_LITERAL.sub('?', query)
+    query = _PLACEHOLDER.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    query = _IN_LIST.sub('(?)', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+def _find_caller():
+    """Ближайшая функция вне профайлера и psycopg2 - кто на самом деле выполнил запрос"""
+    frame = sys._getframe(1)
+    while frame:
+        filename = os.path.normcase(os.path.abspath(frame.f_code.co_filename))
+        if filename != _THIS_FILE and 'psycopg2' not in filename:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return 'unknown'
+
+class _Scope:
+    """Счётчики запросов в рамках одного апдейта или прохода фоновой задачи"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.total_ms = 0.0
+        self.by_fingerprint = {}
+
+def _record(query, duration_ms, rows):
+    fp = fingerprint(query)
+    caller = _find_caller()
+    scope = _current_scope.get()
+    handler = scope.name if scope else caller
+
+    stats = _query_stats.get(fp)
+    if stats is None:
+        stats = _query_stats[fp] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                                    'callers': set()}
+    stats['calls'] += 1
+    stats['total_ms'] += duration_ms
+    stats['max_ms'] = max(stats['max_ms'], duration_ms)
+    stats['rows'] += max(rows, 0)
+    stats['callers'].add(f"{handler}/{caller}" if handler != caller else caller)
+
+    if scope:
+        scope.queries += 1
+        scope.total_ms += duration_ms
+        seen = scope.by_fingerprint.get(fp)
+        if seen is None:
+            scope.by_fingerprint[fp] = [1, caller]
+        else:
+            seen[0] += 1
+
+    logging.debug(f"SQL {duration_ms:.1f}ms rows={rows} [{handler}/{caller}] {fp}")
+    return fp, handler, caller
+
+# ============================================
+# ОБЁРТКИ ДЛЯ PSYCOPG2
+# ============================================
+
+class ProfilingCursor(RealDictCursor):
+    """RealDictCursor, который замеряет каждый запрос"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._after(query, vars, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            # Параметров много - в тексте остались %s, EXPLAIN по нему не выполнить
+            self._after(query, None, started, explain=False)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._after(sql, None, started, explain=False)
+
+    def _after(self, query, vars, started, explain=True):
+        global _queries_total
+        _queries_total += 1
+        duration_ms = (time.perf_counter() - started) * 1000
+        slow = duration_ms >= SLOW_QUERY_MS
+        if not (slow or PROFILE_ALL_QUERIES):
+            # Быстрый запрос: только дешёвые счётчики области, без отпечатка и обхода стека
+            scope = _current_scope.get()
+            if scope:
+                scope.queries += 1
+                scope.total_ms += duration_ms
+            return
+        fp, handler, caller = _record(query, duration_ms, self.rowcount)
+        if slow:
+            plan = self.connection.explain(query, vars) if explain else '(EXPLAIN пропущен)'
+            logging.warning(
+                f"🐢 Slow query {duration_ms:.0f}ms rows={self.rowcount} [{handler}/{caller}]: {fp}\n"
+                f"{plan}"
+            )
+
+class ProfilingConnection(psycopg2.extensions.connection):
+    """Соединение, по умолчанию выдающее профилирующие курсоры"""
+
+    def __init__(self, *args, **kwargs):
+        global _connections_opened
+        super().__init__(*args, **kwargs)
+        _connections_opened += 1
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('cursor_factory', ProfilingCursor)
+        return super().cursor(*args, **kwargs)
+
+    def explain(self, query, vars=None):
+        """План запроса без выполнения (EXPLAIN без ANALYZE)"""
+        text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else query
+        if not text.lstrip().upper().startswith(_EXPLAINABLE):
+            return '(EXPLAIN недоступен для этого запроса)'
+        if self.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            return '(транзакция в ошибке, EXPLAIN пропущен)'
+        # EXPLAIN идёт в транзакции вызывающего: его ошибка не должна её прервать
+        savepoint = not self.autocommit
+        try:
+            cur = psycopg2.extensions.cursor(self)
+            if savepoint:
+                cur.execute('SAVEPOINT profiler_explain')
+            try:
+                cur.execute('EXPLAIN ' + text, vars)
+                plan = '\n'.join(row[0] for row in cur.fetchall())
+            except Exception as e:
+                if savepoint:
+                    cur.execute('ROLLBACK TO SAVEPOINT profiler_explain')
+                plan = f'(EXPLAIN не удался: {e})'
+            if savepoint:
+                cur.execute('RELEASE SAVEPOINT profiler_explain')
+            cur.close()
+            return plan
+        except Exception as e:
+            return f'(EXPLAIN не удался: {e})'
+
+# ============================================
+# ОБЛАСТИ ПРОФИЛИРОВАНИЯ (АПДЕЙТ / ПРОХОД ЗАДАЧИ)
+# ============================================
+
+def _report_scope(scope):
+    for fp, (count, caller) in scope.by_fingerprint.items():
+        if count >= N_PLUS_ONE_THRESHOLD:
+            logging.warning(
+                f"🔁 N+1 в {scope.name}: {count} × {fp} (вызывает {caller})"
+            )
+    elapsed_ms = (time.perf_counter() - scope.started) * 1000
+    if scope.queries:
+        logging.debug(
+            f"{scope.name}: {scope.queries} запросов, {scope.total_ms:.0f}ms в БД "
+            f"из {elapsed_ms:.0f}ms"
+        )
+
+@contextmanager
+def profile_scope(name):
+    """Группирует запросы под одним именем (проход фоновой задачи) и ищет N+1 в конце"""
+    scope = _Scope(name)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        _report_scope(scope)
+
+async def profiling_middleware(handler, event, data):
+    """Inner-middleware aiogram: запросы внутри хендлера группируются по его имени
+    (для callback из CallbackIndex - по найденному обработчику, а не по общему)"""
+    handler_object = data.get('callback_route') or data.get('handler')
+    name = getattr(getattr(handler_object, 'callback', None), '__name__', type(event).__name__)
+    with profile_scope(name):
+        return await handler(event, data)
+
+def setup_middleware(dp):
+    """Подключает профилирование ко всем типам апдейтов, которые обрабатывает бот"""
+    for observer in (dp.message, dp.callback_query, dp.pre_checkout_query):
+        observer.middleware(profiling_middleware)
+
+# ============================================
+# ОТЧЁТ
+# ============================================
+
+def connections_opened():
+    return _connections_opened
+
+def total_queries():
+    return _queries_total
+
+def top_queries(limit=10, order_by='total_ms'):
+    """Самые дорогие отпечатки запросов"""
+    items = sorted(_query_stats.items(), key=lambda item: item[1][order_by], reverse=True)
+    return items[:limit]
+
+def format_report(limit=10):
+    """Текстовый отчёт для админа"""
+    text = (f"🗄 <b>SQL-профиль</b>"
+            f"{'' if PROFILE_ALL_QUERIES else f' (только медленные от {SLOW_QUERY_MS:.0f}ms, все - DB_PROFILE=1)'}\n"
+            f"Соединений открыто: {_connections_opened}\n"
+            f"Запросов: {total_queries()}, отпечатков: {len(_query_stats)}\n\n")
+    for fp, stats in top_queries(limit):
+        avg = stats['total_ms'] / stats['calls']
+        callers = ', '.join(sorted(stats['callers'])[:3])
+        short = fp if len(fp) <= 120 else fp[:117] + '...'
+        text += (f"• {stats['calls']}× avg {avg:.1f}ms max {stats['max_ms']:.0f}ms "
+                 f"rows {stats['rows']}\n  <code>{_escape(short)}</code>\n  ← {_escape(callers)}\n")
+    return text
+
+def reset():
+    global _connections_opened, _queries_total
+    _query_stats.clear()
+    _connections_opened = 0
+    _queries_total = 0
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
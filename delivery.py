@@ -0,0 +1,328 @@
+"""
+Доставка сообщений пользователям
+Ошибки Bot API разбираются по классам исключений aiogram, а не по тексту:
+- заблокировал бота / удалил аккаунт (403) и несуществующий чат - пользователь
+  попадает в таблицу undeliverable, и циклы рассылок отбирают получателей
+  уже без него (not_suppressed в SQL) - ни одного вызова API;
+- flood control (RetryAfter) - пауза лимита send_limiter бота, получившего
+  429 (у каждого бота клуба свой лимит - остальные клубы шлют дальше), и повтор;
+- сеть и 5xx - временная ошибка TRANSIENT. Сессия api_session такие ответы на
+  send*/copy*/forward* не повторяет (сообщение могло уже дойти), и send() тоже:
+  результат TRANSIENT возвращается вызывающему и пишется в журнал. Повтор -
+  решение вызывающего: воронка снимает резерв этапа и пробует на следующем
+  проходе, напоминание вернётся после аренды, приветствие дошлётся после
+  рестарта, рассылка считает его ошибкой;
+- остальное - ошибка запроса, пишется в лог.
+
+Список держится и в памяти процесса (SuppressionIndex - отсортированный
+массив int64, 8 байт на пользователя): отправка недоставляемому пропускается
+без запроса к базе и к API. Пополняется из ответов 403 и апдейтов my_chat_member
+(пользователь остановил бота), а фоновая задача перечитывает его из базы -
+чтобы видеть изменения других экземпляров.
+
+Из undeliverable пользователь выходит, когда снова пишет боту (/start)
+или разблокирует его (my_chat_member).
+
+Каждая отправка попадает в журнал delivery_ledger (только добавление):
+вид сообщения, пользователь, message_id, когда поставлено в очередь и когда
+отправлено, результат, число повторов и клуб бота (tenants). Строки копятся в памяти и пишутся
+пачкой фоновой задачей и при остановке (flush_ledger)
+"""
+
+import logging
+import os
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from aiogram.exceptions import (TelegramBadRequest, TelegramEntityTooLarge, TelegramForbiddenError,
+                                TelegramNetworkError, TelegramNotFound, TelegramRetryAfter,
+                                TelegramServerError)
+
+from psycopg2.extras import execute_values
+
+import tenants
+from api_session import request_retries
+from rate_limiter import send_limiter
+
+# Результаты отправки
+SENT = 'sent'
+BLOCKED = 'blocked'            # 403: заблокировал бота, аккаунт удалён
+GONE = 'gone'                  # чата нет
+RATE_LIMITED = 'rate_limited'  # flood control
+TRANSIENT = 'transient'        # сеть, 5xx
+BAD_REQUEST = 'bad_request'    # ошибка в самом запросе (разметка, кнопки, размер)
+FAILED = 'failed'              # всё остальное
+SKIPPED = 'skipped'            # уже в списке недоставляемых - не отправляли
+
+# После этих результатов писать пользователю бесполезно
+SUPPRESS = (BLOCKED, GONE, SKIPPED)
+# Сколько раз пробуем отправить одно сообщение при flood control
+SEND_ATTEMPTS = 3
+# Журнал доставки: сколько дней хранить и сколько строк держать в памяти, пока база недоступна
+LEDGER_RETENTION = timedelta(days=int(os.getenv('DELIVERY_LEDGER_DAYS', 90)))
+LEDGER_MAX_BUFFER = 50000
+
+_ledger = []
+
+def classify_send_error(error):
+    """Класс ошибки отправки по типу исключения"""
+    if isinstance(error, TelegramRetryAfter):
+        return RATE_LIMITED
+    if isinstance(error, TelegramForbiddenError):
+        return BLOCKED
+    if isinstance(error, TelegramNotFound):
+        return GONE
+    if isinstance(error, TelegramBadRequest):
+        # Для "chat not found" у Bot API нет своего кода - это 400 с описанием
+        return GONE if 'chat not found' in error.message.lower() else BAD_REQUEST
+    if isinstance(error, TelegramEntityTooLarge):
+        return BAD_REQUEST
+    if isinstance(error, (TelegramNetworkError, TelegramServerError)):
+        return TRANSIENT
+    return FAILED
+
+def init_schema(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS undeliverable (
+            user_id BIGINT PRIMARY KEY,
+            reason TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS delivery_ledger (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            user_id BIGINT NOT NULL,
+            message_id BIGINT,
+            enqueued_at TIMESTAMP NOT NULL,
+            sent_at TIMESTAMP,
+            outcome TEXT NOT NULL,
+            retries SMALLINT NOT NULL DEFAULT 0
+        )
+    ''')
+    # Доставляемость по видам сообщений за период и удаление старых строк
+    cur.execute('''CREATE INDEX IF NOT EXISTS idx_delivery_ledger_kind
+                   ON delivery_ledger (kind, enqueued_at)''')
+    cur.execute('''ALTER TABLE delivery_ledger ADD COLUMN IF NOT EXISTS tenant_id TEXT NOT NULL DEFAULT %s''',
+                (tenants.DEFAULT_TENANT,))
+    cur.execute('''CREATE INDEX IF NOT EXISTS idx_delivery_ledger_enqueued
+                   ON delivery_ledger (enqueued_at)''')
+
+def not_suppressed(column):
+    """Условие для WHERE: пользователю из column можно писать"""
+    return f"NOT EXISTS (SELECT 1 FROM undeliverable ud WHERE ud.user_id = {column})"
+
+# ============================================
+# СПИСОК НЕДОСТАВЛЯЕМЫХ
+# ============================================
+
+class SuppressionIndex:
+    """Множество user_id в отсортированном array('q'): поиск - бинарный,
+    вставка и удаление редкие (блокировки), поэтому сдвиг массива не страшен"""
+
+    def __init__(self, user_ids=()):
+        self._ids = array('q', sorted(set(user_ids)))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id):
+        index = bisect_left(self._ids, user_id)
+        return index < len(self._ids) and self._ids[index] == user_id
+
+    def add(self, user_id):
+        index = bisect_left(self._ids, user_id)
+        if index == len(self._ids) or self._ids[index] != user_id:
+            self._ids.insert(index, user_id)
+
+    def discard(self, user_id):
+        index = bisect_left(self._ids, user_id)
+        if index < len(self._ids) and self._ids[index] == user_id:
+            del self._ids[index]
+
+    def replace(self, user_ids):
+        self._ids = array('q', user_ids)
+
+    def reachable(self, users, key='user_id'):
+        """Строки users (словари из базы), которым можно писать"""
+        return [user for user in users if user[key] not in self]
+
+# Один индекс на процесс
+undeliverable = SuppressionIndex()
+
+def load_suppressed(get_db_connection):
+    """Перечитать список из базы (на старте и периодически)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('SELECT user_id FROM undeliverable ORDER BY user_id')
+    undeliverable.replace(row['user_id'] for row in cur.fetchall())
+    cur.close()
+    conn.close()
+    return len(undeliverable)
+
+def suppress(get_db_connection, user_id, reason, description=None):
+    undeliverable.add(user_id)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''INSERT INTO undeliverable (user_id, reason, description)
+                   VALUES (%s, %s, %s)
+                   ON CONFLICT (user_id) DO UPDATE
+                   SET reason = EXCLUDED.reason, description = EXCLUDED.description,
+                       created_at = NOW()''',
+                (user_id, reason, description))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def restore(get_db_connection, user_id):
+    """Пользователь снова пишет боту - ему можно отправлять"""
+    undeliverable.discard(user_id)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM undeliverable WHERE user_id = %s', (user_id,))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+# ============================================
+# ОТПРАВКА
+# ============================================
+
+async def send(bot, get_db_connection, user_id, text, kind='message', enqueued_at=None, **kwargs):
+    """Сообщение одному пользователю через лимит бота. Возвращает SENT или класс ошибки.
+    kind и enqueued_at (когда сообщение решили отправить, по умолчанию - сейчас) идут в журнал"""
+    enqueued_at = enqueued_at or datetime.now()
+    tenant_id = tenants.for_bot(bot).tenant_id
+    if user_id in undeliverable:
+        _record(tenant_id, kind, user_id, None, enqueued_at, None, SKIPPED, 0)
+        return SKIPPED
+    
+    # Повторы внутри сессии (5xx, короткий RetryAfter) и свои повторы после flood control
+    retries = [0]
+    token = request_retries.set(retries)
+    try:
+        outcome, message_id = await _send(bot, get_db_connection, user_id, text, retries, **kwargs)
+    finally:
+        request_retries.reset(token)
+    _record(tenant_id, kind, user_id, message_id, enqueued_at, datetime.now(), outcome, retries[0])
+    return outcome
+
+async def _send(bot, get_db_connection, user_id, text, retries, **kwargs):
+    outcome = RATE_LIMITED
+    limiter = send_limiter(bot)
+    for attempt in range(SEND_ATTEMPTS):
+        if attempt:
+            retries[0] += 1
+        await limiter.acquire()
+        try:
+            message = await bot.send_message(user_id, text, **kwargs)
+            return SENT, message.message_id
+        except Exception as e:
+            outcome = classify_send_error(e)
+            if outcome == RATE_LIMITED:
+                # Лимит на весь бот - останавливаем все его отправки, а не только эту
+                limiter.pause(e.retry_after)
+                logging.warning(f"Flood control: sending by bot {bot.id} paused for {e.retry_after}s")
+                continue
+            if outcome in SUPPRESS:
+                logging.info(f"User {user_id} is unreachable ({outcome}), suppressed")
+                try:
+                    suppress(get_db_connection, user_id, outcome, e.message)
+                except Exception as db_error:
+                    logging.error(f"Could not suppress user {user_id}: {db_error}")
+            else:
+                logging.error(f"Error sending message to {user_id} ({outcome}): {e}")
+            return outcome, None
+    return outcome, None
+
+# ============================================
+# ЖУРНАЛ ДОСТАВКИ
+# ============================================
+
+def _record(tenant_id, kind, user_id, message_id, enqueued_at, sent_at, outcome, retries):
+    _ledger.append((tenant_id, kind, user_id, message_id, enqueued_at, sent_at, outcome, retries))
+    if len(_ledger) > LEDGER_MAX_BUFFER:
+        # База долго недоступна - теряем самые старые строки, а не память
+        del _ledger[:len(_ledger) - LEDGER_MAX_BUFFER]
+
+def flush_ledger(get_db_connection):
+    """Записать накопленные строки журнала одним INSERT. Возвращает число строк"""
+    if not _ledger:
+        return 0
+    rows = list(_ledger)
+    del _ledger[:len(rows)]
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        execute_values(cur, '''INSERT INTO delivery_ledger
+                                 (tenant_id, kind, user_id, message_id, enqueued_at, sent_at, outcome, retries)
+                                 VALUES %s''', rows, page_size=1000)
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception:
+        # Вернём строки в начало буфера - запишутся следующим проходом
+        _ledger[:0] = rows
+        del _ledger[:max(0, len(_ledger) - LEDGER_MAX_BUFFER)]
+        raise
+    return len(rows)
+
+def prune_ledger(get_db_connection):
+    """Удалить строки журнала старше LEDGER_RETENTION"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM delivery_ledger WHERE enqueued_at < %s',
+                (datetime.now() - LEDGER_RETENTION,))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    conn.close()
+    return deleted
+
+def ledger_summary(get_db_connection, tenant_id, hours=24):
+    """Доставляемость клуба по видам сообщений за последние hours часов: сколько поставлено,
+    доставлено, недоставляемых, задержка от постановки до отправки (avg, p95) и повторы"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT kind,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE outcome = %s) AS sent,
+               COUNT(*) FILTER (WHERE outcome = ANY(%s)) AS unreachable,
+               AVG(EXTRACT(EPOCH FROM sent_at - enqueued_at)) FILTER (WHERE outcome = %s) AS avg_delay,
+               PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sent_at - enqueued_at))
+                   FILTER (WHERE outcome = %s) AS p95_delay,
+               COALESCE(SUM(retries), 0) AS retries
+        FROM delivery_ledger
+        WHERE enqueued_at >= %s AND tenant_id = %s
+        GROUP BY kind
+        ORDER BY total DESC
+    ''', (SENT, list(SUPPRESS), SENT, SENT, datetime.now() - timedelta(hours=hours), tenant_id))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+def format_ledger_summary(rows, hours=24):
+    """Таблица доставляемости для админа (HTML)"""
+    def seconds(value):
+        if value is None:
+            return "-"
+        return f"{value:.1f}с" if value < 60 else f"{value / 60:.0f}м"
+
+    text = f"📬 <b>Доставка за {hours} ч</b>\n"
+    if not rows:
+        return text + "Отправок не было\n"
+    text += "<pre>"
+    text += f"{'вид':20} {'всего':>6} {'дост.':>6} {'недост.':>7} {'avg':>6} {'p95':>6} {'повт.':>5}\n"
+    for row in rows:
+        text += (f"{row['kind'][:20]:20} {row['total']:>6} "
+                 f"{row['sent'] * 100 / row['total']:>5.0f}% {row['unreachable']:>7} "
+                 f"{seconds(row['avg_delay']):>6} {seconds(row['p95_delay']):>6} {row['retries']:>5}\n")
+    text += "</pre>"
+    text += f"\nЗадержка - от постановки в очередь до ответа Telegram; в буфере ждут записи: {len(_ledger)}\n"
+    return text
@@ -0,0 +1,277 @@
+"""
+Потоковый экспорт в CSV и Parquet
+Данные выгружаются через COPY ... TO STDOUT прямо во временный файл
+(в памяти до EXPORT_SPOOL_MB, дальше на диске), при необходимости через gzip,
+и отправляются в Telegram кусками - весь результат в памяти не собирается.
+
+Parquet для аналитиков пишется группами строк из серверного курсора и умеет
+выгружать только новое с прошлого раза (export_watermarks). Нужен pyarrow
+(в requirements.txt); без него работает только CSV
+
+Выгружаются только строки клуба (tenants), из которого пришла команда
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from aiogram.types import InputFile
+
+import tenants
+
+EXPORT_SPOOL_MB = int(os.getenv('EXPORT_SPOOL_MB', 8))
+PARQUET_ROW_GROUP = int(os.getenv('PARQUET_ROW_GROUP', 50000))
+# События пишутся с created_at = NOW() на момент вставки, а видны после коммита -
+# свежий хвост не выгружаем, чтобы не перепрыгнуть ещё не закоммиченные строки
+WATERMARK_LAG = timedelta(minutes=int(os.getenv('EXPORT_WATERMARK_LAG_MIN', 5)))
+# Больше Bot API принять не может
+TELEGRAM_FILE_LIMIT = 50 * 1024 * 1024
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# Что можно выгрузить командой /export: запрос с фильтром по клубу и времени {where}
+EXPORTS = {
+    'stats': '''SELECT DATE(created_at) AS "Date", action AS "Action", COUNT(*) AS "Count"
+                FROM funnel_analytics
+                WHERE {where}
+                GROUP BY DATE(created_at), action
+                ORDER BY "Date" DESC, action''',
+    'events': '''SELECT created_at, user_id, action
+                 FROM funnel_analytics
+                 WHERE {where}
+                 ORDER BY created_at''',
+    'payments': '''SELECT payment_id, user_id, amount, tariff, status, yookassa_id, created_at
+                   FROM payments
+                   WHERE {where}
+                   ORDER BY created_at''',
+    'users': '''SELECT user_id, username, tariff, subscription_until, created_at
+                FROM users
+                WHERE {where}
+                ORDER BY created_at''',
+}
+
+class SpooledInputFile(InputFile):
+    """Файл для отправки, который читается из временного файла по кускам"""
+
+    def __init__(self, file, filename, chunk_size=64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot):
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+def build_query(table, date_from=None, date_to=None, tenant_id=None):
+    """Запрос выгрузки клуба tenant_id (по умолчанию - текущего) с фильтром по дням
+    [date_from, date_to] включительно -> (запрос, параметры)"""
+    conditions = ['tenant_id = %(tenant)s']
+    if date_from:
+        conditions.append('created_at >= %(date_from)s')
+    if date_to:
+        conditions.append("created_at < %(date_to)s::date + INTERVAL '1 day'")
+    query = EXPORTS[table].format(where=' AND '.join(conditions))
+    return query, {'date_from': date_from, 'date_to': date_to,
+                   'tenant': tenant_id or tenants.current().tenant_id}
+
+def copy_to_spool(get_db_connection, query, params=None, compress=False, bom=False):
+    """COPY запроса во временный файл. Возвращает (файл, размер в байтах)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MB * 1024 * 1024)
+    target = gzip.GzipFile(fileobj=spool, mode='wb') if compress else spool
+    if bom:
+        target.write(UTF8_BOM)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        if params:
+            query = cur.mogrify(query, params).decode()
+        cur.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', target)
+        conn.commit()
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    if compress:
+        target.close()
+    size = spool.tell()
+    return spool, size
+
+async def send_export(message, get_db_connection, query, name, caption, params=None,
+                      compress=False, bom=False):
+    """Выгрузить запрос и отправить документом. False, если файл больше лимита Telegram"""
+    spool, size = await asyncio.to_thread(copy_to_spool, get_db_connection, query, params,
+                                          compress, bom)
+    try:
+        if size > TELEGRAM_FILE_LIMIT:
+            await message.answer(f"❌ Файл получился {size // (1024 * 1024)} МБ - больше лимита "
+                                 f"Telegram. Сузьте период или добавьте gz")
+            return False
+        filename = f"{name}_{datetime.now().strftime('%Y%m%d')}.csv" + ('.gz' if compress else '')
+        await message.answer_document(SpooledInputFile(spool, filename), caption=caption)
+        return True
+    finally:
+        spool.close()
+
+def parse_export_args(args):
+    """/export [таблица] [с YYYY-MM-DD] [по YYYY-MM-DD] [gz] -> (таблица, с, по, gzip)"""
+    table, dates, compress = 'stats', [], False
+    for arg in (args or '').split():
+        if arg.lower() in ('gz', 'gzip'):
+            compress = True
+        elif arg in EXPORTS:
+            table = arg
+        else:
+            dates.append(datetime.strptime(arg, '%Y-%m-%d').date())
+    if len(dates) > 2:
+        raise ValueError("слишком много дат")
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+    return table, date_from, date_to, compress
+
+# ============================================
+# PARQUET
+# ============================================
+
+# Таблица -> (запрос с фильтром {where}, колонки с типами, колонка водяного знака).
+# Без водяного знака таблица выгружается целиком: users и payments меняются
+# задним числом (продление, смена статуса), а события только дописываются
+PARQUET_EXPORTS = {
+    'events': ('''SELECT created_at, user_id, action
+                  FROM funnel_analytics
+                  WHERE {where}
+                  ORDER BY created_at''',
+               [('created_at', 'timestamp'), ('user_id', 'int64'), ('action', 'string')],
+               'created_at'),
+    'payments': ('''SELECT payment_id, user_id, amount, tariff, status, created_at
+                    FROM payments
+                    WHERE {where}
+                    ORDER BY created_at''',
+                 [('payment_id', 'string'), ('user_id', 'int64'), ('amount', 'float64'),
+                  ('tariff', 'string'), ('status', 'string'), ('created_at', 'timestamp')],
+                 None),
+    'users': ('''SELECT user_id, username, tariff, subscription_until, created_at
+                 FROM users
+                 WHERE {where}
+                 ORDER BY created_at''',
+              [('user_id', 'int64'), ('username', 'string'), ('tariff', 'string'),
+               ('subscription_until', 'timestamp'), ('created_at', 'timestamp')],
+              None),
+}
+
+def init_schema(cur):
+    cur.execute('''CREATE TABLE IF NOT EXISTS export_watermarks
+                 (export_name TEXT PRIMARY KEY,
+                  exported_until TIMESTAMP NOT NULL,
+                  updated_at TIMESTAMP DEFAULT NOW())''')
+
+def watermark_name(name, tenant_id):
+    """Имя водяного знака выгрузки клуба; у клуба по умолчанию - прежнее имя без клуба"""
+    return name if tenant_id == tenants.DEFAULT_TENANT else f"{name}:{tenant_id}"
+
+def get_export_window(get_db_connection, name):
+    """(с, по) для инкрементальной выгрузки: с - прошлый водяной знак,
+    по - время базы минус WATERMARK_LAG"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''SELECT (SELECT exported_until FROM export_watermarks WHERE export_name = %s) AS since,
+                          LOCALTIMESTAMP - %s AS until''',
+                (name, WATERMARK_LAG))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return row['since'], row['until']
+
+def set_watermark(get_db_connection, name, until):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''INSERT INTO export_watermarks (export_name, exported_until, updated_at)
+                   VALUES (%s, %s, NOW())
+                   ON CONFLICT (export_name)
+                   DO UPDATE SET exported_until = EXCLUDED.exported_until, updated_at = NOW()''',
+                (name, until))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def write_parquet(get_db_connection, name, tenant_id, since=None, until=None):
+    """Выгрузка строк клуба tenant_id в Parquet группами по PARQUET_ROW_GROUP строк
+    из серверного курсора. Возвращает (файл, размер в байтах, число строк)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'timestamp': pa.timestamp('us'), 'int64': pa.int64(),
+             'float64': pa.float64(), 'string': pa.string()}
+    query, columns, mark = PARQUET_EXPORTS[name]
+    conditions = ['tenant_id = %(tenant)s']
+    if mark and since:
+        conditions.append(f'{mark} >= %(since)s')
+    if mark and until:
+        conditions.append(f'{mark} < %(until)s')
+    schema = pa.schema([(column, types[kind]) for column, kind in columns])
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MB * 1024 * 1024)
+    conn = get_db_connection()
+    # Именованный курсор: строки приходят с сервера порциями, а не все сразу
+    cur = conn.cursor(name=f'parquet_{name}')
+    rows = 0
+    try:
+        cur.execute(query.format(where=' AND '.join(conditions)),
+                    {'since': since, 'until': until, 'tenant': tenant_id})
+        writer = pq.ParquetWriter(spool, schema, compression='zstd')
+        while True:
+            batch = cur.fetchmany(PARQUET_ROW_GROUP)
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pydict(
+                {column: [row[column] for row in batch] for column, _ in columns}, schema=schema))
+            rows += len(batch)
+        writer.close()
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        cur.close()
+        conn.rollback()
+        conn.close()
+
+    return spool, spool.tell(), rows
+
+async def send_parquet(message, get_db_connection, name, full=False):
+    """Выгрузить таблицу текущего клуба в Parquet и отправить. Для инкрементальных
+    выгрузок водяной знак (свой у каждого клуба) сдвигается только после успешной отправки"""
+    mark = PARQUET_EXPORTS[name][2]
+    tenant_id = tenants.current().tenant_id
+    since = until = None
+    if mark:
+        since, until = await asyncio.to_thread(get_export_window, get_db_connection,
+                                               watermark_name(name, tenant_id))
+        if full:
+            since = None
+
+    spool, size, rows = await asyncio.to_thread(write_parquet, get_db_connection, name, tenant_id,
+                                                since, until)
+    try:
+        period = f"с {since:%Y-%m-%d %H:%M} " if since else ""
+        period += f"по {until:%Y-%m-%d %H:%M}" if until else "полная выгрузка"
+        if not rows:
+            await message.answer(f"📭 {name}: новых строк нет ({period})")
+        elif size > TELEGRAM_FILE_LIMIT:
+            await message.answer(f"❌ Файл получился {size // (1024 * 1024)} МБ - больше лимита Telegram")
+            return False
+        else:
+            filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M')}.parquet"
+            await message.answer_document(SpooledInputFile(spool, filename),
+                                          caption=f"📦 {name}: {rows} строк, {period}")
+    finally:
+        spool.close()
+
+    if mark:
+        await asyncio.to_thread(set_watermark, get_db_connection, watermark_name(name, tenant_id), until)
+        logging.info(f"Parquet export {name}: {rows} rows, watermark {until}")
+    return True
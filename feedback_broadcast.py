@@ -8,9 +8,15 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from datetime import datetime
-import asyncio
 import logging
 
+import admin_guard
+import approx_stats
+import delivery
+import exporter
+import tenants
+from stats_cache import stats_cache, age_footer
+
 # ============================================
 # ТАБЛИЦА ОБРАТНОЙ СВЯЗИ
 # ============================================
@@ -31,6 +37,9 @@ def create_feedback_table(get_db_connection):
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        # Клуб (tenants) отзыва; старые отзывы - клуба по умолчанию
+        cur.execute('''ALTER TABLE feedback ADD COLUMN IF NOT EXISTS tenant_id TEXT NOT NULL DEFAULT %s''',
+                    (tenants.DEFAULT_TENANT,))
         conn.commit()
         cur.close()
         conn.close()
@@ -42,18 +51,20 @@ def create_feedback_table(get_db_connection):
 # ПОЛУЧЕНИЕ ПОЛЬЗОВАТЕЛЕЙ
 # ============================================
 
-def get_users_with_expired_subscription(get_db_connection):
-    """Получаем пользователей у которых истекла подписка"""
+def get_users_with_expired_subscription(get_db_connection, tenant_id=None):
+    """Получаем пользователей у которых истекла подписка (клуба tenant_id, по умолчанию - текущего)"""
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute('''
+        cur.execute(f'''
             SELECT user_id, username 
             FROM users 
             WHERE subscription_until < %s 
             AND subscription_until IS NOT NULL
-        ''', (datetime.now(),))
+            AND tenant_id = %s
+            AND {delivery.not_suppressed('users.user_id')}
+        ''', (datetime.now(), tenant_id or tenants.current().tenant_id))
         
         users = cur.fetchall()
         cur.close()
@@ -105,20 +116,83 @@ FEEDBACK_NAMES = {
     'other': '💬 Другая причина'
 }
 
+def build_feedback_stats_report(get_db_connection, tenant_id, approx=False):
+    """Текст /feedback_stats клуба tenant_id или None, если ответов ещё нет.
+    approx - из счётчиков stats_counters вместо подсчёта по всей таблице"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    note = ""
+    if approx:
+        counts, info = approx_stats.counters(cur, 'feedback', tenant_id)
+        if info['watermark'] is None:
+            approx = False
+        else:
+            stats = [{'feedback_type': fb_type, 'count': count} for fb_type, count in counts.items()]
+            total = sum(counts.values())
+            note = f"\n≈ По счётчикам, ответы до {info['watermark']:%d.%m %H:%M}"
+    
+    if not approx:
+        cur.execute('''
+            SELECT feedback_type, COUNT(*) as count 
+            FROM feedback 
+            WHERE tenant_id = %s
+            GROUP BY feedback_type 
+            ORDER BY count DESC
+        ''', (tenant_id,))
+        
+        stats = cur.fetchall()
+        
+        cur.execute('SELECT COUNT(*) as total FROM feedback WHERE tenant_id = %s', (tenant_id,))
+        total = cur.fetchone()['total']
+    
+    cur.close()
+    conn.close()
+    
+    if total == 0:
+        return None
+    
+    text = "📊 <b>Статистика обратной связи</b>\n\n"
+    
+    for stat in stats:
+        fb_type = stat['feedback_type']
+        count = stat['count']
+        percent = (count / total * 100) if total > 0 else 0
+        name = FEEDBACK_NAMES.get(fb_type, fb_type)
+        
+        bar_length = int(percent / 5)
+        bar = "█" * bar_length + "░" * (20 - bar_length)
+        
+        text += f"{name}\n{bar} {count} ({percent:.1f}%)\n\n"
+    
+    text += f"<b>Всего ответов: {total}</b>"
+    return text + note
+
 # ============================================
 # РЕГИСТРАЦИЯ ХЕНДЛЕРОВ
 # ============================================
 
-def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
-    """Регистрация всех хендлеров для обратной связи"""
+def register_handlers(dp, bot, admin_ids, get_db_connection, admin_router=None):
+    """Регистрация всех хендлеров для обратной связи.
+    Админские команды и кнопки идут в admin_router (см. admin_guard) - без него
+    создаётся свой админский роутер и подключается к dp.
+    bot и admin_ids = None - бот и администраторы клуба апдейта (tenants)"""
+    if isinstance(admin_ids, int):
+        admin_ids = {admin_ids} if admin_ids else set()
+    
+    def current_bot():
+        return bot or tenants.current().bot
+    
+    def current_admins():
+        return admin_ids if admin_ids is not None else tenants.current().admin_ids
+    
+    if admin_router is None:
+        admin_router = admin_guard.admin_router(admin_ids, name='feedback_admin')
+        dp.include_router(admin_router)
     
     # Команда запуска рассылки
-    @dp.message(Command("send_feedback"))
+    @admin_router.message(Command("send_feedback"))
     async def cmd_send_feedback_request(message: types.Message):
-        if message.from_user.id != ADMIN_ID:
-            await message.answer("❌ Эта команда доступна только администратору")
-            return
-        
         users = get_users_with_expired_subscription(get_db_connection)
         
         if not users:
@@ -140,7 +214,7 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
         )
     
     # Подтверждение рассылки
-    @dp.callback_query(F.data == "confirm_fb_broadcast")
+    @admin_router.callback_query(F.data == "confirm_fb_broadcast")
     async def confirm_feedback_broadcast(callback: types.CallbackQuery):
         await callback.message.edit_text("⏳ Начинаю рассылку...")
         
@@ -149,21 +223,16 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
         error_count = 0
         
         keyboard = get_feedback_keyboard()
+        started = datetime.now()
         
         for user in users:
-            try:
-                await bot.send_message(
-                    chat_id=user['user_id'],
-                    text=FEEDBACK_MESSAGE,
-                    reply_markup=keyboard,
-                    parse_mode="HTML"
-                )
+            outcome = await delivery.send(current_bot(), get_db_connection, user['user_id'], FEEDBACK_MESSAGE,
+                                          kind='feedback_request', enqueued_at=started,
+                                          reply_markup=keyboard, parse_mode="HTML")
+            if outcome == delivery.SENT:
                 success_count += 1
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
+            else:
                 error_count += 1
-                logging.error(f"Ошибка отправки пользователю {user['user_id']}: {e}")
         
         await callback.message.answer(
             f"✅ <b>Рассылка завершена!</b>\n\n"
@@ -175,7 +244,7 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
         await callback.answer()
     
     # Отмена рассылки
-    @dp.callback_query(F.data == "cancel_fb_broadcast")
+    @admin_router.callback_query(F.data == "cancel_fb_broadcast")
     async def cancel_feedback_broadcast(callback: types.CallbackQuery):
         await callback.message.edit_text("❌ Рассылка отменена")
         await callback.answer()
@@ -193,26 +262,23 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
             conn = get_db_connection()
             cur = conn.cursor()
             cur.execute('''
-                INSERT INTO feedback (user_id, username, feedback_type, promo_code, created_at)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (user_id, username, feedback_type, promo_code, datetime.now()))
+                INSERT INTO feedback (user_id, username, feedback_type, promo_code, created_at, tenant_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', (user_id, username, feedback_type, promo_code, datetime.now(),
+                  tenants.current().tenant_id))
             conn.commit()
             cur.close()
             conn.close()
         except Exception as e:
             logging.error(f"Ошибка сохранения feedback: {e}")
         
-        if ADMIN_ID:
-            try:
-                await bot.send_message(
-                    ADMIN_ID,
-                    f"📊 <b>Новый отзыв!</b>\n"
-                    f"👤 @{username} (ID: {user_id})\n"
-                    f"💭 {FEEDBACK_NAMES.get(feedback_type, feedback_type)}",
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logging.error(f"Ошибка уведомления админа: {e}")
+        await admin_guard.notify_admins(
+            current_bot(), current_admins(),
+            f"📊 <b>Новый отзыв!</b>\n"
+            f"👤 @{username} (ID: {user_id})\n"
+            f"💭 {FEEDBACK_NAMES.get(feedback_type, feedback_type)}",
+            parse_mode="HTML"
+        )
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🎁 Посмотреть тарифы", callback_data="back")],
@@ -256,26 +322,25 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
             cur.execute('''
                 UPDATE feedback 
                 SET additional_text = %s 
-                WHERE user_id = %s 
-                ORDER BY created_at DESC 
-                LIMIT 1
-            ''', (detailed_text, user_id))
+                WHERE id = (
+                    SELECT id FROM feedback
+                    WHERE user_id = %s AND tenant_id = %s
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                )
+            ''', (detailed_text, user_id, tenants.current().tenant_id))
             conn.commit()
             cur.close()
             conn.close()
         except Exception as e:
             logging.error(f"Ошибка сохранения подробного отзыва: {e}")
         
-        if ADMIN_ID:
-            try:
-                await bot.send_message(
-                    ADMIN_ID,
-                    f"💬 <b>Подробный отзыв от @{message.from_user.username}:</b>\n\n"
-                    f"{detailed_text}",
-                    parse_mode="HTML"
-                )
-            except Exception as e:
-                logging.error(f"Ошибка уведомления админа: {e}")
+        await admin_guard.notify_admins(
+            current_bot(), current_admins(),
+            f"💬 <b>Подробный отзыв от @{message.from_user.username}:</b>\n\n"
+            f"{detailed_text}",
+            parse_mode="HTML"
+        )
         
         await message.answer(
             "✅ Спасибо! Ваш отзыв сохранён.\n\n"
@@ -285,104 +350,61 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
         await state.clear()
     
     # Статистика
-    @dp.message(Command("feedback_stats"))
+    @admin_router.message(Command("feedback_stats"))
     async def cmd_feedback_stats(message: types.Message):
-        if message.from_user.id != ADMIN_ID:
-            return
-        
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            cur.execute('''
-                SELECT feedback_type, COUNT(*) as count 
-                FROM feedback 
-                GROUP BY feedback_type 
-                ORDER BY count DESC
-            ''')
-            
-            stats = cur.fetchall()
-            
-            cur.execute('SELECT COUNT(*) as total FROM feedback')
-            total = cur.fetchone()['total']
-            
-            cur.close()
-            conn.close()
+            approx = approx_stats.wants_approx(message.text)
+            tenant_id = tenants.current().tenant_id
+            text, age = await stats_cache.get(
+                f"{tenant_id}:feedback_stats{'~' if approx else ''}",
+                lambda: build_feedback_stats_report(get_db_connection, tenant_id, approx)
+            )
             
-            if total == 0:
+            if text is None:
                 await message.answer("📊 Пока нет ответов на опрос обратной связи")
                 return
             
-            text = "📊 <b>Статистика обратной связи</b>\n\n"
-            
-            for stat in stats:
-                fb_type = stat['feedback_type']
-                count = stat['count']
-                percent = (count / total * 100) if total > 0 else 0
-                name = FEEDBACK_NAMES.get(fb_type, fb_type)
-                
-                bar_length = int(percent / 5)
-                bar = "█" * bar_length + "░" * (20 - bar_length)
-                
-                text += f"{name}\n{bar} {count} ({percent:.1f}%)\n\n"
-            
-            text += f"<b>Всего ответов: {total}</b>"
-            
-            await message.answer(text, parse_mode="HTML")
+            await message.answer(text + age_footer(age), parse_mode="HTML")
             
         except Exception as e:
             logging.error(f"Ошибка получения статистики: {e}")
             await message.answer(f"❌ Ошибка: {e}")
     
     # Экспорт в CSV
-    @dp.message(Command("export_feedback"))
+    @admin_router.message(Command("export_feedback"))
     async def cmd_export_feedback(message: types.Message):
-        if message.from_user.id != ADMIN_ID:
-            return
-        
         try:
             conn = get_db_connection()
             cur = conn.cursor()
-            
-            cur.execute('''
-                SELECT user_id, username, feedback_type, additional_text, promo_code, created_at 
-                FROM feedback 
-                ORDER BY created_at DESC
-            ''')
-            
-            feedbacks = cur.fetchall()
+            tenant_id = tenants.current().tenant_id
+            cur.execute('SELECT EXISTS (SELECT 1 FROM feedback WHERE tenant_id = %s) AS has_feedback',
+                        (tenant_id,))
+            has_feedback = cur.fetchone()['has_feedback']
             cur.close()
             conn.close()
             
-            if not feedbacks:
+            if not has_feedback:
                 await message.answer("📊 Нет данных для экспорта")
                 return
             
-            import csv
-            from io import StringIO
-            
-            output = StringIO()
-            writer = csv.writer(output)
-            writer.writerow(['User ID', 'Username', 'Тип отзыва', 'Подробности', 'Промокод', 'Дата'])
-            
-            for fb in feedbacks:
-                writer.writerow([
-                    fb['user_id'],
-                    fb['username'],
-                    FEEDBACK_NAMES.get(fb['feedback_type'], fb['feedback_type']),
-                    fb['additional_text'] or '-',
-                    fb['promo_code'],
-                    fb['created_at'].strftime('%Y-%m-%d %H:%M')
-                ])
+            # Названия причин подставляет сама база - строки идут прямо в файл через COPY
+            names_case = ' '.join('WHEN %s THEN %s' for _ in FEEDBACK_NAMES)
+            params = [value for item in FEEDBACK_NAMES.items() for value in item] + [tenant_id]
+            query = f'''
+                SELECT user_id AS "User ID",
+                       username AS "Username",
+                       CASE feedback_type {names_case} ELSE feedback_type END AS "Тип отзыва",
+                       COALESCE(NULLIF(additional_text, ''), '-') AS "Подробности",
+                       promo_code AS "Промокод",
+                       to_char(created_at, 'YYYY-MM-DD HH24:MI') AS "Дата"
+                FROM feedback 
+                WHERE tenant_id = %s
+                ORDER BY created_at DESC
+            '''
             
-            output.seek(0)
-            await message.answer_document(
-                types.BufferedInputFile(
-                    output.getvalue().encode('utf-8-sig'),
-                    filename=f'feedback_{datetime.now().strftime("%Y%m%d")}.csv'
-                ),
-                caption="📊 Экспорт обратной связи"
-            )
+            # BOM - чтобы Excel открыл кириллицу без перекодировки
+            await exporter.send_export(message, get_db_connection, query, 'feedback',
+                                       "📊 Экспорт обратной связи", params=params, bom=True)
             
         except Exception as e:
             logging.error(f"Ошибка экспорта: {e}")
@@ -392,11 +414,11 @@ def register_handlers(dp, bot, ADMIN_ID, get_db_connection):
 # ИНИЦИАЛИЗАЦИЯ
 # ============================================
 
-def init_feedback_system(dp, bot, ADMIN_ID, get_db_connection):
+def init_feedback_system(dp, bot, admin_ids, get_db_connection):
     """Инициализация системы обратной связи"""
     try:
         create_feedback_table(get_db_connection)
-        register_handlers(dp, bot, ADMIN_ID, get_db_connection)
+        register_handlers(dp, bot, admin_ids, get_db_connection)
         logging.info("✅ Система обратной связи инициализирована")
     except Exception as e:
         logging.error(f"❌ Ошибка инициализации системы обратной связи: {e}")
@@ -0,0 +1,41 @@
+"""
+Хендлеры по доменам - отдельные роутеры aiogram.
+Callback-кнопки каждого роутера ищутся через CallbackIndex (словарь по
+callback_data), а не перебором фильтров F.data == ...
+
+Админские роутеры (рассылка, отчёты, команды обратной связи) подключены внутрь
+одного роутера admin_guard: апдейты не от администраторов клуба (tenants)
+отсекаются одним middleware и идут дальше, не проверяя фильтры админских хендлеров.
+Команды оператора (handlers.operator: профили и фоновые задачи всего процесса) -
+в своём роутере admin_guard только для config.ADMIN_IDS: администратор клуба
+их не видит.
+
+Порядок подключения важен для сообщений: команды онбординга, оплаты и FAQ
+срабатывают раньше обратной связи, а админский роутер - последним, так что
+ожидание текста рассылки (любое сообщение в состоянии
+BroadcastStates.waiting_for_message) видит только то, что не взяли остальные
+"""
+
+from aiogram import Router
+
+import admin_guard
+import config
+import feedback_broadcast
+from db import get_db_connection
+from handlers import onboarding, payments, faq, broadcast, admin_stats, membership, operator
+
+admin = admin_guard.admin_router()
+admin.include_routers(broadcast.router, admin_stats.router)
+
+operators = admin_guard.admin_router(config.ADMIN_IDS, name='operators')
+operators.include_router(operator.router)
+
+# Обратная связь регистрирует хендлеры сама - даём ей свой роутер,
+# а админские команды она кладёт в общий админский. Бот и администраторы - клуба апдейта
+feedback = Router(name='feedback')
+feedback_broadcast.register_handlers(feedback, None, None, get_db_connection, admin_router=admin)
+
+ROUTERS = [onboarding.router, payments.router, faq.router, membership.router, feedback, operators, admin]
+
+def setup_routers(dp):
+    dp.include_routers(*ROUTERS)
@@ -0,0 +1,848 @@
+"""
+Админские отчёты, выгрузки и обслуживание клуба: статистика, экспорт, /checkdb, /cleardb
+Подключается внутрь админского роутера (admin_guard) - проверки доступа в хендлерах нет.
+Данные всего процесса (профили, фоновые задачи) - в handlers.operator
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram import Router, types
+from aiogram.filters import Command
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import analytics
+import approx_stats
+import delivery
+import exporter
+import tenants
+from callback_index import CallbackIndex
+from db import get_db_connection
+from stats_cache import stats_cache, age_footer
+
+router = Router(name='admin_stats')
+callbacks = CallbackIndex(router)
+
+# ========================================
+# СТАТИСТИКА
+# ========================================
+
+def build_stats_report(tenant_id):
+    """Текст /stats клуба tenant_id: пользователи, доход и воронка за 7 дней"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute('SELECT COUNT(*) as count FROM users WHERE tenant_id = %s', (tenant_id,))
+    total_users = cur.fetchone()['count']
+    
+    cur.execute('SELECT COUNT(*) as count FROM users WHERE subscription_until > %s AND tenant_id = %s', 
+                (datetime.now(), tenant_id))
+    active_users = cur.fetchone()['count']
+    
+    cur.execute('SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE status = %s AND tenant_id = %s',
+                ('completed', tenant_id))
+    total_revenue = cur.fetchone()['total']
+    
+    cur.execute('SELECT COUNT(*) as count FROM payments WHERE status = %s AND tenant_id = %s',
+                ('pending', tenant_id))
+    pending_payments = cur.fetchone()['count']
+    
+    cur.execute('''SELECT action, COUNT(*) as count 
+                   FROM funnel_analytics 
+                   WHERE created_at >= NOW() - INTERVAL '7 days'
+                   AND tenant_id = %s
+                   GROUP BY action''', (tenant_id,))
+    funnel_stats = cur.fetchall()
+    
+    cur.close()
+    conn.close()
+    
+    stats_text = f"""📊 **Статистика бота**
+
+👥 Всего пользователей: {total_users}
+✅ Активных подписок: {active_users}
+💰 Общий доход: {total_revenue}₽
+⏳ Ожидают оплаты: {pending_payments}
+
+📈 **Воронка прогрева (7 дней):**
+"""
+    
+    for stat in funnel_stats:
+        stats_text += f"• {stat['action']}: {stat['count']}\n"
+    
+    return stats_text
+
+@router.message(Command("stats"))
+async def admin_stats(message: types.Message):
+    tenant_id = tenants.current().tenant_id
+    stats_text, age = await stats_cache.get(f'{tenant_id}:stats', lambda: build_stats_report(tenant_id))
+    await message.answer(stats_text + age_footer(age), parse_mode="HTML")
+
+# ========================================
+# 📊 РАСШИРЕННЫЕ КОМАНДЫ СТАТИСТИКИ
+# ========================================
+
+@router.message(Command("month"))
+async def admin_month_stats(message: types.Message):
+    """📊 Статистика за последние 30 дней"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    # Воронка за месяц
+    cur.execute('''SELECT action, COUNT(*) as count 
+                   FROM funnel_analytics 
+                   WHERE created_at >= NOW() - INTERVAL '30 days'
+                   AND tenant_id = %s
+                   GROUP BY action
+                   ORDER BY count DESC''', (tenant_id,))
+    month_stats = cur.fetchall()
+    
+    # Новые юзеры за месяц
+    cur.execute('''SELECT COUNT(*) as count 
+                   FROM users 
+                   WHERE created_at >= NOW() - INTERVAL '30 days'
+                   AND tenant_id = %s''', (tenant_id,))
+    new_users_month = cur.fetchone()['count']
+    
+    # Платежи за месяц
+    cur.execute('''SELECT 
+                   COUNT(*) as count,
+                   COALESCE(SUM(amount), 0) as revenue,
+                   COUNT(*) FILTER (WHERE tariff = '1month') as month_count,
+                   COUNT(*) FILTER (WHERE tariff = 'forever') as forever_count
+                   FROM payments 
+                   WHERE created_at >= NOW() - INTERVAL '30 days'
+                   AND status = 'completed'
+                   AND tenant_id = %s''', (tenant_id,))
+    payments_month = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    stats_text = f"""📊 <b>СТАТИСТИКА ЗА 30 ДНЕЙ</b>
+
+👥 Новых пользователей: {new_users_month}
+💰 Платежей: {payments_month['count']}
+   • 1 месяц: {payments_month['month_count']}
+   • Forever: {payments_month['forever_count']}
+💵 Доход: {payments_month['revenue']}₽
+
+📈 <b>Воронка за месяц:</b>
+"""
+    
+    for stat in month_stats:
+        stats_text += f"• {stat['action']}: {stat['count']}\n"
+    
+    # Конверсии
+    started = next((s['count'] for s in month_stats if s['action'] == 'started_bot'), 0)
+    trial = next((s['count'] for s in month_stats if s['action'] == 'activated_trial'), 0)
+    payments = payments_month['count']
+    
+    if started > 0:
+        trial_conv = round(100 * trial / started, 1)
+        payment_conv = round(100 * payments / started, 1)
+        trial_to_pay = round(100 * payments / trial, 1) if trial > 0 else 0
+        
+        stats_text += f"\n💡 <b>Конверсии:</b>\n"
+        stats_text += f"• Start → Trial: {trial_conv}%\n"
+        stats_text += f"• Trial → Payment: {trial_to_pay}%\n"
+        stats_text += f"• Start → Payment: {payment_conv}%\n"
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+@router.message(Command("weeks"))
+async def admin_weeks_stats(message: types.Message):
+    """📊 Статистика по неделям (последние 4 недели)"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    stats_text = "📊 <b>СТАТИСТИКА ПО НЕДЕЛЯМ</b>\n\n"
+    
+    for week in range(4):
+        start_days = (week + 1) * 7
+        end_days = week * 7
+        
+        # Воронка за неделю
+        cur.execute('''SELECT 
+                       COUNT(*) FILTER (WHERE action = 'started_bot') as started,
+                       COUNT(*) FILTER (WHERE action = 'activated_trial') as trial,
+                       COUNT(*) FILTER (WHERE action LIKE 'completed_payment%%') as payments
+                       FROM funnel_analytics 
+                       WHERE created_at >= NOW() - %s * INTERVAL '1 day'
+                       AND created_at < NOW() - %s * INTERVAL '1 day'
+                       AND tenant_id = %s''', (start_days, end_days, tenant_id))
+        week_data = cur.fetchone()
+        
+        # Доход за неделю
+        cur.execute('''SELECT COALESCE(SUM(amount), 0) as revenue
+                       FROM payments 
+                       WHERE created_at >= NOW() - %s * INTERVAL '1 day'
+                       AND created_at < NOW() - %s * INTERVAL '1 day'
+                       AND status = 'completed'
+                       AND tenant_id = %s''', (start_days, end_days, tenant_id))
+        revenue = cur.fetchone()['revenue']
+        
+        # Определяем дату начала недели
+        week_start = (datetime.now() - timedelta(days=start_days)).strftime('%d.%m')
+        week_end = (datetime.now() - timedelta(days=end_days)).strftime('%d.%m')
+        
+        conv = round(100 * week_data['payments'] / week_data['started'], 1) if week_data['started'] > 0 else 0
+        
+        stats_text += f"<b>Неделя {4-week} ({week_start}-{week_end}):</b>\n"
+        stats_text += f"  👥 Started: {week_data['started']}\n"
+        stats_text += f"  🎁 Trial: {week_data['trial']}\n"
+        stats_text += f"  💰 Payments: {week_data['payments']} ({conv}%)\n"
+        stats_text += f"  💵 Доход: {revenue}₽\n\n"
+    
+    cur.close()
+    conn.close()
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+@router.message(Command("days"))
+async def admin_days_stats(message: types.Message):
+    """📊 Детальная статистика по дням (последние 7)"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    stats_text = "📊 <b>СТАТИСТИКА ПО ДНЯМ</b>\n\n"
+    
+    for day in range(7):
+        # Воронка за день
+        cur.execute('''SELECT 
+                       COUNT(*) FILTER (WHERE action = 'started_bot') as started,
+                       COUNT(*) FILTER (WHERE action = 'viewed_demo') as demo,
+                       COUNT(*) FILTER (WHERE action = 'activated_trial') as trial,
+                       COUNT(*) FILTER (WHERE action LIKE 'completed_payment%%') as payments
+                       FROM funnel_analytics 
+                       WHERE created_at >= CURRENT_DATE - %s * INTERVAL '1 day'
+                       AND created_at < CURRENT_DATE - %s * INTERVAL '1 day'
+                       AND tenant_id = %s''', (day + 1, day, tenant_id))
+        day_data = cur.fetchone()
+        
+        # Доход за день
+        cur.execute('''SELECT COALESCE(SUM(amount), 0) as revenue
+                       FROM payments 
+                       WHERE created_at >= CURRENT_DATE - %s * INTERVAL '1 day'
+                       AND created_at < CURRENT_DATE - %s * INTERVAL '1 day'
+                       AND status = 'completed'
+                       AND tenant_id = %s''', (day + 1, day, tenant_id))
+        revenue = cur.fetchone()['revenue']
+        
+        date_str = (datetime.now() - timedelta(days=day)).strftime('%d.%m (%a)')
+        
+        stats_text += f"<b>{date_str}:</b>\n"
+        stats_text += f"  👥 {day_data['started']} → "
+        stats_text += f"🎥 {day_data['demo']} → "
+        stats_text += f"🎁 {day_data['trial']} → "
+        stats_text += f"💰 {day_data['payments']} = {revenue}₽\n"
+    
+    cur.close()
+    conn.close()
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+def build_alltime_report(tenant_id, approx=False):
+    """Текст /alltime клуба tenant_id: итоги и средние за всё время.
+    approx - события из счётчиков stats_counters, пользователи из оценки pg_class и выборки"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    note = ""
+    if approx:
+        counts, info = approx_stats.counters(cur, 'events', tenant_id)
+        if info['watermark'] is None:
+            # Счётчики ещё не собраны - считаем точно
+            approx = False
+            note = "\n⚠️ Счётчики ещё не собраны, данные точные"
+    
+    if approx:
+        alltime_stats = [{'action': action, 'count': count} for action, count in counts.items()]
+        total_users = approx_stats.estimated_tenant_rows(cur, 'users', tenant_id)
+        dates = {'first': info['first_seen'], 'last': info['last_seen'] or info['first_seen']}
+        note = (f"\n👤 Уникальных в событиях: ≈{info['distinct'] or 0}"
+                + approx_stats.error_note(info['watermark']))
+    else:
+        # Общая воронка
+        cur.execute('''SELECT action, COUNT(*) as count 
+                       FROM funnel_analytics 
+                       WHERE tenant_id = %s
+                       GROUP BY action
+                       ORDER BY count DESC''', (tenant_id,))
+        alltime_stats = cur.fetchall()
+        
+        # Все юзеры
+        cur.execute('SELECT COUNT(*) as count FROM users WHERE tenant_id = %s', (tenant_id,))
+        total_users = cur.fetchone()['count']
+    
+    # Все платежи
+    cur.execute('''SELECT 
+                   COUNT(*) as count,
+                   COALESCE(SUM(amount), 0) as revenue,
+                   COUNT(*) FILTER (WHERE tariff = '1month') as month_count,
+                   COUNT(*) FILTER (WHERE tariff = 'forever') as forever_count,
+                   AVG(amount) as avg_check
+                   FROM payments 
+                   WHERE status = 'completed'
+                   AND tenant_id = %s''', (tenant_id,))
+    alltime_payments = cur.fetchone()
+    
+    # Первая и последняя активность
+    if not approx:
+        cur.execute('''SELECT MIN(created_at) as first, MAX(created_at) as last
+                       FROM funnel_analytics WHERE tenant_id = %s''', (tenant_id,))
+        dates = cur.fetchone()
+    
+    days_active = (dates['last'] - dates['first']).days + 1
+    
+    cur.close()
+    conn.close()
+    
+    stats_text = f"""📊 <b>СТАТИСТИКА ЗА ВСЁ ВРЕМЯ</b>
+
+⏰ Период: {dates['first'].strftime('%d.%m.%Y')} - {dates['last'].strftime('%d.%m.%Y')}
+📅 Дней активности: {days_active}
+
+👥 Всего пользователей: {total_users}
+💰 Всего платежей: {alltime_payments['count']}
+   • 1 месяц: {alltime_payments['month_count']}
+   • Forever: {alltime_payments['forever_count']}
+💵 Общий доход: {alltime_payments['revenue']}₽
+💳 Средний чек: {round(alltime_payments['avg_check'], 2)}₽
+
+📈 <b>Средние показатели:</b>
+• Юзеров/день: {round(total_users / days_active, 1)}
+• Платежей/день: {round(alltime_payments['count'] / days_active, 1)}
+• Доход/день: {round(alltime_payments['revenue'] / days_active, 2)}₽
+
+📊 <b>Топ-10 событий:</b>
+"""
+    
+    for stat in alltime_stats[:10]:
+        stats_text += f"• {stat['action']}: {stat['count']}\n"
+    
+    return stats_text + note
+
+@router.message(Command("alltime"))
+async def admin_alltime_stats(message: types.Message):
+    """📊 Статистика за ВСЁ время (/alltime ~ - приблизительно, /alltime exact - точно)"""
+    approx = approx_stats.wants_approx(message.text)
+    tenant_id = tenants.current().tenant_id
+    stats_text, age = await stats_cache.get(f"{tenant_id}:alltime{'~' if approx else ''}",
+                                            lambda: build_alltime_report(tenant_id, approx))
+    await message.answer(stats_text + age_footer(age), parse_mode="HTML")
+
+@router.message(Command("compare"))
+async def admin_compare_stats(message: types.Message):
+    """📊 Сравнение: эта неделя vs прошлая"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    # Эта неделя
+    cur.execute('''SELECT 
+                   COUNT(*) FILTER (WHERE action = 'started_bot') as started,
+                   COUNT(*) FILTER (WHERE action = 'activated_trial') as trial,
+                   COUNT(*) FILTER (WHERE action LIKE 'completed_payment%%') as payments
+                   FROM funnel_analytics 
+                   WHERE created_at >= NOW() - INTERVAL '7 days'
+                   AND tenant_id = %s''', (tenant_id,))
+    this_week = cur.fetchone()
+    
+    cur.execute('''SELECT COALESCE(SUM(amount), 0) as revenue
+                   FROM payments 
+                   WHERE created_at >= NOW() - INTERVAL '7 days'
+                   AND status = 'completed'
+                   AND tenant_id = %s''', (tenant_id,))
+    this_revenue = cur.fetchone()['revenue']
+    
+    # Прошлая неделя
+    cur.execute('''SELECT 
+                   COUNT(*) FILTER (WHERE action = 'started_bot') as started,
+                   COUNT(*) FILTER (WHERE action = 'activated_trial') as trial,
+                   COUNT(*) FILTER (WHERE action LIKE 'completed_payment%%') as payments
+                   FROM funnel_analytics 
+                   WHERE created_at >= NOW() - INTERVAL '14 days'
+                   AND created_at < NOW() - INTERVAL '7 days'
+                   AND tenant_id = %s''', (tenant_id,))
+    last_week = cur.fetchone()
+    
+    cur.execute('''SELECT COALESCE(SUM(amount), 0) as revenue
+                   FROM payments 
+                   WHERE created_at >= NOW() - INTERVAL '14 days'
+                   AND created_at < NOW() - INTERVAL '7 days'
+                   AND status = 'completed'
+                   AND tenant_id = %s''', (tenant_id,))
+    last_revenue = cur.fetchone()['revenue']
+    
+    cur.close()
+    conn.close()
+    
+    # Расчёт изменений
+    def calc_change(current, previous):
+        if previous == 0:
+            return "+∞%" if current > 0 else "0%"
+        change = round(100 * (current - previous) / previous, 1)
+        return f"+{change}%" if change > 0 else f"{change}%"
+    
+    started_change = calc_change(this_week['started'], last_week['started'])
+    trial_change = calc_change(this_week['trial'], last_week['trial'])
+    payments_change = calc_change(this_week['payments'], last_week['payments'])
+    revenue_change = calc_change(this_revenue, last_revenue)
+    
+    # Эмодзи для изменений
+    def get_emoji(change_str):
+        if change_str.startswith('+'):
+            return '📈'
+        elif change_str.startswith('-'):
+            return '📉'
+        else:
+            return '➡️'
+    
+    stats_text = f"""📊 <b>СРАВНЕНИЕ: ЭТА vs ПРОШЛАЯ НЕДЕЛЯ</b>
+
+👥 <b>Started Bot:</b>
+  • Эта неделя: {this_week['started']}
+  • Прошлая: {last_week['started']}
+  • Изменение: {get_emoji(started_change)} {started_change}
+
+🎁 <b>Activated Trial:</b>
+  • Эта неделя: {this_week['trial']}
+  • Прошлая: {last_week['trial']}
+  • Изменение: {get_emoji(trial_change)} {trial_change}
+
+💰 <b>Payments:</b>
+  • Эта неделя: {this_week['payments']}
+  • Прошлая: {last_week['payments']}
+  • Изменение: {get_emoji(payments_change)} {payments_change}
+
+💵 <b>Доход:</b>
+  • Эта неделя: {this_revenue}₽
+  • Прошлая: {last_revenue}₽
+  • Изменение: {get_emoji(revenue_change)} {revenue_change}
+"""
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+@router.message(Command("growth"))
+async def admin_growth_stats(message: types.Message):
+    """📊 График роста по дням"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    stats_text = "📈 <b>ГРАФИК РОСТА (последние 14 дней)</b>\n\n"
+    
+    max_started = 0
+    days_data = []
+    
+    # Собираем данные
+    for day in range(13, -1, -1):
+        cur.execute('''SELECT 
+                       COUNT(*) FILTER (WHERE action = 'started_bot') as started
+                       FROM funnel_analytics 
+                       WHERE created_at >= CURRENT_DATE - %s * INTERVAL '1 day'
+                       AND created_at < CURRENT_DATE - %s * INTERVAL '1 day'
+                       AND tenant_id = %s''', (day + 1, day, tenant_id))
+        started = cur.fetchone()['started']
+        days_data.append(started)
+        max_started = max(max_started, started)
+    
+    # Рисуем график
+    for idx, count in enumerate(days_data):
+        date = (datetime.now() - timedelta(days=13-idx)).strftime('%d.%m')
+        bars = '█' * int(20 * count / max_started) if max_started > 0 else ''
+        stats_text += f"{date} {bars} {count}\n"
+    
+    cur.close()
+    conn.close()
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+@router.message(Command("cohorts"))
+async def admin_cohorts(message: types.Message):
+    """👥 Когорты: /cohorts [дней] [срок конверсии в днях]"""
+    args = message.text.split()[1:]
+    try:
+        days = int(args[0]) if args else 14
+        horizon = int(args[1]) if len(args) > 1 else analytics.COHORT_HORIZON_DAYS
+    except ValueError:
+        await message.answer("❌ Формат: /cohorts [дней] [срок конверсии в днях]")
+        return
+    days = max(1, min(days, 60))
+    
+    rows = await asyncio.to_thread(analytics.cohorts, get_db_connection, days, horizon,
+                                   tenant_id=tenants.current().tenant_id)
+    await message.answer(analytics.format_cohorts(rows, horizon), parse_mode="HTML")
+
+@router.message(Command("delivery"))
+async def admin_delivery(message: types.Message):
+    """📬 Доставляемость по видам сообщений: /delivery [часов]"""
+    args = message.text.split()[1:]
+    try:
+        hours = int(args[0]) if args else 24
+    except ValueError:
+        await message.answer("❌ Формат: /delivery [часов]")
+        return
+    hours = max(1, min(hours, 24 * 90))
+    
+    tenant_id = tenants.current().tenant_id
+    rows, age = await stats_cache.get(f'{tenant_id}:delivery:{hours}',
+                                      lambda: delivery.ledger_summary(get_db_connection, tenant_id, hours))
+    await message.answer(delivery.format_ledger_summary(rows, hours) + age_footer(age), parse_mode="HTML")
+
+@router.message(Command("today"))
+async def admin_today_stats(message: types.Message):
+    """📊 Статистика ЗА СЕГОДНЯ"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    # Статистика за сегодня
+    cur.execute('''SELECT action, COUNT(*) as count 
+                   FROM funnel_analytics 
+                   WHERE created_at >= CURRENT_DATE
+                   AND tenant_id = %s
+                   GROUP BY action
+                   ORDER BY count DESC''', (tenant_id,))
+    today_stats = cur.fetchall()
+    
+    # Новые юзеры сегодня
+    cur.execute('''SELECT COUNT(*) as count 
+                   FROM users 
+                   WHERE created_at >= CURRENT_DATE
+                   AND tenant_id = %s''', (tenant_id,))
+    new_users_today = cur.fetchone()['count']
+    
+    # Платежи сегодня
+    cur.execute('''SELECT 
+                   COUNT(*) as count,
+                   COALESCE(SUM(amount), 0) as revenue
+                   FROM payments 
+                   WHERE created_at >= CURRENT_DATE
+                   AND status = 'completed'
+                   AND tenant_id = %s''', (tenant_id,))
+    payments_today = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    stats_text = f"""📊 <b>Статистика ЗА СЕГОДНЯ</b> ({datetime.now().strftime('%d.%m.%Y')})
+
+👥 Новых пользователей: {new_users_today}
+💰 Платежей: {payments_today['count']}
+💵 Доход: {payments_today['revenue']}₽
+
+📈 <b>Воронка за сегодня:</b>
+"""
+    
+    for stat in today_stats:
+        stats_text += f"• {stat['action']}: {stat['count']}\n"
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+@router.message(Command("yesterday"))
+async def admin_yesterday_stats(message: types.Message):
+    """📊 Статистика ЗА ВЧЕРА"""
+    tenant_id = tenants.current().tenant_id
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    # Статистика за вчера
+    cur.execute('''SELECT action, COUNT(*) as count 
+                   FROM funnel_analytics 
+                   WHERE created_at >= CURRENT_DATE - INTERVAL '1 day'
+                   AND created_at < CURRENT_DATE
+                   AND tenant_id = %s
+                   GROUP BY action
+                   ORDER BY count DESC''', (tenant_id,))
+    yesterday_stats = cur.fetchall()
+    
+    # Новые юзеры вчера
+    cur.execute('''SELECT COUNT(*) as count 
+                   FROM users 
+                   WHERE created_at >= CURRENT_DATE - INTERVAL '1 day'
+                   AND created_at < CURRENT_DATE
+                   AND tenant_id = %s''', (tenant_id,))
+    new_users_yesterday = cur.fetchone()['count']
+    
+    # Платежи вчера
+    cur.execute('''SELECT 
+                   COUNT(*) as count,
+                   COALESCE(SUM(amount), 0) as revenue
+                   FROM payments 
+                   WHERE created_at >= CURRENT_DATE - INTERVAL '1 day'
+                   AND created_at < CURRENT_DATE
+                   AND status = 'completed'
+                   AND tenant_id = %s''', (tenant_id,))
+    payments_yesterday = cur.fetchone()
+    
+    yesterday_date = (datetime.now() - timedelta(days=1)).strftime('%d.%m.%Y')
+    
+    cur.close()
+    conn.close()
+    
+    stats_text = f"""📊 <b>Статистика ЗА ВЧЕРА</b> ({yesterday_date})
+
+👥 Новых пользователей: {new_users_yesterday}
+💰 Платежей: {payments_yesterday['count']}
+💵 Доход: {payments_yesterday['revenue']}₽
+
+📈 <b>Воронка за вчера:</b>
+"""
+    
+    for stat in yesterday_stats:
+        stats_text += f"• {stat['action']}: {stat['count']}\n"
+    
+    await message.answer(stats_text, parse_mode="HTML")
+
+@router.message(Command("export"))
+async def export_stats(message: types.Message):
+    """📥 Экспорт в CSV: /export [stats|events|payments|users] [с YYYY-MM-DD] [по YYYY-MM-DD] [gz]"""
+    args = message.text.split(maxsplit=1)
+    try:
+        table, date_from, date_to, compress = exporter.parse_export_args(args[1] if len(args) > 1 else '')
+    except ValueError:
+        await message.answer(
+            "❌ Формат: /export [таблица] [с YYYY-MM-DD] [по YYYY-MM-DD] [gz]\n"
+            f"Таблицы: {', '.join(exporter.EXPORTS)}"
+        )
+        return
+    
+    await message.answer("⏳ Формирую CSV файл...")
+    
+    period = "за всё время"
+    if date_from or date_to:
+        period = f"с {date_from or 'начала'} по {date_to or 'сегодня'}"
+    
+    query, params = exporter.build_query(table, date_from, date_to)
+    try:
+        await exporter.send_export(message, get_db_connection, query, table,
+                                   f"📊 Экспорт {table} {period}", params=params, compress=compress)
+    except Exception as e:
+        logging.error(f"Export error: {e}")
+        await message.answer(f"❌ Ошибка экспорта: {e}")
+
+@router.message(Command("export_parquet"))
+async def export_parquet(message: types.Message):
+    """📦 Выгрузка для аналитиков в Parquet: /export_parquet [events|payments|users] [full]"""
+    args = message.text.split()[1:]
+    name = next((arg for arg in args if arg in exporter.PARQUET_EXPORTS), 'events')
+    full = 'full' in args
+    
+    await message.answer(f"⏳ Формирую Parquet: {name}...")
+    try:
+        await exporter.send_parquet(message, get_db_connection, name, full=full)
+    except ImportError:
+        await message.answer("❌ Для Parquet нужен pyarrow: pip install pyarrow")
+    except Exception as e:
+        logging.error(f"Parquet export error: {e}")
+        await message.answer(f"❌ Ошибка экспорта: {e}")
+
+# ========================================
+# 📋 СПРАВКА ПО КОМАНДАМ
+# ========================================
+
+@router.message(Command("help_stats"))
+async def help_stats(message: types.Message):
+    """📚 Справка по командам статистики"""
+    help_text = """📚 <b>СПРАВКА ПО КОМАНДАМ СТАТИСТИКИ</b>
+
+🎯 <b>Основные:</b>
+/stats - Статистика за последние 7 дней (скользящее окно)
+/today - Только за сегодня
+/yesterday - Только за вчера
+
+📊 <b>Периоды:</b>
+/days - По дням (последние 7)
+/weeks - По неделям (последние 4)
+/month - За последние 30 дней
+/alltime - За всё время
+
+📈 <b>Аналитика:</b>
+/compare - Сравнение этой и прошлой недели
+/growth - График роста за 14 дней
+/cohorts [дней] [срок] - Когорты: старт → демо → trial → оплата, время до оплаты
+/delivery [часов] - Доставка по видам сообщений: доля доставленных, задержка очереди, повторы
+
+💾 <b>Экспорт:</b>
+/export [таблица] [с] [по] [gz] - CSV: stats, events, payments, users
+/export_parquet [events|payments|users] [full] - Parquet; events - только новое с прошлой выгрузки
+
+💡 <b>Полезные команды:</b>
+/checkdb - Диагностика базы данных
+💡 /alltime, /checkdb и /feedback_stats с аргументом ~ считаются приблизительно (мгновенно на больших таблицах), с exact - точно
+/cleardb - Очистить данные клуба (осторожно!)
+
+🛠 <b>Только для операторов (ADMIN_IDS) - общие для всех клубов:</b>
+/perf - Профиль SQL-запросов (медленные, N+1)
+/startup - Профиль запуска: импорты, схема БД, polling, первый ответ
+/jobs - Фоновые задачи и их последние запуски
+/runjob имя - Запустить фоновую задачу сейчас
+
+❓ <b>Вопросы?</b>
+Пиши в @razvitie_dety
+"""
+    
+    await message.answer(help_text, parse_mode="HTML")
+
+@router.message(Command("cleardb"))
+async def admin_clear_db(message: types.Message):
+    """Очистка данных клуба (только для админа клуба; другие клубы не затрагиваются)"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Да, очистить", callback_data="confirm_clear")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_clear")]
+    ])
+    
+    await message.answer(
+        "⚠️ **ВНИМАНИЕ!**\n\n"
+        "Вы действительно хотите очистить ВСЕ данные клуба?\n"
+        "Это удалит:\n"
+        "• Всех пользователей клуба\n"
+        "• Все платежи клуба\n"
+        "• Все уведомления\n"
+        "• Всю аналитику клуба\n\n"
+        "**Это действие нельзя отменить!**",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+
+@callbacks.exact("confirm_clear")
+async def confirm_clear_db(callback: types.CallbackQuery):
+    """Подтверждение очистки: удаляются только строки клуба, из которого пришла команда"""
+    tenant_id = tenants.current().tenant_id
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        tables_cleared = []
+        restored = []
+        
+        # Таблицы без tenant_id чистим по пользователям клуба - до удаления самих пользователей
+        cur.execute('''CREATE TEMP TABLE cleared_users ON COMMIT DROP AS
+                       SELECT user_id FROM users WHERE tenant_id = %s
+                       UNION
+                       SELECT user_id FROM welcome_messages WHERE tenant_id = %s''', (tenant_id, tenant_id))
+        scoped = {table: ('user_id IN (SELECT user_id FROM cleared_users)', ())
+                  for table in ('notifications', 'funnel_messages', 'funnel_progress', 'undeliverable')}
+        scoped.update({table: ('tenant_id = %s', (tenant_id,))
+                       for table in ('payments', 'users', 'funnel_events', 'welcome_messages',
+                                     'feedback', 'delivery_ledger', 'cohort_cache')})
+        sources = [approx_stats.source_name(name, tenant_id) for name in approx_stats.SOURCES]
+        scoped.update({table: ('source = ANY(%s)', (sources,))
+                       for table in ('stats_counters', 'stats_counter_marks')})
+        
+        for table, (condition, params) in scoped.items():
+            # Точка сохранения: ошибка в одной таблице не откатывает остальные
+            cur.execute('SAVEPOINT clear_table')
+            try:
+                if table == 'undeliverable':
+                    cur.execute(f'DELETE FROM {table} WHERE {condition} RETURNING user_id', params)
+                    restored = [row['user_id'] for row in cur.fetchall()]
+                else:
+                    cur.execute(f'DELETE FROM {table} WHERE {condition}', params)
+                cur.execute('RELEASE SAVEPOINT clear_table')
+                tables_cleared.append(table)
+            except Exception as e:
+                cur.execute('ROLLBACK TO SAVEPOINT clear_table')
+                logging.warning(f"Error clearing {table}: {e}")
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        stats_cache.invalidate(prefix=f'{tenant_id}:')
+        for user_id in restored:
+            delivery.undeliverable.discard(user_id)
+        
+        await callback.message.edit_text(
+            "✅ **Данные клуба успешно очищены!**\n\n"
+            f"Очищенные таблицы: {', '.join(tables_cleared)}\n\n"
+            "Можете начинать тестирование заново! 🚀"
+        )
+        
+        logging.info(f"Tenant {tenant_id} data cleared by admin {callback.from_user.id}")
+        
+    except Exception as e:
+        logging.error(f"Error clearing database: {e}")
+        await callback.message.edit_text(
+            "❌ **Ошибка при очистке базы данных!**\n\n"
+            f"Детали: {str(e)}"
+        )
+    
+    await callback.answer()
+
+@callbacks.exact("cancel_clear")
+async def cancel_clear_db(callback: types.CallbackQuery):
+    await callback.message.edit_text("✅ Очистка отменена. База данных не изменена.")
+    await callback.answer()
+
+def build_checkdb_report(tenant_id, approx=False):
+    """Текст /checkdb клуба tenant_id: записи в users и статусы подписок.
+    approx - записи и статусы по выборке TABLESAMPLE, пересчитанной на оценку pg_class"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    sample, scale = '', 1.0
+    if approx:
+        sample, scale = approx_stats.sample_clause(approx_stats.estimated_rows(cur, 'users'))
+    else:
+        cur.execute('SELECT COUNT(DISTINCT user_id) as unique_users FROM users WHERE tenant_id = %s',
+                    (tenant_id,))
+        unique = cur.fetchone()['unique_users']
+    
+    cur.execute(f'''
+        SELECT 
+            COUNT(*) as total,
+            COUNT(*) FILTER (WHERE subscription_until > NOW()) as active,
+            COUNT(*) FILTER (WHERE subscription_until <= NOW()) as expired,
+            COUNT(*) FILTER (WHERE tariff = 'trial') as trial,
+            COUNT(*) FILTER (WHERE tariff != 'trial') as paid
+        FROM users {sample}
+        WHERE tenant_id = %s
+    ''', (tenant_id,))
+    subs = {key: round(value * scale) for key, value in cur.fetchone().items()}
+    total = subs['total']
+    if approx:
+        # user_id - первичный ключ, уникальных столько же, сколько записей
+        unique = total
+    
+    cur.execute('SELECT NOW() as db_time')
+    db_time = cur.fetchone()['db_time']
+    
+    cur.close()
+    conn.close()
+    
+    report = "🔍 **ДЕТАЛЬНАЯ ДИАГНОСТИКА**\n\n"
+    report += "📊 **Записи в базе:**\n"
+    report += f"• Всего записей: {total}\n"
+    report += f"• Уникальных user_id: {unique}\n\n"
+    report += "💎 **Статус подписок:**\n"
+    report += f"• Активные: {subs['active']}\n"
+    report += f"• Истёкшие: {subs['expired']}\n"
+    report += f"• Trial: {subs['trial']}\n"
+    report += f"• Платные: {subs['paid']}\n\n"
+    report += f"🕐 **Время БД:** {db_time.strftime('%Y-%m-%d %H:%M:%S')} UTC\n"
+    if approx:
+        report += "\n≈ Приблизительно: оценка pg_class"
+        report += f", записи и статусы по выборке ~{approx_stats.SAMPLE_ROWS} строк\n" if sample else "\n"
+    
+    return report
+
+@router.message(Command("checkdb"))
+async def admin_check_db(message: types.Message):
+    """Диагностика базы данных (/checkdb ~ - приблизительно, /checkdb exact - точно)"""
+    await message.answer("🔍 Анализирую базу данных...")
+    
+    try:
+        approx = approx_stats.wants_approx(message.text)
+        tenant_id = tenants.current().tenant_id
+        report, age = await stats_cache.get(f"{tenant_id}:checkdb{'~' if approx else ''}",
+                                            lambda: build_checkdb_report(tenant_id, approx))
+        await message.answer(report + age_footer(age), parse_mode="Markdown")
+        
+    except Exception as e:
+        await message.answer(f"❌ Ошибка:\n{str(e)}")
@@ -0,0 +1,204 @@
+"""
+Рассылка администратора по сегментам пользователей
+Подключается внутрь админского роутера (admin_guard) - проверки доступа в хендлерах нет
+"""
+
+from datetime import datetime
+
+from aiogram import Router, types
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import delivery
+import tenants
+from callback_index import CallbackIndex
+from db import get_db_connection, get_active_subscribers
+
+router = Router(name='broadcast')
+callbacks = CallbackIndex(router)
+
+# Получатели - пользователи клуба администратора (последний параметр запроса - tenant_id)
+# без заблокировавших бота
+REACHABLE = f"users.tenant_id = %s AND {delivery.not_suppressed('users.user_id')}"
+
+class BroadcastStates(StatesGroup):
+    waiting_for_message = State()
+    confirm = State()
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: types.Message, state: FSMContext):
+    """Начать рассылку по активным подписчикам"""
+    active_users = get_active_subscribers(tenants.current().tenant_id)
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Всем активным", callback_data="broadcast_active")],
+        [InlineKeyboardButton(text="🎁 Только Trial", callback_data="broadcast_trial")],
+        [InlineKeyboardButton(text="💳 Только платным", callback_data="broadcast_paid")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="broadcast_cancel")]
+    ])
+    
+    await message.answer(
+        f"📢 **СИСТЕМА РАССЫЛКИ**\n\n"
+        f"👥 Активных подписчиков: {len(active_users)}\n\n"
+        f"Выбери кому отправить:",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    
+    await state.set_state(BroadcastStates.waiting_for_message)
+
+@callbacks.prefix("broadcast_")
+async def select_broadcast_type(callback: types.CallbackQuery, state: FSMContext):
+    """Выбор типа рассылки"""
+    action = callback.data.replace("broadcast_", "")
+    
+    if action == "cancel":
+        await callback.message.edit_text("❌ Рассылка отменена")
+        await state.clear()
+        return
+    
+    await state.update_data(broadcast_type=action)
+    
+    await callback.message.edit_text(
+        "✍️ **Напиши текст сообщения для рассылки:**\n\n"
+        "Можешь использовать форматирование Markdown\n\n"
+        "💡 Для отмены отправь /cancel",
+        parse_mode="Markdown"
+    )
+    
+    await callback.answer()
+
+@router.message(BroadcastStates.waiting_for_message)
+async def receive_broadcast_message(message: types.Message, state: FSMContext):
+    """Получение текста рассылки"""
+    if message.text == "/cancel":
+        await message.answer("❌ Рассылка отменена")
+        await state.clear()
+        return
+    
+    await state.update_data(message_text=message.text)
+    data = await state.get_data()
+    broadcast_type = data.get('broadcast_type', 'active')
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    if broadcast_type == "active":
+        cur.execute(f'''SELECT COUNT(*) as count FROM users 
+                        WHERE subscription_until > %s AND {REACHABLE}''',
+                    (datetime.now(), tenants.current().tenant_id))
+    elif broadcast_type == "trial":
+        cur.execute(f'''SELECT COUNT(*) as count FROM users 
+                        WHERE subscription_until > %s AND tariff = %s AND {REACHABLE}''', 
+                    (datetime.now(), 'trial', tenants.current().tenant_id))
+    else:
+        cur.execute(f'''SELECT COUNT(*) as count FROM users 
+                        WHERE subscription_until > %s AND tariff != %s AND {REACHABLE}''', 
+                    (datetime.now(), 'trial', tenants.current().tenant_id))
+    
+    count = cur.fetchone()['count']
+    cur.close()
+    conn.close()
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Отправить", callback_data="confirm_broadcast")],
+        [InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_broadcast")]
+    ])
+    
+    type_names = {
+        'active': 'Всем активным',
+        'trial': 'Trial пользователям',
+        'paid': 'Платным подписчикам'
+    }
+    
+    await message.answer(
+        f"📋 **ПРЕВЬЮ РАССЫЛКИ**\n\n"
+        f"👥 Получателей: {count}\n"
+        f"📢 Тип: {type_names.get(broadcast_type, 'Всем')}\n\n"
+        f"📝 **Текст сообщения:**\n"
+        f"{'─' * 30}\n"
+        f"{message.text}\n"
+        f"{'─' * 30}\n\n"
+        f"⚠️ Отправить рассылку?",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    
+    await state.set_state(BroadcastStates.confirm)
+
+def get_broadcast_recipients(broadcast_type):
+    """Получатели рассылки: все активные, только trial или только платные"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    if broadcast_type == "active":
+        cur.execute(f'''SELECT user_id, username FROM users 
+                        WHERE subscription_until > %s AND {REACHABLE}''',
+                    (datetime.now(), tenants.current().tenant_id))
+    elif broadcast_type == "trial":
+        cur.execute(f'''SELECT user_id, username FROM users 
+                        WHERE subscription_until > %s AND tariff = %s AND {REACHABLE}''', 
+                    (datetime.now(), 'trial', tenants.current().tenant_id))
+    else:
+        cur.execute(f'''SELECT user_id, username FROM users 
+                        WHERE subscription_until > %s AND tariff != %s AND {REACHABLE}''', 
+                    (datetime.now(), 'trial', tenants.current().tenant_id))
+    
+    users = cur.fetchall()
+    cur.close()
+    conn.close()
+    return users
+
+async def send_broadcast(users, message_text):
+    """Отправка рассылки списку пользователей, возвращает (отправлено, заблокировали, ошибки)"""
+    sent = 0
+    blocked = 0
+    errors = 0
+    # В журнале доставки задержка каждого сообщения считается от начала рассылки
+    started = datetime.now()
+    
+    for user in users:
+        outcome = await delivery.send(tenants.current().bot, get_db_connection, user['user_id'], message_text,
+                                      kind='broadcast', enqueued_at=started, parse_mode="Markdown")
+        if outcome == delivery.SENT:
+            sent += 1
+        elif outcome in delivery.SUPPRESS:
+            blocked += 1
+        else:
+            errors += 1
+    
+    return sent, blocked, errors
+
+@callbacks.exact("confirm_broadcast", BroadcastStates.confirm)
+async def execute_broadcast(callback: types.CallbackQuery, state: FSMContext):
+    """Выполнение рассылки"""
+    data = await state.get_data()
+    message_text = data.get('message_text')
+    broadcast_type = data.get('broadcast_type', 'active')
+    
+    await callback.message.edit_text("⏳ Начинаю рассылку...")
+    
+    users = get_broadcast_recipients(broadcast_type)
+    sent, blocked, errors = await send_broadcast(users, message_text)
+    
+    await callback.message.answer(
+        f"✅ **РАССЫЛКА ЗАВЕРШЕНА**\n\n"
+        f"📊 Статистика:\n"
+        f"• Отправлено: {sent}\n"
+        f"• Заблокировали бота: {blocked}\n"
+        f"• Ошибки: {errors}\n"
+        f"• Всего получателей: {len(users)}\n\n"
+        f"📈 Успешность: {round(100 * sent / max(len(users), 1), 1)}%",
+        parse_mode="Markdown"
+    )
+    
+    await state.clear()
+    await callback.answer()
+
+@callbacks.exact("cancel_broadcast", BroadcastStates.confirm)
+async def cancel_broadcast(callback: types.CallbackQuery, state: FSMContext):
+    await callback.message.edit_text("❌ Рассылка отменена")
+    await state.clear()
+    await callback.answer()
@@ -0,0 +1,176 @@
+"""
+Частые вопросы
+"""
+
+from aiogram import Router, types
+from aiogram.filters import Command
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from callback_index import CallbackIndex
+from config import DEMO_VIDEO_URL, DEMO_PHOTOS_URL
+
+router = Router(name='faq')
+callbacks = CallbackIndex(router)
+
+# ========================================
+# FAQ
+# ========================================
+
+@callbacks.exact("faq")
+async def show_faq(callback: types.CallbackQuery):
+    """Показать FAQ"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="1️⃣ Как продлить подписку?", callback_data="faq_1")],
+        [InlineKeyboardButton(text="2️⃣ Как узнать срок окончания подписки?", callback_data="faq_3")],
+        [InlineKeyboardButton(text="3️⃣ Можно ли вернуть деньги?", callback_data="faq_4")],
+        [InlineKeyboardButton(text="4️⃣ Что входит в подписку?", callback_data="faq_5")],
+        [InlineKeyboardButton(text="5️⃣ Как изменить тариф?", callback_data="faq_6")],
+        [InlineKeyboardButton(text="💬 Связаться с поддержкой", url="https://t.me/razvitie_dety")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="back")]
+    ])
+    
+    await callback.message.edit_text(
+        "❓ **Часто задаваемые вопросы**\n\n"
+        "Выберите интересующий вас вопрос:",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("faq_1")
+async def faq_answer_1(callback: types.CallbackQuery):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="◀️ К вопросам", callback_data="faq")]
+    ])
+    
+    await callback.message.edit_text(
+        "**1. Как продлить подписку?**\n\n"
+        "• Введите /start\n"
+        "• Выберите нужный тариф\n"
+        "• Оплатите удобным способом\n\n"
+        "⚠️ **Важно:** Подписка продлевается вручную. "
+        "Мы пришлём напоминание за 2 дня до окончания!",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("faq_3")
+async def faq_answer_3(callback: types.CallbackQuery):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="◀️ К вопросам", callback_data="faq")]
+    ])
+    
+    await callback.message.edit_text(
+        "**2. Как узнать срок окончания подписки?**\n\n"
+        "Чтобы проверить свою подписку:\n\n"
+        "1️⃣ Введите команду /start\n"
+        "2️⃣ Нажмите кнопку \"ℹ️ Мой статус\"\n\n"
+        "Вы увидите:\n"
+        "• Текущий тариф\n"
+        "• Дату окончания подписки\n"
+        "• Количество оставшихся дней\n\n"
+        "📱 Также бот отправит вам уведомление за 2 дня до окончания!",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("faq_4")
+async def faq_answer_4(callback: types.CallbackQuery):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💬 Связаться с поддержкой", url="https://t.me/razvitie_dety")],
+        [InlineKeyboardButton(text="◀️ К вопросам", callback_data="faq")]
+    ])
+    
+    await callback.message.edit_text(
+        "**3. Можно ли вернуть деньги?**\n\n"
+        "🎁 **Пробный период:**\n"
+        "Воспользуйтесь бесплатным доступом на 7 дней, чтобы оценить качество материалов перед покупкой!\n\n"
+        "💰 **Возврат средств:**\n"
+        "Возврат возможен в течение 3 дней после оплаты, если:\n"
+        "• Вы не получили доступ к материалам\n"
+        "• Возникли технические проблемы\n"
+        "• Контент не соответствует описанию\n\n"
+        "Для оформления возврата свяжитесь с поддержкой\n\n"
+        "⚠️ **Обратите внимание:**\n"
+        "После использования материалов возврат не предусмотрен согласно законодательству об информационных услугах.",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("faq_5")
+async def faq_answer_5(callback: types.CallbackQuery):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🎥 Видео: Обзор материалов", url=DEMO_VIDEO_URL)],
+        [InlineKeyboardButton(text="🎥 Примеры заданий", url=DEMO_PHOTOS_URL)],
+        [InlineKeyboardButton(text="◀️ К вопросам", callback_data="faq")]
+    ])
+    
+    await callback.message.edit_text(
+        "**4. Что входит в подписку?**\n\n"
+        "🎥 **Смотрите видеообзоры** - наглядно покажем что внутри!\n\n"
+        "📚 **Доступ к материалам:**\n"
+        "• Развивающие игры и задания\n"
+        "• Образовательный контент по возрастам\n"
+        "• Творческие мастер-классы\n"
+        "• Методические материалы для родителей\n\n"
+        "👥 **Закрытая группа:**\n"
+        "• Общение с другими родителями\n"
+        "• Регулярные обновления контента\n"
+        "• Поддержка и советы экспертов\n\n"
+        "🎁 **Бонусы:**\n"
+        "• Эксклюзивные материалы для подписчиков\n"
+        "• Раннее получение новинок\n"
+        "• Специальные акции и скидки\n\n"
+        "💡 Попробуйте бесплатно 7 дней, чтобы оценить все возможности!",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("faq_6")
+async def faq_answer_6(callback: types.CallbackQuery):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📅 Посмотреть тарифы", callback_data="show_tariffs")],
+        [InlineKeyboardButton(text="◀️ К вопросам", callback_data="faq")]
+    ])
+    
+    await callback.message.edit_text(
+        "**5. Как изменить тариф?**\n\n"
+        "📈 **Повышение тарифа:**\n"
+        "Вы можете в любой момент перейти на более длительную подписку:\n"
+        "• Выберите новый тариф\n"
+        "• Оплатите разницу\n"
+        "• Доступ продлится с учетом оставшихся дней\n\n"
+        "📉 **Понижение тарифа:**\n"
+        "• Текущая подписка действует до конца оплаченного периода\n"
+        "• После окончания выберите другой тариф\n\n"
+        "♾️ **Тариф 'Навсегда':**\n"
+        "• Бессрочный доступ без ограничений\n"
+        "• Самая выгодная цена\n"
+        "• Скидка 80%!\n\n"
+        "💡 **Совет:** Длительные тарифы выгоднее - экономия до 80%!",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@router.message(Command("faq"))
+async def cmd_faq(message: types.Message):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="1️⃣ Как продлить подписку?", callback_data="faq_1")],
+        [InlineKeyboardButton(text="2️⃣ Как узнать срок окончания подписки?", callback_data="faq_3")],
+        [InlineKeyboardButton(text="3️⃣ Можно ли вернуть деньги?", callback_data="faq_4")],
+        [InlineKeyboardButton(text="4️⃣ Что входит в подписку?", callback_data="faq_5")],
+        [InlineKeyboardButton(text="5️⃣ Как изменить тариф?", callback_data="faq_6")],
+        [InlineKeyboardButton(text="💬 Связаться с поддержкой", url="https://t.me/razvitie_dety")]
+    ])
+    
+    await message.answer(
+        "❓ **Часто задаваемые вопросы**\n\n"
+        "Выберите интересующий вас вопрос:",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
@@ -0,0 +1,28 @@
+"""
+Статус бота в личном чате: пользователь остановил (заблокировал) или снова запустил бота.
+Telegram присылает my_chat_member сразу - список недоставляемых обновляется
+до первой неудачной отправки
+"""
+
+import logging
+
+from aiogram import Router, F, types
+from aiogram.filters import ChatMemberUpdatedFilter, KICKED, MEMBER
+
+import delivery
+from db import get_db_connection
+
+router = Router(name='membership')
+router.my_chat_member.filter(F.chat.type == 'private')
+
+@router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=KICKED))
+async def bot_blocked(event: types.ChatMemberUpdated):
+    user_id = event.from_user.id
+    delivery.suppress(get_db_connection, user_id, delivery.BLOCKED, 'my_chat_member: kicked')
+    logging.info(f"User {user_id} blocked the bot, suppressed")
+
+@router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=MEMBER))
+async def bot_unblocked(event: types.ChatMemberUpdated):
+    user_id = event.from_user.id
+    delivery.restore(get_db_connection, user_id)
+    logging.info(f"User {user_id} unblocked the bot")
@@ -0,0 +1,347 @@
+"""
+Первый контакт: /start, демо, отзывы, пробный период, статус подписки
+"""
+
+import logging
+from datetime import datetime
+
+from aiogram import Router, types
+from aiogram.filters import Command
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import delivery
+import invite_pool
+import tenants
+from callback_index import CallbackIndex
+from config import DEMO_VIDEO_URL, DEMO_PHOTOS_URL, REVIEWS_URL, TARIFFS
+from db import get_db_connection, add_user, get_user, is_subscription_active, track_user_action
+from jobs import schedule_welcome_message
+from keyboards import get_main_menu, get_new_user_menu
+from throttle import callback_throttle
+
+router = Router(name='onboarding')
+callbacks = CallbackIndex(router)
+
+# Пробный период выдаётся один раз - двойной тап не должен гоняться сам с собой
+callback_throttle.exclusive("trial")
+
+@router.message(Command("start"))
+async def cmd_start(message: types.Message):
+    """Обработчик команды /start с воронкой прогрева"""
+    user_id = message.from_user.id
+    username = message.from_user.username
+    
+    # Пишет боту - значит, снова доступен для рассылок. В базу идём, только если он
+    # в списке недоставляемых (индекс в памяти), а не на каждый /start
+    if user_id in delivery.undeliverable:
+        delivery.restore(get_db_connection, user_id)
+    
+    user = get_user(user_id)
+    
+    if not user:
+        # НОВЫЙ пользователь - показываем ВОРОНКУ ПРОГРЕВА
+        track_user_action(user_id, 'started_bot')
+        schedule_welcome_message(user_id)
+        
+        await message.answer(
+            f"👋 Привет, {message.from_user.first_name}!\n\n"
+            "Добро пожаловать в клуб развивающих материалов для детей!\n\n"
+            "🎯 **Что у нас есть:**\n"
+            "• 1000+ готовых занятий и игр\n"
+            "• Материалы обновляются каждую неделю\n"
+            "• Всё разделено по возрастам и навыкам\n"
+            "• 87% родителей продлевают подписку после пробного периода\n\n"
+            "💡 **Сначала посмотри примеры - потом решишь попробовать!**\n\n"
+            "👇 Что хочешь узнать первым?",
+            reply_markup=get_new_user_menu(),
+            parse_mode="Markdown"
+        )
+    else:
+        # Существующий пользователь
+        if is_subscription_active(user_id):
+            await message.answer(
+                f"👋 С возвращением, {message.from_user.first_name}!\n\n"
+                "Твоя подписка активна! 🎉",
+                reply_markup=get_main_menu()
+            )
+        else:
+            await message.answer(
+                f"👋 Привет, {message.from_user.first_name}!\n\n"
+                "Твоя подписка истекла 😔\n\n"
+                "Продли подписку чтобы продолжить пользоваться материалами!",
+                reply_markup=get_main_menu()
+            )
+
+@callbacks.exact("show_demo")
+async def show_demo_content(callback: types.CallbackQuery):
+    """Показать примеры материалов ПЕРЕД активацией trial"""
+    track_user_action(callback.from_user.id, 'viewed_demo')
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🎥 Видео-обзор материалов", url=DEMO_VIDEO_URL)],
+        [InlineKeyboardButton(text="🎨 Примеры заданий", url=DEMO_PHOTOS_URL)],
+        [InlineKeyboardButton(text="📚 Как это работает?", callback_data="how_it_works")],
+        [InlineKeyboardButton(text="🔥 Хочу попробовать!", callback_data="ready_for_trial")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_start")]
+    ])
+    
+    await callback.message.edit_text(
+        "🎨 **ПРИМЕРЫ НАШИХ МАТЕРИАЛОВ:**\n\n"
+        "Посмотри что получают родители внутри клуба:\n\n"
+        "🎯 **Для детей 3-5 лет:**\n"
+        "• Игры на развитие внимания и памяти\n"
+        "• Подготовка руки к письму\n"
+        "• Изучение цветов, форм, размеров\n"
+        "• Развитие речи через игру\n\n"
+        "🎯 **Для детей 5-7 лет:**\n"
+        "• Обучение чтению по слогам\n"
+        "• Математика в игровой форме\n"
+        "• Логические задачки\n"
+        "• Подготовка к школе\n\n"
+        "📹 **Смотри видео** - там показаны реальные материалы!\n\n"
+        "💡 Всё это доступно в закрытой группе 24/7",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("show_reviews")
+async def show_reviews(callback: types.CallbackQuery):
+    """Показать РЕАЛЬНЫЕ отзывы родителей"""
+    track_user_action(callback.from_user.id, 'viewed_reviews')
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📸 Больше отзывов в канале", url=REVIEWS_URL)],
+        [InlineKeyboardButton(text="🔥 Убедили! Хочу попробовать", callback_data="ready_for_trial")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_start")]
+    ])
+    
+    await callback.message.edit_text(
+        "💬 **ЧТО ГОВОРЯТ РОДИТЕЛИ:**\n\n"
+        "**Анна, 2 ребенка (4 и 6 лет):**\n"
+        "_\"За неделю дочка выучила 10 букв! Занимаемся по 15 минут утром. "
+        "Материалы яркие, ребенок сам просит позаниматься!\"_\n\n"
+        "**Олег, сын 5 лет:**\n"
+        "_\"Раньше тратил 2-3 часа на поиск заданий в интернете. "
+        "Теперь всё в одном месте. Окупилось за первую неделю!\"_\n\n"
+        "**Мария, дочка 3 года:**\n"
+        "_\"Попробовали trial - не смогли остановиться. "
+        "Оформили Навсегда со скидкой. Лучшее вложение в ребенка!\"_\n\n"
+        "📊 **Наши цифры:**\n"
+        "• 87% родителей продлевают после trial\n"
+        "• 1000+ активных семей\n"
+        "• 5000+ материалов в базе\n"
+        "• 4.9/5 средняя оценка\n\n"
+        "🎁 Попробуй сам - первые 7 дней бесплатно!",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("ready_for_trial")
+async def ready_for_trial(callback: types.CallbackQuery):
+    """Пользователь ГОТОВ активировать trial - объясняем процесс"""
+    track_user_action(callback.from_user.id, 'clicked_ready_for_trial')
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Активировать Trial", callback_data="trial")],
+        [InlineKeyboardButton(text="❓ У меня вопросы", callback_data="faq")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_start")]
+    ])
+    
+    await callback.message.edit_text(
+        "🎁 **КАК ПОЛУЧИТЬ БЕСПЛАТНЫЙ ДОСТУП:**\n\n"
+        "**Шаг 1:** Нажми кнопку \"Активировать Trial\"\n"
+        "🎫 Получишь МГНОВЕННЫЙ доступ на 7 дней\n\n"
+        "**Шаг 2:** Перейди по ссылке в группу\n"
+        "🔗 Начинай заниматься с ребёнком!\n\n"
+        "⏰ **ВАЖНО:**\n"
+        "• Первые 7 дней - **полностью БЕСПЛАТНО**\n"
+        "• Никаких платежей и карт\n"
+        "• Отменить можно в любой момент\n\n"
+        "🎯 **После trial (если понравится):**\n"
+        "Сможешь продлить со **скидкой 60-80%**:\n"
+        "• 1 месяц: 199₽ (вместо 499₽)\n"
+        "• Навсегда: 599₽ (вместо 2990₽)\n\n"
+        "💡 **Попробуй без риска - тебе понравится!**",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("back_to_start")
+async def back_to_start(callback: types.CallbackQuery):
+    """Вернуться к начальному меню"""
+    await callback.message.edit_text(
+        f"👋 Привет, {callback.from_user.first_name}!\n\n"
+        "Добро пожаловать в клуб развивающих материалов для детей!\n\n"
+        "🎯 **Что у нас есть:**\n"
+        "• 1000+ готовых занятий и игр\n"
+        "• Материалы обновляются каждую неделю\n"
+        "• Всё разделено по возрастам и навыкам\n"
+        "• 87% родителей продлевают подписку\n\n"
+        "💡 **Сначала посмотри примеры - потом решишь!**\n\n"
+        "👇 Что хочешь узнать первым?",
+        reply_markup=get_new_user_menu(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("trial")
+async def process_trial(callback: types.CallbackQuery):
+    """Обработчик кнопки 'Попробовать бесплатно'"""
+    user_id = callback.from_user.id
+    username = callback.from_user.username
+    
+    user = get_user(user_id)
+    
+    if user:
+        await callback.answer(
+            "Вы уже использовали пробный период! 😊",
+            show_alert=True
+        )
+        return
+    
+    add_user(user_id, username, TARIFFS['trial']['days'], 'trial')
+    track_user_action(user_id, 'activated_trial')
+    
+    try:
+        # Ссылка из заранее созданного пула - без вызова Bot API, если пул не пуст
+        tenant = tenants.current()
+        invite_link = await invite_pool.get_invite_link(tenant.bot, get_db_connection, tenant.channel_id,
+                                                         'trial', user_id)
+        
+        await callback.message.edit_text(
+            f"🎉 **Поздравляем!**\n\n"
+            f"Вам активирован пробный период на {TARIFFS['trial']['days']} дней!\n\n"
+            f"**ВАЖНО: Сохрани эту ссылку!**\n\n"
+            f"Переходи по ссылке: {invite_link}\n\n"
+            f"⏰ Доступ истечет через {TARIFFS['trial']['days']} дней.\n"
+            f"После этого выбери подходящий тариф!\n\n"
+            f"💡 Это ссылка для присоединения к закрытой группе.",
+            parse_mode="HTML"
+        )
+        
+        await callback.answer()
+        
+    except Exception as e:
+        logging.error(f"Error adding user to channel: {e}")
+        await callback.message.edit_text(
+            "❌ Произошла ошибка. Обратитесь к администратору.",
+            reply_markup=get_main_menu()
+        )
+    
+    await callback.answer()
+
+@callbacks.exact("status")
+async def check_status(callback: types.CallbackQuery):
+    user_id = callback.from_user.id
+    user = get_user(user_id)
+    
+    if not user:
+        await callback.answer(
+            "❌ У вас нет активной подписки. Попробуйте бесплатно!",
+            show_alert=True
+        )
+        return
+    
+    subscription_until = user['subscription_until']
+    is_active = datetime.now() < subscription_until
+    
+    if is_active:
+        days_left = (subscription_until - datetime.now()).days
+        tariff_info = TARIFFS.get(user['tariff'], {})
+        
+        if user['tariff'] == 'forever':
+            status_text = (
+                f"✅ **Ваша подписка активна!**\n\n"
+                f"📅 Тариф: {tariff_info.get('name', 'Неизвестно')}\n"
+                f"♾️ Бессрочная подписка"
+            )
+        else:
+            status_text = (
+                f"✅ **Ваша подписка активна!**\n\n"
+                f"📅 Тариф: {tariff_info.get('name', 'Неизвестно')}\n"
+                f"⏰ Осталось дней: {days_left}\n"
+                f"📆 Действует до: {subscription_until.strftime('%d.%m.%Y')}"
+            )
+    else:
+        status_text = (
+            f"❌ **Подписка истекла**\n\n"
+            f"Продлите подписку, чтобы продолжить доступ к материалам!"
+        )
+    
+    await callback.message.edit_text(
+        status_text,
+        reply_markup=get_main_menu(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("back")
+async def go_back(callback: types.CallbackQuery):
+    await callback.message.edit_text(
+        f"👋 Привет, {callback.from_user.first_name}!\n\n"
+        "Добро пожаловать в бот закрытой группы с развивающими материалами для детей!\n\n"
+        "🎁 Попробуй бесплатно 7 дней! После пробного периода выбери удобную подписку и развивайся вместе с нами 👇",
+        reply_markup=get_main_menu()
+    )
+    await callback.answer()
+
+@callbacks.exact("how_it_works")
+async def how_it_works(callback: types.CallbackQuery):
+    """Инструкция как работает бот"""
+    track_user_action(callback.from_user.id, 'viewed_how_it_works')
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🎁 Попробовать сейчас", callback_data="ready_for_trial")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_start")]
+    ])
+    
+    await callback.message.edit_text(
+        "📖 **КАК ЭТО РАБОТАЕТ?**\n\n"
+        "**Шаг 1:** Активация пробного периода\n"
+        "Нажми кнопку и получи доступ мгновенно!\n\n"
+        "**Шаг 2:** Получи ссылку на группу\n"
+        "Перейди в закрытую группу с материалами\n\n"
+        "**Шаг 3:** Начни заниматься!\n"
+        "В группе найдешь:\n"
+        "• 📚 Развивающие игры и задания\n"
+        "• 🎨 Творческие активности\n"
+        "• 📖 Обучающие материалы\n"
+        "• 🎯 Готовые занятия на каждый день\n\n"
+        "💡 **Важно:**\n"
+        "• Доступ бесплатный 7 дней\n"
+        "• Никакой предоплаты\n"
+        "• Можно отменить в любой момент\n\n"
+        "🎁 **Попробуй прямо сейчас!**",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("need_help")
+async def need_help(callback: types.CallbackQuery):
+    """Пользователь просит помощи"""
+    track_user_action(callback.from_user.id, 'requested_help')
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💬 Написать в поддержку", url="https://t.me/razvitie_dety")],
+        [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")]
+    ])
+    
+    await callback.message.edit_text(
+        "💡 **Чем могу помочь?**\n\n"
+        "Напиши нам в поддержку - ответим в течение 5 минут!\n\n"
+        "Или посмотри частые вопросы - возможно, там уже есть ответ 👇",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact(['feedback_expensive', 'feedback_content', 'feedback_time', 'feedback_other', 'feedback_good'])
+async def handle_feedback(callback: types.CallbackQuery):
+    """Обработка обратной связи"""
+    feedback_type = callback.data.replace('feedback_', '')
+    track_user_action(callback.from_user.id, f'feedback_{feedback_type}')
+    await callback.answer("Спасибо за обратную связь! 🙏", show_alert=True)
@@ -0,0 +1,44 @@
+"""
+Команды оператора процесса: профили SQL, Bot API и запуска, фоновые задачи
+Эти данные и задачи общие для всех клубов (tenants), поэтому роутер подключается
+внутрь отдельного роутера admin_guard с config.ADMIN_IDS - операторами процесса,
+а не администраторами клуба апдейта
+"""
+
+from aiogram import Router, types
+from aiogram.filters import Command
+
+import db_profiler
+import invite_pool
+from loader import bot, supervisor
+from startup import boot
+from throttle import callback_throttle
+
+router = Router(name='operator')
+
+@router.message(Command("perf"))
+async def admin_perf(message: types.Message):
+    """Профиль SQL-запросов, Bot API, отброшенных повторных нажатий и пула инвайтов с момента запуска"""
+    await message.answer(db_profiler.format_report() + "\n" + bot.session.format_report()
+                         + "\n" + callback_throttle.format_report()
+                         + "\n" + invite_pool.format_report(), parse_mode="HTML")
+
+@router.message(Command("startup"))
+async def admin_startup(message: types.Message):
+    """Профиль запуска: фазы и время до готовности отвечать"""
+    await message.answer(boot.format_report(), parse_mode="HTML")
+
+@router.message(Command("jobs"))
+async def admin_jobs(message: types.Message):
+    """Состояние фоновых задач"""
+    await message.answer(supervisor.format_status(), parse_mode="HTML")
+
+@router.message(Command("runjob"))
+async def admin_run_job(message: types.Message):
+    """Ручной запуск фоновой задачи: /runjob sales_funnel"""
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await message.answer(f"Использование: /runjob имя\nЗадачи: {', '.join(supervisor.jobs)}")
+        return
+    
+    await message.answer(supervisor.trigger(parts[1].strip()))
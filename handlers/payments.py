@@ -0,0 +1,370 @@
+"""
+Тарифы и оплата через Telegram Payments
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from aiogram import Router, types, F
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import invite_pool
+import tenants
+from admin_guard import notify_admins
+from callback_index import CallbackIndex
+from config import TARIFFS
+from db import get_db_connection, add_user, track_user_action
+from keyboards import get_main_menu, get_tariffs_menu
+from throttle import callback_throttle
+
+router = Router(name='payments')
+callbacks = CallbackIndex(router)
+
+# Счёт на оплату - не чаще одного раза за двойной тап
+callback_throttle.exclusive("1month", "forever_confirmed")
+
+# ========================================
+# 🆕 TELEGRAM PAYMENTS - ФУНКЦИИ
+# ========================================
+
+async def send_invoice(user_id, tariff_code):
+    """Отправка счета на оплату через Telegram Payments с фискализацией"""
+    tariff = TARIFFS[tariff_code]
+    payload = f"{user_id}_{tariff_code}_{int(datetime.now().timestamp())}"
+    
+    price = types.LabeledPrice(
+        label="К оплате",
+        amount=int(tariff['price'] * 100)
+    )
+    
+    # Данные для чека (самозанятый/УСН)
+    provider_data = {
+        "receipt": {
+            "items": [
+                {
+                    "description": f"Подписка: {tariff['name']}",
+                    "quantity": "1",
+                    "amount": {
+                        "value": str(tariff['price']),
+                        "currency": "RUB"
+                    },
+                    "vat_code": 6,
+                    "payment_mode": "full_payment",
+                    "payment_subject": "service"
+                }
+            ],
+            "tax_system_code": 1
+        }
+    }
+    
+    # Счёт выставляет бот клуба с его платёжным провайдером
+    tenant = tenants.current()
+    try:
+        await tenant.bot.send_invoice(
+            chat_id=user_id,
+            title=f"Подписка: {tariff['name']}",
+            description=f"Доступ к развивающим материалам для детей.\n"
+                       f"Полная цена: {tariff['old_price']}₽\n"
+                       f"Со скидкой: {tariff['price']}₽",
+            payload=payload,
+            provider_token=tenant.provider_token,
+            currency="RUB",
+            prices=[price],
+            start_parameter="subscription",
+            need_email=True,
+            send_email_to_provider=True,
+            need_name=False,
+            need_phone_number=False,
+            need_shipping_address=False,
+            is_flexible=False,
+            provider_data=json.dumps(provider_data)
+        )
+        
+        # Сохраняем в БД
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('''INSERT INTO payments 
+                     (payment_id, user_id, amount, tariff, status, yookassa_id, created_at, tenant_id)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
+                  (payload, user_id, tariff['price'], tariff_code, 'pending', payload, datetime.now(),
+                   tenant.tenant_id))
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        logging.info(f"Invoice sent to user {user_id} for tariff {tariff_code}")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Error sending invoice: {e}")
+        return False
+
+# ========================================
+# 🆕 TELEGRAM PAYMENTS - ОБРАБОТЧИКИ
+# ========================================
+
+@router.pre_checkout_query()
+async def process_pre_checkout_query(pre_checkout_query: types.PreCheckoutQuery):
+    """Обработка pre-checkout query - ОБЯЗАТЕЛЬНО ответить в течение 10 секунд!"""
+    bot = tenants.current().bot
+    try:
+        await bot.answer_pre_checkout_query(
+            pre_checkout_query.id,
+            ok=True
+        )
+        logging.info(f"Pre-checkout approved for user {pre_checkout_query.from_user.id}")
+        
+    except Exception as e:
+        logging.error(f"Error in pre-checkout: {e}")
+        await bot.answer_pre_checkout_query(
+            pre_checkout_query.id,
+            ok=False,
+            error_message="Произошла ошибка. Попробуйте позже."
+        )
+
+@router.message(F.successful_payment)
+async def process_successful_payment(message: types.Message):
+    """Обработка успешного платежа"""
+    try:
+        payment_info = message.successful_payment
+        
+        # Получаем данные
+        user_id = message.from_user.id
+        username = message.from_user.username or "unknown"
+        payload = payment_info.invoice_payload
+        provider_payment_charge_id = payment_info.provider_payment_charge_id  # ID в ЮKassa
+        total_amount = payment_info.total_amount / 100  # Из копеек в рубли
+        
+        # Парсим payload чтобы получить tariff_code
+        parts = payload.split('_')
+        tariff_code = parts[1] if len(parts) > 1 else '1month'
+        
+        tariff = TARIFFS.get(tariff_code)
+        
+        if not tariff:
+            logging.error(f"Unknown tariff: {tariff_code}")
+            await message.answer("❌ Ошибка определения тарифа. Обратитесь к администратору.")
+            return
+        
+        # Обновляем статус платежа в БД
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('''UPDATE payments 
+                       SET status = %s, yookassa_id = %s 
+                       WHERE payment_id = %s''',
+                   ('completed', provider_payment_charge_id, payload))
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        # Активируем подписку
+        add_user(user_id, username, tariff['days'], tariff_code)
+        track_user_action(user_id, f'completed_payment_{tariff_code}')
+        
+        # Создаем инвайт-ссылку
+        try:
+            # Из пула по классу срока тарифа ("навсегда" - без срока)
+            tenant = tenants.current()
+            invite_link = await invite_pool.get_invite_link(tenant.bot, get_db_connection, tenant.channel_id,
+                                                             tariff_code, user_id)
+            
+            # Отправляем подтверждение
+            await message.answer(
+                f"✅ **Оплата прошла успешно!**\n\n"
+                f"🎉 Поздравляем! Вы получили доступ.\n"
+                f"📅 Тариф: {tariff['name']}\n"
+                f"💰 Оплачено: {total_amount}₽\n\n"
+                f"🔗 **Переходите в группу:**\n{invite_link}\n\n"
+                f"💡 Сохраните эту ссылку!",
+                reply_markup=get_main_menu(),
+                parse_mode="Markdown"
+            )
+            
+            # Уведомляем админа
+            await notify_admins(
+                tenant.bot, tenant.admin_ids,
+                f"💰 **НОВАЯ ОПЛАТА!**\n\n"
+                f"👤 User: @{username} (ID: {user_id})\n"
+                f"📦 Тариф: {tariff['name']}\n"
+                f"💵 Сумма: {total_amount}₽\n"
+                f"🆔 ЮKassa ID: {provider_payment_charge_id}",
+                parse_mode="Markdown"
+            )
+            
+            logging.info(f"Payment successful: user {user_id}, tariff {tariff_code}, amount {total_amount}")
+            
+        except Exception as e:
+            logging.error(f"Error creating invite after payment: {e}")
+            await message.answer(
+                "✅ Оплата получена!\n"
+                "❌ Ошибка создания приглашения.\n"
+                "Обратитесь к администратору @razvitie_dety",
+                reply_markup=get_main_menu()
+            )
+    
+    except Exception as e:
+        logging.error(f"Error processing successful payment: {e}")
+        await message.answer(
+            "⚠️ Платёж получен, но возникла ошибка.\n"
+            "Обратитесь к администратору @razvitie_dety"
+        )
+
+@callbacks.exact("show_tariffs")
+async def show_tariffs(callback: types.CallbackQuery):
+    """Показать список тарифов"""
+    track_user_action(callback.from_user.id, 'viewed_tariffs')
+    
+    await callback.message.edit_text(
+        "📋 **Выберите подходящую подписку:**\n\n"
+        "💎 **1 месяц - 199₽**\n"
+        "~~499₽~~ → Скидка 60%!\n"
+        "• Идеально чтобы протестировать\n"
+        "• Самый популярный выбор\n\n"
+        "🔥 **НАВСЕГДА - 599₽**\n"
+        "~~2990₽~~ → Скидка 80%!\n"
+        "• Разовый платеж - больше не платишь\n"
+        "• Лучшая цена!\n"
+        "• Доступ без ограничений\n\n"
+        "⚡️ **Специальные цены только для вас!**",
+        reply_markup=get_tariffs_menu(),
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("1month")
+async def process_1month_tariff(callback: types.CallbackQuery):
+    """Обработка выбора тарифа 1 месяц"""
+    user_id = callback.from_user.id
+    tariff_code = '1month'
+    tariff = TARIFFS[tariff_code]
+    
+    track_user_action(user_id, f'selected_tariff_{tariff_code}')
+    
+    await callback.answer("⏳ Отправляю счёт на оплату...", show_alert=False)
+    
+    success = await send_invoice(user_id, tariff_code)
+    
+    if success:
+        await callback.message.answer(
+            f"📋 **Счёт на оплату отправлен!**\n\n"
+            f"📦 Тариф: {tariff['name']}\n"
+            f"💰 К оплате: **{tariff['price']}₽**\n\n"
+            f"👆 Нажмите на счёт выше для оплаты\n\n"
+            f"💳 Принимаем все российские карты 🇷🇺\n\n"
+            f"✅ После оплаты доступ откроется **АВТОМАТИЧЕСКИ**!",
+            parse_mode="Markdown"
+        )
+    else:
+        await callback.message.answer(
+            "❌ Ошибка создания счёта. Попробуйте позже.",
+            reply_markup=get_main_menu()
+        )
+
+@callbacks.exact("forever")
+async def process_forever_tariff(callback: types.CallbackQuery):
+    """🆕 Обработка выбора Forever - С КАЛЬКУЛЯТОРОМ"""
+    user_id = callback.from_user.id
+    track_user_action(user_id, 'selected_tariff_forever')
+    
+    # 🆕 СНАЧАЛА ПОКАЗЫВАЕМ КАЛЬКУЛЯТОР
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💳 Оплатить 599₽", callback_data="forever_confirmed")],
+        [InlineKeyboardButton(text="📊 Сравнить с 1 месяцем", callback_data="compare_tariffs")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="show_tariffs")]
+    ])
+    
+    await callback.message.edit_text(
+        "🔥 **НАВСЕГДА - 599₽**\n\n"
+        "💡 **МАТЕМАТИКА:**\n\n"
+        
+        "**Вариант А (по месяцам):**\n"
+        "• Месяц 1: 199₽\n"
+        "• Месяц 2: 199₽\n"
+        "• Месяц 3: 199₽\n"
+        "• Месяц 4: 199₽\n"
+        "━━━━━━━━━━━\n"
+        "**Итого за 4 месяца: 796₽**\n\n"
+        
+        "**Вариант Б (Forever):**\n"
+        "• ОДИН платёж: 599₽\n"
+        "• Больше НИКОГДА не платишь\n"
+        "━━━━━━━━━━━\n"
+        "**Экономия: 197₽ уже на 4й месяц!**\n\n"
+        
+        "📊 **Статистика:**\n"
+        "• 92% используют >6 месяцев\n"
+        "• Средняя экономия: 1500₽ в год\n\n"
+        
+        "🎯 **Окупаемость: 3 месяца**\n"
+        "Всё что после - БЕСПЛАТНО!\n\n"
+        
+        "⚠️ **ВАЖНО:** Эта цена только для trial!\n"
+        "После истечения: 2990₽\n\n"
+        "Готов оформить навсегда?",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
+
+@callbacks.exact("forever_confirmed")
+async def forever_confirmed(callback: types.CallbackQuery):
+    """Подтверждение Forever - отправка инвойса"""
+    user_id = callback.from_user.id
+    tariff_code = 'forever'
+    tariff = TARIFFS[tariff_code]
+    
+    await callback.answer("⏳ Отправляю счёт на оплату...", show_alert=False)
+    
+    success = await send_invoice(user_id, tariff_code)
+    
+    if success:
+        await callback.message.answer(
+            f"📋 **Счёт на оплату отправлен!**\n\n"
+            f"📦 Тариф: Навсегда\n"
+            f"💰 К оплате: **599₽**\n\n"
+            f"👆 Нажмите на счёт выше для оплаты\n\n"
+            f"💳 Принимаем все российские карты 🇷🇺\n\n"
+            f"✅ После оплаты доступ откроется **АВТОМАТИЧЕСКИ**!\n\n"
+            f"🎯 Это ПОСЛЕДНИЙ раз когда платишь за доступ!",
+            parse_mode="Markdown"
+        )
+    else:
+        await callback.message.answer(
+            "❌ Ошибка создания счёта. Попробуйте позже.",
+            reply_markup=get_main_menu()
+        )
+
+@callbacks.exact("compare_tariffs")
+async def compare_tariffs(callback: types.CallbackQuery):
+    """🆕 Сравнение тарифов"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💎 1 месяц - 199₽", callback_data="1month")],
+        [InlineKeyboardButton(text="🔥 НАВСЕГДА - 599₽", callback_data="forever_confirmed")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="show_tariffs")]
+    ])
+    
+    await callback.message.edit_text(
+        "📊 **СРАВНЕНИЕ ТАРИФОВ**\n\n"
+        "```\n"
+        "┌─────────┬────────┬──────────┐\n"
+        "│ Период  │ 1 мес  │ Навсегда │\n"
+        "├─────────┼────────┼──────────┤\n"
+        "│ 1 мес   │  199₽  │   599₽   │\n"
+        "│ 3 мес   │  597₽  │   599₽ ✅│\n"
+        "│ 6 мес   │ 1194₽  │   599₽ ✅│\n"
+        "│ 1 год   │ 2388₽  │   599₽ ✅│\n"
+        "└─────────┴────────┴──────────┘\n"
+        "```\n\n"
+        
+        "💡 **Вывод:**\n"
+        "• Через 3 месяца Forever выгоднее!\n"
+        "• Экономия за год: **1789₽**\n"
+        "• Не нужно помнить о продлении\n\n"
+        
+        "🎯 **87% родителей выбирают Forever**\n"
+        "Они понимают что это выгоднее!",
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
@@ -0,0 +1,223 @@
+"""
+Пул одноразовых инвайт-ссылок в закрытую группу
+Ссылки создаются заранее фоновой задачей и хранятся в таблице invite_links,
+по классу срока действия (тарифы с одинаковым числом дней делят один класс,
+ссылки "навсегда" - без срока). Хендлер пробного периода и оплаты забирает
+готовую ссылку одним UPDATE ... FOR UPDATE SKIP LOCKED вместо вызова Bot API;
+если пул пуст или база недоступна - создаёт ссылку сам, как раньше.
+
+Ссылка, созданная на месте, живёт ровно срок тарифа, поэтому ссылка из пула
+выдаётся, только пока она младше INVITE_MAX_AGE: покупатель получает не меньше
+срока тарифа минус INVITE_MAX_AGE. Фоновая задача доливает класс до
+INVITE_POOL_SIZE, когда свободных ссылок меньше INVITE_POOL_LOW, и отзывает
+невыданные ссылки старше INVITE_MAX_AGE и классов, которых больше нет в TARIFFS -
+так пул ссылок с ограниченным сроком обновляется примерно раз в INVITE_MAX_AGE.
+
+У каждого клуба свой пул: ссылки различаются по chat_id, и отзывает их бот
+этого клуба. Ссылки групп, которых больше нет среди клубов (сменился channel_id,
+см. tenants), не отзываются - бот в такой группе обычно уже не админ - и просто
+больше не выдаются
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+
+from config import TARIFFS
+
+INVITE_POOL_SIZE = int(os.getenv('INVITE_POOL_SIZE', 10))
+INVITE_POOL_LOW = int(os.getenv('INVITE_POOL_LOW', 3))
+# Ссылка с ограниченным сроком выдаётся из пула, только пока она младше этого
+INVITE_MAX_AGE = timedelta(minutes=int(os.getenv('INVITE_MAX_AGE_MIN', 60)))
+# Выданные и отозванные ссылки храним столько, потом удаляем
+INVITE_HISTORY = timedelta(days=90)
+# Больше ссылок за один проход не создаём (лимиты Bot API)
+REFILL_BATCH = 20
+
+# Сколько ссылок выдано из пула и сколько пришлось создавать на месте
+stats = {'claimed': 0, 'fallback': 0, 'created': 0, 'revoked': 0}
+
+def link_class(tariff_code):
+    """Класс срока действия ссылки для тарифа: '7d', '30d', ... или 'forever'"""
+    if tariff_code == 'forever':
+        return 'forever'
+    return f"{TARIFFS[tariff_code]['days']}d"
+
+def link_classes():
+    """{класс: дней жизни ссылки или None} для всех тарифов"""
+    return {link_class(code): None if code == 'forever' else tariff['days']
+            for code, tariff in TARIFFS.items()}
+
+def _fresh_since():
+    """Ссылки с ограниченным сроком, созданные раньше этого момента, уже не выдаются"""
+    return datetime.now() - INVITE_MAX_AGE
+
+def init_schema(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS invite_links (
+            invite_link TEXT PRIMARY KEY,
+            chat_id TEXT NOT NULL,
+            link_class TEXT NOT NULL,
+            expires_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT NOW(),
+            claimed_by BIGINT,
+            claimed_at TIMESTAMP,
+            revoked_at TIMESTAMP
+        )
+    ''')
+    # Свободные ссылки класса в порядке создания - для выдачи и подсчёта
+    cur.execute('''CREATE INDEX IF NOT EXISTS idx_invite_links_free
+                   ON invite_links (chat_id, link_class, created_at)
+                   WHERE claimed_at IS NULL AND revoked_at IS NULL''')
+
+# ============================================
+# ВЫДАЧА
+# ============================================
+
+def claim_link(get_db_connection, chat_id, tariff_code, user_id):
+    """Забрать свободную ссылку из пула; None, если пул пуст"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        UPDATE invite_links SET claimed_by = %s, claimed_at = %s
+        WHERE invite_link = (
+            SELECT invite_link FROM invite_links
+            WHERE chat_id = %s AND link_class = %s
+              AND claimed_at IS NULL AND revoked_at IS NULL
+              AND (expires_at IS NULL OR created_at > %s)
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING invite_link
+    ''', (user_id, datetime.now(), str(chat_id), link_class(tariff_code), _fresh_since()))
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    conn.close()
+    return row['invite_link'] if row else None
+
+async def get_invite_link(bot, get_db_connection, chat_id, tariff_code, user_id):
+    """Одноразовая ссылка для тарифа: из пула, а если не вышло - создаётся сразу"""
+    try:
+        link = claim_link(get_db_connection, chat_id, tariff_code, user_id)
+    except Exception as e:
+        logging.error(f"Invite pool claim failed: {e}")
+        link = None
+    if link:
+        stats['claimed'] += 1
+        return link
+
+    stats['fallback'] += 1
+    logging.warning(f"Invite pool is empty for {link_class(tariff_code)}, creating link for user {user_id}")
+    days = link_classes()[link_class(tariff_code)]
+    expire_date = datetime.now() + timedelta(days=days) if days else None
+    invite = await bot.create_chat_invite_link(chat_id, member_limit=1, expire_date=expire_date)
+    return invite.invite_link
+
+# ============================================
+# ПОПОЛНЕНИЕ И ОТЗЫВ
+# ============================================
+
+def _free_counts(get_db_connection, chat_id):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT link_class, COUNT(*) AS free FROM invite_links
+        WHERE chat_id = %s AND claimed_at IS NULL AND revoked_at IS NULL
+          AND (expires_at IS NULL OR created_at > %s)
+        GROUP BY link_class
+    ''', (str(chat_id), _fresh_since()))
+    counts = {row['link_class']: row['free'] for row in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return counts
+
+def _save_link(get_db_connection, chat_id, name, invite_link, expires_at):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''INSERT INTO invite_links (invite_link, chat_id, link_class, expires_at, created_at)
+                   VALUES (%s, %s, %s, %s, %s)
+                   ON CONFLICT (invite_link) DO NOTHING''',
+                (invite_link, str(chat_id), name, expires_at, datetime.now()))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+async def refill(bot, get_db_connection, chat_id):
+    """Долить классы, в которых свободных ссылок меньше INVITE_POOL_LOW"""
+    counts = _free_counts(get_db_connection, chat_id)
+    budget = REFILL_BATCH
+    for name, days in link_classes().items():
+        free = counts.get(name, 0)
+        if free >= INVITE_POOL_LOW:
+            continue
+        missing = min(INVITE_POOL_SIZE - free, budget)
+        for _ in range(missing):
+            expires_at = datetime.now() + timedelta(days=days) if days else None
+            invite = await bot.create_chat_invite_link(chat_id, member_limit=1, expire_date=expires_at)
+            _save_link(get_db_connection, chat_id, name, invite.invite_link, expires_at)
+            stats['created'] += 1
+        budget -= missing
+        logging.info(f"Invite pool {name}: {free} free, created {missing}")
+
+def _stale_links(get_db_connection, chat_id):
+    """Невыданные ссылки группы chat_id, которые пора отозвать: старше INVITE_MAX_AGE
+    или класса, которого больше нет"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT invite_link FROM invite_links
+        WHERE chat_id = %s AND claimed_at IS NULL AND revoked_at IS NULL
+          AND (link_class <> ALL(%s) OR (expires_at IS NOT NULL AND created_at <= %s))
+    ''', (str(chat_id), list(link_classes()), _fresh_since()))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+def _mark_revoked(get_db_connection, invite_link):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('UPDATE invite_links SET revoked_at = %s WHERE invite_link = %s AND claimed_at IS NULL',
+                (datetime.now(), invite_link))
+    marked = cur.rowcount == 1
+    conn.commit()
+    cur.close()
+    conn.close()
+    return marked
+
+async def revoke_stale(bot, get_db_connection, chat_id):
+    """Отозвать ботом клуба устаревшие невыданные ссылки его группы chat_id
+    и удалить старую историю"""
+    for row in _stale_links(get_db_connection, chat_id):
+        # Сначала помечаем в базе - чтобы ссылку уже никто не забрал, потом отзываем в Telegram.
+        # Если её успели выдать между SELECT и UPDATE - не трогаем
+        if not _mark_revoked(get_db_connection, row['invite_link']):
+            continue
+        try:
+            await bot.revoke_chat_invite_link(chat_id, row['invite_link'])
+        except Exception as e:
+            # Ссылка уже помечена и никому не выдана, но в Telegram может остаться рабочей
+            logging.warning(f"Invite link revoke failed in {chat_id}: {e}")
+            continue
+        stats['revoked'] += 1
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''DELETE FROM invite_links
+                   WHERE COALESCE(claimed_at, revoked_at) < %s''',
+                (datetime.now() - INVITE_HISTORY,))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+async def maintain(bot, get_db_connection, chat_id):
+    """Проход фоновой задачи для группы одного клуба: отзыв устаревших, затем пополнение"""
+    await revoke_stale(bot, get_db_connection, chat_id)
+    await refill(bot, get_db_connection, chat_id)
+
+def format_report():
+    return (f"🔗 <b>Пул инвайт-ссылок</b>\n"
+            f"Из пула: {stats['claimed']}, создано на месте: {stats['fallback']}\n"
+            f"Создано заранее: {stats['created']}, отозвано: {stats['revoked']}\n")
@@ -0,0 +1,770 @@
+"""
+Фоновые задачи: воронка продаж, истекшие подписки, приветствия,
+напоминания о неоплаченных счетах и обслуживание аналитики.
+Все они регистрируются в supervisor и стартуют после проверки схемы БД.
+Задачи общие для всех клубов: бот, группа и администраторы берутся из клуба
+строки (tenant_id, см. tenants)
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from psycopg2.extras import execute_values
+
+import analytics
+import approx_stats
+import delivery
+import invite_pool
+import tenants
+from db import (get_db_connection, track_user_action, get_user, get_expired_users,
+                was_notified_recently, mark_as_notified, FUNNEL_STAGE_BITS, FUNNEL_CLAIM_LEASE, active_claims,
+                get_trial_users_for_funnel, get_expired_trial_users, mark_funnel_stage_sent)
+from keyboards import get_main_menu
+from loader import lifecycle, supervisor
+from scheduler import Job
+
+# ========================================
+# ОТПРАВКА
+# ========================================
+
+def tenant_of(row):
+    """Клуб строки из базы; None (с предупреждением), если его убрали из настроек"""
+    tenant = tenants.get(row['tenant_id'])
+    if tenant is None:
+        logging.warning(f"Unknown tenant {row['tenant_id']} for user {row['user_id']}, skipping")
+    return tenant
+
+async def send_safe_funnel_message(user_id, text, reply_markup=None, parse_mode="Markdown",
+                                   kind='funnel', enqueued_at=None, tenant=None):
+    """Отправка сообщения воронки ботом клуба (по умолчанию - текущего);
+    заблокировавшие бота попадают в undeliverable (delivery)"""
+    tenant = tenant or tenants.current()
+    outcome = await delivery.send(tenant.bot, get_db_connection, user_id, text,
+                                  kind=kind, enqueued_at=enqueued_at,
+                                  reply_markup=reply_markup, parse_mode=parse_mode)
+    return outcome == delivery.SENT
+
+# ========================================
+# ВОРОНКА ПРОДАЖ
+# ========================================
+
+# Этапы воронки: (этап, от чего считаем часы, окно "от" и "до").
+# since_registration и until_end - для активных trial, since_expired - для истекших
+FUNNEL_STAGES = [
+    # ДЕНЬ 1 (20-28 часов) - ПРОВЕРКА ОПЫТА
+    ('day1', 'since_registration', 20, 28),
+    # 🆕 ДЕНЬ 2 (44-52 часа) - ЛАЙФХАК
+    ('day2', 'since_registration', 44, 52),
+    # ДЕНЬ 3 (68-76 часов) - СОЦИАЛЬНОЕ ДОКАЗАТЕЛЬСТВО
+    ('day3', 'since_registration', 68, 76),
+    # 🆕 ДЕНЬ 4 (92-100 часов) - РЕЗУЛЬТАТЫ
+    ('day4', 'since_registration', 92, 100),
+    # ДЕНЬ 5 (116-124 часа) - ОТЗЫВЫ + СРОЧНОСТЬ
+    ('day5', 'since_registration', 116, 124),
+    # ДЕНЬ 7 - ЗА 8 ЧАСОВ ДО КОНЦА
+    ('day7_8hours', 'until_end', 8, 12),
+    # ДЕНЬ 7 - ЗА 2 ЧАСА ДО КОНЦА (ПОСЛЕДНИЙ ШАНС)
+    ('day7_2hours', 'until_end', 1, 3),
+    # СРАЗУ ПОСЛЕ ИСТЕЧЕНИЯ (0-2 часа)
+    ('expired_immediate', 'since_expired', 0, 2),
+    # ДЕНЬ 2 ПОСЛЕ ИСТЕЧЕНИЯ (46-50 часов)
+    ('expired_day2', 'since_expired', 46, 50),
+    # ДЕНЬ 5 ПОСЛЕ ИСТЕЧЕНИЯ (118-122 часа) - ФИДБЕК
+    ('expired_day5', 'since_expired', 118, 122),
+]
+
+# Ссылка на группу в кнопках этапов: группа своя у каждого клуба и подставляется
+# при отправке (funnel_keyboard), а не при импорте
+CHANNEL_LINK = "https://t.me/+{channel_id}"
+
+FUNNEL_MESSAGES = {
+    'day1': (
+        "Привет! 👋\n\n"
+        "Прошел первый день с нашими материалами!\n\n"
+        "🤔 **Как тебе?**\n"
+        "• Удалось позаниматься с ребенком?\n"
+        "• Понятно как пользоваться группой?\n"
+        "• Всё нашел что искал?\n\n"
+        "💡 **Лайфхак дня:**\n"
+        "Занимайся утром 15-20 минут - в это время дети максимально внимательны!\n\n"
+        "🎯 Осталось **6 дней** trial - используй по максимуму!\n\n"
+        "💬 Если есть вопросы - пиши, помогу разобраться!",
+        [
+            [InlineKeyboardButton(text="👍 Всё отлично!", callback_data="feedback_good")],
+            [InlineKeyboardButton(text="🤔 Есть вопросы", url="https://t.me/razvitie_dety")],
+            [InlineKeyboardButton(text="📚 Нужна помощь", callback_data="need_help")]
+        ]
+    ),
+    'day2': (
+        "👋 Привет!\n\n"
+        "Прошло 2 дня - как впечатления?\n\n"
+        "💡 **Лайфхак:**\n"
+        "Родители которые занимаются УТРОМ (до садика/завтрака) "
+        "видят результат быстрее!\n\n"
+        "🎯 Ребёнок свежий, внимательный, усваивает лучше\n\n"
+        "Попробуй завтра утром 15 минут - и увидишь разницу!\n\n"
+        "P.S. Осталось 5 дней trial - успей протестировать "
+        "разные материалы! 📚",
+        [
+            [InlineKeyboardButton(text="📚 В группу", url=CHANNEL_LINK)],
+            [InlineKeyboardButton(text="💬 Вопросы", url="https://t.me/razvitie_dety")]
+        ]
+    ),
+    'day3': (
+        "Уже 3 дня вместе! 🎉\n\n"
+        "Надеемся, материалы вам нравятся!\n\n"
+        "📊 **Интересный факт:**\n"
+        "Родители которые занимаются по нашим материалам всего 15-20 минут в день, "
+        "замечают видимые результаты уже через неделю!\n\n"
+        "✨ Осталось **4 дня** пробного периода\n\n"
+        "🎁 **Специальная цена только для пробников:**\n"
+        "• 1 месяц - 199₽ вместо 499₽ (-60%)\n"
+        "• Навсегда - 599₽ вместо 2990₽ (-80%)\n\n"
+        "💡 **Совет:** 87% родителей выбирают тариф \"Навсегда\" - "
+        "это как раз чтобы пройти полный курс развития без спешки!",
+        [
+            [InlineKeyboardButton(text="📋 Посмотреть тарифы", callback_data="show_tariffs")],
+            [InlineKeyboardButton(text="💬 Отзывы других родителей", callback_data="show_reviews")]
+        ]
+    ),
+    'day4': (
+        "🎉 **Половина пути пройдена!**\n\n"
+        "Ты с нами уже 4 дня - заметил изменения?\n\n"
+        "📊 **Обычно к 4му дню родители видят:**\n"
+        "• Ребёнок стал усидчивее (+30%)\n"
+        "• Выучил 3-5 новых букв/цифр\n"
+        "• САМ просит позаниматься!\n\n"
+        "У тебя так же? 😊\n\n"
+        "💡 **Осталось 3 дня - самое время:**\n"
+        "1. Попробовать сложные материалы\n"
+        "2. Найти любимые темы ребёнка\n"
+        "3. Составить план после trial\n\n"
+        "⚠️ **После trial цена вырастет:**\n"
+        "• Сейчас: 199₽/мес или 599₽ навсегда\n"
+        "• Потом: 499₽/мес или 2990₽ навсегда\n\n"
+        "Успей оформить со скидкой! 🔥",
+        [
+            [InlineKeyboardButton(text="💰 Посмотреть тарифы", callback_data="show_tariffs")],
+            [InlineKeyboardButton(text="📚 Продолжить занятия", url=CHANNEL_LINK)]
+        ]
+    ),
+    'day5': (
+        "💬 **Что говорят другие родители:**\n\n"
+        "**Анна (2 детей):**\n"
+        "\"Дочка за неделю выучила 10 букв! Занимаемся по утрам 20 минут. "
+        "Теперь сама просит позаниматься!\"\n\n"
+        "**Олег (сын 5 лет):**\n"
+        "\"Раньше тратил часы на поиск заданий. Теперь всё в одном месте. "
+        "Окупилось за первую неделю!\"\n\n"
+        "**Мария (дочка 3 года):**\n"
+        "\"Попробовали trial - не смогли остановиться. "
+        "Взяли Навсегда со скидкой!\"\n\n"
+        "📊 **Наши цифры:**\n"
+        "• 87% родителей продлевают подписку\n"
+        "• 1000+ активных семей\n"
+        "• 5000+ развивающих материалов\n\n"
+        "⏰ Осталось **2 дня** пробного периода!\n\n"
+        "🎁 Успей оформить со скидкой 60-80%!",
+        [
+            [InlineKeyboardButton(text="💳 Оформить со скидкой", callback_data="show_tariffs")],
+            [InlineKeyboardButton(text="📸 Больше отзывов", callback_data="show_reviews")]
+        ]
+    ),
+    'day7_8hours': (
+        "⏰ **Осталось меньше 8 часов!**\n\n"
+        "Завтра доступ к материалам закроется...\n\n"
+        "🎁 Но у вас еще есть время оформить подписку со **СКИДКОЙ**:\n\n"
+        "💰 **Специальные цены (только для пробников):**\n"
+        "• 1 месяц: 199₽ (экономия 300₽)\n"
+        "• Навсегда: 599₽ (экономия 2391₽!)\n\n"
+        "⚠️ После окончания пробного периода эти цены **исчезнут навсегда**!\n\n"
+        "💡 P.S. Не теряйте то, что уже начали строить вместе с ребенком 💚",
+        [
+            [InlineKeyboardButton(text="🔥 Продолжить со скидкой", callback_data="show_tariffs")]
+        ]
+    ),
+    'day7_2hours': (
+        "🚨 **ПОСЛЕДНИЕ 2 ЧАСА!**\n\n"
+        "Представьте: завтра ваш ребенок спросит:\n"
+        "\"Мама/Папа, а где наши игры?\"\n\n"
+        "😔 Или завтра вы продолжите вместе:\n"
+        "✅ Развивать речь через игры\n"
+        "✅ Создавать поделки\n"
+        "✅ Учиться через творчество\n\n"
+        "💰 **199₽ в месяц = всего 6₽ в день**\n"
+        "☕ Это меньше чем чашка кофе!\n\n"
+        "🔥 Скидка 60-80% действует **только до конца пробного периода**!\n\n"
+        "⏰ Не упустите момент - осталось меньше 2 часов!",
+        [
+            [InlineKeyboardButton(text="💳 Продолжить СЕЙЧАС!", callback_data="show_tariffs")],
+            [InlineKeyboardButton(text="💬 Срочный вопрос", url="https://t.me/razvitie_dety")]
+        ]
+    ),
+    'expired_immediate': (
+        "😔 Ваш пробный доступ истек\n\n"
+        "Надеемся, материалы понравились вам и вашему ребенку.\n\n"
+        "🎁 **Хорошая новость:**\n\n"
+        "Специально для вас мы **сохранили скидку еще на 7 дней**!\n\n"
+        "Вернуться можно прямо сейчас:\n"
+        "• 199₽ за месяц (вместо 499₽)\n"
+        "• Или выбрать тариф Навсегда за 599₽\n\n"
+        "📊 **Что вы потеряете без подписки:**\n"
+        "❌ 1000+ развивающих материалов\n"
+        "❌ Еженедельные новинки\n"
+        "❌ Поддержку и советы\n\n"
+        "💡 P.S. Скидка действует 7 дней, потом цены вернутся к обычным.",
+        [
+            [InlineKeyboardButton(text="💳 Вернуться в клуб", callback_data="show_tariffs")]
+        ]
+    ),
+    'expired_day2': (
+        "💬 **Посмотрите, что говорят родители:**\n\n"
+        "\"Вернулись после пробного и не жалеем! Ребенок с нетерпением ждет новых заданий!\" - Елена\n\n"
+        "\"За месяц сын научился считать до 20 и выучил все буквы!\" - Мария\n\n"
+        "\"Пожалела что не продлила сразу, пришлось платить по полной цене 😔\" - Ольга\n\n"
+        "🤔 А вы все еще думаете?\n\n"
+        "⏰ Осталось **5 дней** специальной цены!\n\n"
+        "💡 **Знаете ли вы:**\n"
+        "• 87% родителей продлевают подписку\n"
+        "• Экономия 2-3 часа в неделю на поиске материалов\n"
+        "• Средний результат: +10 новых навыков за месяц\n\n"
+        "🎯 1 месяц = всего **6₽ в день**!\n\n"
+        "❓ Не уверены? Напишите нам - расскажем подробнее!",
+        [
+            [InlineKeyboardButton(text="📋 Выбрать тариф", callback_data="show_tariffs")],
+            [InlineKeyboardButton(text="💬 Задать вопрос", url="https://t.me/razvitie_dety")]
+        ]
+    ),
+    'expired_day5': (
+        "🙏 Можем узнать ваше мнение?\n\n"
+        "Мы заметили, что вы не продлили подписку после пробного периода.\n\n"
+        "**Что вас остановило?**\n\n"
+        "💡 За честный ответ - **специальный бонус**:\n"
+        "Промокод на скидку **30%** на любой тариф!\n\n"
+        "💚 P.S. Нам действительно важно ваше мнение - это поможет нам стать лучше!",
+        [
+            [InlineKeyboardButton(text="💰 Слишком дорого", callback_data="feedback_expensive")],
+            [InlineKeyboardButton(text="📚 Не понравился контент", callback_data="feedback_content")],
+            [InlineKeyboardButton(text="⏰ Нужно больше времени", callback_data="feedback_time")],
+            [InlineKeyboardButton(text="💬 Другая причина", callback_data="feedback_other")]
+        ]
+    ),
+}
+
+# Сколько пользователей резервируем и обрабатываем за один раз
+FUNNEL_BATCH = 500
+# Дальше этого срока после окончания trial этапов воронки нет - старых не сканируем
+FUNNEL_EXPIRED_HORIZON = timedelta(hours=max(end for _, measure, _, end in FUNNEL_STAGES
+                                             if measure == 'since_expired'))
+
+def due_funnel_stages(user, now):
+    """Этапы, окно которых открыто для пользователя прямо сейчас"""
+    hours = {
+        'since_registration': (now - user['created_at']).total_seconds() / 3600,
+        'until_end': (user['subscription_until'] - now).total_seconds() / 3600,
+    }
+    hours['since_expired'] = -hours['until_end']
+    expired = hours['until_end'] < 0
+    for stage, measure, start, end in FUNNEL_STAGES:
+        if (measure == 'since_expired') == expired and start <= hours[measure] < end:
+            yield stage
+
+def due_funnel_mask(user, now):
+    """Биты этапов, которые пора отправить и которые ещё не отправлены и не зарезервированы"""
+    mask = 0
+    for stage in due_funnel_stages(user, now):
+        mask |= 1 << FUNNEL_STAGE_BITS[stage]
+    return mask & ~user['funnel_mask']
+
+def stages_in_mask(mask):
+    return [stage for stage, bit in FUNNEL_STAGE_BITS.items() if mask & (1 << bit)]
+
+def claim_funnel_stages(wanted):
+    """Атомарно резервируем биты этапов [(user_id, mask)] на FUNNEL_CLAIM_LEASE. Если хоть один
+    бит уже отправлен или зарезервирован живым параллельным проходом - пользователь не возвращается.
+    Резервы с истёкшей арендой (проход упал, отменён по max_runtime или SIGTERM) не считаются"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    lease = int(FUNNEL_CLAIM_LEASE.total_seconds())
+    claimed = execute_values(cur, f'''INSERT INTO funnel_progress (user_id, claimed_mask, claim_lease_until)
+                                       VALUES %s
+                                       ON CONFLICT (user_id) DO UPDATE
+                                       SET claimed_mask = {active_claims('funnel_progress')} | EXCLUDED.claimed_mask,
+                                           claim_lease_until = EXCLUDED.claim_lease_until
+                                       WHERE (funnel_progress.sent_mask | {active_claims('funnel_progress')})
+                                             & EXCLUDED.claimed_mask = 0
+                                       RETURNING user_id''',
+                             wanted, template=f"(%s, %s, LOCALTIMESTAMP + INTERVAL '{lease} seconds')",
+                             page_size=len(wanted), fetch=True)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+    return {row['user_id'] for row in claimed}
+
+def finish_funnel_stages(results):
+    """Одним UPDATE: отправленные биты переносим в sent_mask с временем отправки,
+    резерв неудачных снимаем, чтобы попробовать на следующем проходе, пока окно открыто"""
+    if not results:
+        return
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    execute_values(cur, '''UPDATE funnel_progress p
+                           SET sent_mask = p.sent_mask | v.sent,
+                               claimed_mask = p.claimed_mask & ~(v.sent | v.failed),
+                               stage_times = ARRAY(
+                                   SELECT CASE WHEN v.sent & (1 << i) <> 0 THEN LOCALTIMESTAMP
+                                               ELSE p.stage_times[i + 1] END
+                                   FROM generate_series(0, 30) AS i ORDER BY i)
+                           FROM (VALUES %s) AS v(user_id, sent, failed)
+                           WHERE p.user_id = v.user_id''',
+                   results, page_size=len(results))
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def funnel_keyboard(buttons, tenant):
+    """Клавиатура этапа для клуба: в кнопки с CHANNEL_LINK подставляется его группа"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [button.model_copy(update={'url': button.url.format(channel_id=tenant.channel_id)})
+         if button.url == CHANNEL_LINK else button
+         for button in row]
+        for row in buttons
+    ])
+
+async def send_funnel_stage(user_id, stage, enqueued_at=None, tenant=None):
+    tenant = tenant or tenants.current()
+    text, buttons = FUNNEL_MESSAGES[stage]
+    return await send_safe_funnel_message(user_id, text,
+                                          reply_markup=funnel_keyboard(buttons, tenant),
+                                          kind=f'funnel:{stage}', enqueued_at=enqueued_at, tenant=tenant)
+
+async def sales_funnel_pass():
+    """Один проход воронки продаж: trial-пользователи и истекшие trial.
+    Сначала резерв, потом отправка. Резерв прерванного прохода истекает через FUNNEL_CLAIM_LEASE,
+    и неотправленные этапы берёт следующий проход, пока их окно открыто; сообщение, ушедшее
+    прямо перед падением (до finish_funnel_stages), в этом случае может прийти повторно"""
+    now = datetime.now()
+    wanted = []
+    user_tenants = {}
+    for users in (get_trial_users_for_funnel(), get_expired_trial_users(now - FUNNEL_EXPIRED_HORIZON)):
+        for user in users:
+            mask = due_funnel_mask(user, now)
+            tenant = tenant_of(user) if mask else None
+            if tenant:
+                wanted.append((user['user_id'], mask))
+                user_tenants[user['user_id']] = tenant
+
+    for offset in range(0, len(wanted), FUNNEL_BATCH):
+        batch = wanted[offset:offset + FUNNEL_BATCH]
+        claimed_users = claim_funnel_stages(batch)
+        sends = [(user_id, stage) for user_id, mask in batch if user_id in claimed_users
+                 for stage in stages_in_mask(mask)]
+        # Задержка в журнале доставки считается от начала прохода - время ожидания своей пачки
+        results = await asyncio.gather(*(send_funnel_stage(user_id, stage, now, user_tenants[user_id])
+                                         for user_id, stage in sends),
+                                       return_exceptions=True)
+
+        outcome = {user_id: [0, 0] for user_id in claimed_users}
+        for (user_id, stage), result in zip(sends, results):
+            bit = 1 << FUNNEL_STAGE_BITS[stage]
+            if result is True:
+                outcome[user_id][0] |= bit
+                logging.info(f"Sent {stage} message to user {user_id}")
+            else:
+                outcome[user_id][1] |= bit
+                if isinstance(result, Exception):
+                    logging.error(f"Error sending funnel message {stage} to {user_id}: {result}")
+
+        finish_funnel_stages([(user_id, sent, failed) for user_id, (sent, failed) in outcome.items()])
+
+async def check_and_remove_expired_pass():
+    """Один проход удаления пользователей с истекшей подпиской"""
+    logging.info("Checking for expired subscriptions...")
+    expired_users = get_expired_users()
+
+    for user in expired_users:
+        user_id = user['user_id']
+        username = user['username']
+        tenant = tenant_of(user)
+        if tenant is None:
+            continue
+        bot = tenant.bot
+
+        if user_id in tenant.admin_ids:
+            logging.info(f"Skipping admin {user_id}")
+            continue
+
+        if was_notified_recently(user_id):
+            logging.info(f"User {user_id} was already notified recently, skipping...")
+            continue
+
+        try:
+            try:
+                chat_member = await bot.get_chat_member(tenant.channel_id, user_id)
+                if chat_member.status in ['creator', 'administrator']:
+                    logging.info(f"User {user_id} is admin/owner, skipping removal")
+                    continue
+            except Exception as e:
+                logging.warning(f"Could not get chat member info for {user_id}: {e}")
+
+            await bot.ban_chat_member(tenant.channel_id, user_id)
+            await bot.unban_chat_member(tenant.channel_id, user_id)
+
+            logging.info(f"Removed expired user: {username} (ID: {user_id})")
+
+            if user['undeliverable']:
+                # Писать некому, но отметка нужна - иначе удаление будет повторяться каждый час
+                mark_as_notified(user_id)
+                continue
+
+            outcome = await delivery.send(
+                bot, get_db_connection, user_id,
+                "⏰ Ваша подписка истекла!\n\n"
+                "Продлите доступ чтобы продолжить пользоваться материалами.",
+                kind='expired_notice',
+                reply_markup=get_main_menu()
+            )
+            if outcome == delivery.SENT or outcome in delivery.SUPPRESS:
+                mark_as_notified(user_id)
+            if outcome == delivery.SENT:
+                logging.info(f"Notified user {user_id} about expiration")
+
+        except Exception as e:
+            logging.error(f"Error removing user {user_id}: {e}")
+
+# Приветствие приходит через 5 минут после первого /start, если trial ещё не активирован
+WELCOME_DELAY = 300
+# Пропущенные (например, из-за рестарта) приветствия досылаем, если они не старше суток
+WELCOME_RECOVERY_WINDOW = timedelta(hours=24)
+
+_welcome_timers = {}
+_welcome_sent_buffer = []
+
+def schedule_welcome_message(user_id):
+    """Сохраняет приветствие в БД (с клубом текущего апдейта) и ставит таймер в процессе"""
+    due_at = datetime.now() + timedelta(seconds=WELCOME_DELAY)
+    tenant = tenants.current()
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''INSERT INTO welcome_messages (user_id, due_at, tenant_id)
+                   VALUES (%s, %s, %s)
+                   ON CONFLICT (user_id) DO NOTHING
+                   RETURNING user_id''', (user_id, due_at, tenant.tenant_id))
+    scheduled = cur.fetchone() is not None
+    conn.commit()
+    cur.close()
+    conn.close()
+    
+    if scheduled:
+        _start_welcome_timer(user_id, WELCOME_DELAY, tenant)
+
+def _start_welcome_timer(user_id, delay, tenant):
+    if user_id in _welcome_timers:
+        return
+    _welcome_timers[user_id] = lifecycle.create_task(
+        _welcome_after(user_id, delay, tenant), name=f"welcome:{user_id}"
+    )
+
+async def _welcome_after(user_id, delay, tenant):
+    try:
+        # При остановке таймер просто выходит - запись в БД останется и будет восстановлена
+        if await lifecycle.sleep(delay):
+            return
+        # Таймеры, восстановленные при запуске, не знают клуба апдейта - событие пишем от клуба приветствия
+        with tenants.use(tenant):
+            await send_welcome_message(user_id, tenant)
+    finally:
+        _welcome_timers.pop(user_id, None)
+
+async def send_welcome_message(user_id, tenant):
+    """Отправка приветствия одному пользователю по таймеру ботом его клуба"""
+    if get_user(user_id):
+        # Уже активировал trial или оплатил - прогревать не нужно
+        _welcome_sent_buffer.append(user_id)
+        return
+    
+    try:
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🎥 Посмотреть примеры", callback_data="show_demo")],
+            [InlineKeyboardButton(text="⭐ 4.9/5 - Почему 87% продлевают?", callback_data="show_reviews")],
+            [InlineKeyboardButton(text="🎁 Начать пробный период", callback_data="ready_for_trial")]
+        ])
+        
+        outcome = await delivery.send(
+            tenant.bot, get_db_connection, user_id,
+            "👋 Я вижу ты заинтересовался нашим клубом!\n\n"
+            "**Не торопись активировать trial** 😊\n\n"
+            "Сначала посмотри:\n"
+            "🎥 Видео с примерами материалов\n"
+            "💬 Отзывы других родителей\n"
+            "📚 Как это работает\n\n"
+            "А **потом решишь** - подходит тебе или нет!\n\n"
+            "💡 87% родителей после просмотра сразу начинают trial 🔥\n\n"
+            "Что хочешь посмотреть первым?",
+            kind='welcome',
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
+        
+        if outcome in delivery.SUPPRESS:
+            # Заблокировал бота - не досылаем и после рестарта
+            _welcome_sent_buffer.append(user_id)
+            return
+        if outcome != delivery.SENT:
+            return
+        
+        _welcome_sent_buffer.append(user_id)
+        track_user_action(user_id, 'received_welcome_message')
+        logging.info(f"Welcome message sent to user {user_id}")
+        
+    except Exception as e:
+        logging.error(f"Error sending welcome to {user_id}: {e}")
+
+def flush_welcome_marks():
+    """Одним запросом отмечаем все отправленные приветствия"""
+    if not _welcome_sent_buffer:
+        return
+    user_ids = list(_welcome_sent_buffer)
+    del _welcome_sent_buffer[:len(user_ids)]
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('''UPDATE welcome_messages SET sent_at = NOW()
+                       WHERE user_id = ANY(%s) AND sent_at IS NULL''', (user_ids,))
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        # Вернём id в начало буфера - иначе после рестарта приветствие уйдёт повторно
+        _welcome_sent_buffer[:0] = user_ids
+        logging.error(f"Error flushing {len(user_ids)} welcome marks: {e}")
+        raise
+
+async def flush_welcome_marks_job():
+    flush_welcome_marks()
+
+def recover_welcome_timers():
+    """После старта восстанавливаем таймеры приветствий, которые не успели отправить"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('''SELECT user_id, due_at, tenant_id FROM welcome_messages
+                   WHERE sent_at IS NULL AND due_at > %s
+                   ORDER BY due_at''', (datetime.now() - WELCOME_RECOVERY_WINDOW,))
+    pending = cur.fetchall()
+    cur.close()
+    conn.close()
+    
+    now = datetime.now()
+    for index, row in enumerate(pending):
+        # Просроченные рассылаем не разом, а с небольшим шагом
+        delay = max((row['due_at'] - now).total_seconds(), index * 0.1)
+        tenant = tenant_of(row)
+        if tenant:
+            _start_welcome_timer(row['user_id'], delay, tenant)
+    
+    if pending:
+        logging.info(f"Recovered {len(pending)} welcome timers")
+
+# Напоминаем о счетах старше часа. Верхняя граница широкая: если проход пропущен
+# (рестарт, ошибка), платёж всё равно получит напоминание позже, а не выпадет из окна
+PENDING_REMINDER_MIN_AGE = timedelta(hours=1)
+PENDING_REMINDER_MAX_AGE = timedelta(hours=24)
+# Сколько платежей берём за раз и на сколько "арендуем" их на время отправки
+PENDING_REMINDER_BATCH = 200
+PENDING_REMINDER_LEASE = timedelta(minutes=10)
+
+PENDING_REMINDER_TEXT = (
+    "👋 Заметил что оплата не прошла\n\n"
+    "Возможно возникли сложности?\n\n"
+    "💡 **Частые проблемы:**\n"
+    "• Не хватает денег на карте\n"
+    "• Карта заблокирована для онлайн-покупок\n"
+    "• Не пришёл SMS с кодом\n"
+    "• Ошибка банка\n\n"
+    "Могу помочь разобраться! 😊\n\n"
+    "Или попробуй оплатить снова - "
+    "иногда помогает:"
+)
+
+def claim_pending_reminders():
+    """Забираем пачку платежей под напоминание: аренда защищает от двойной отправки
+    параллельным проходом, а после падения процесса аренда истекает и платёж вернётся"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    now = datetime.now()
+
+    cur.execute(f'''
+        UPDATE payments SET reminder_lease_until = %(lease_until)s
+        WHERE payment_id IN (
+            SELECT p.payment_id
+            FROM payments p
+            WHERE p.status = 'pending'
+              AND p.reminded_at IS NULL
+              AND p.created_at < %(min_created)s
+              AND p.created_at > %(max_created)s
+              AND (p.reminder_lease_until IS NULL OR p.reminder_lease_until < %(now)s)
+              AND {delivery.not_suppressed('p.user_id')}
+              AND NOT EXISTS (
+                  SELECT 1 FROM funnel_progress fp
+                  WHERE fp.user_id = p.user_id
+                    AND fp.sent_mask & %(reminder_bit)s <> 0
+                    AND fp.stage_times[%(reminder_index)s] > %(now)s - INTERVAL '24 hours'
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM payments paid
+                  WHERE paid.user_id = p.user_id
+                    AND paid.status = 'completed'
+                    AND paid.created_at > p.created_at
+              )
+            ORDER BY p.created_at
+            LIMIT %(batch)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING payment_id, user_id, tariff, amount, created_at, tenant_id
+    ''', {'lease_until': now + PENDING_REMINDER_LEASE,
+          'min_created': now - PENDING_REMINDER_MIN_AGE,
+          'max_created': now - PENDING_REMINDER_MAX_AGE,
+          'now': now,
+          'reminder_bit': 1 << FUNNEL_STAGE_BITS['pending_reminder'],
+          'reminder_index': FUNNEL_STAGE_BITS['pending_reminder'] + 1,
+          'batch': PENDING_REMINDER_BATCH})
+
+    claimed = cur.fetchall()
+    conn.commit()
+    cur.close()
+    conn.close()
+    return claimed
+
+def finish_pending_reminders(sent_payments):
+    """Одной транзакцией: отметки в воронке и закрытие платежей, по которым напомнили.
+    Платежи с неудачной отправкой остаются в аренде и вернутся, когда она истечёт"""
+    if not sent_payments:
+        return
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    mark_funnel_stage_sent(cur, sorted({payment['user_id'] for payment in sent_payments}),
+                           'pending_reminder')
+    cur.execute('''UPDATE payments SET reminded_at = %s, reminder_lease_until = NULL
+                   WHERE payment_id = ANY(%s)''',
+                (datetime.now(), [payment['payment_id'] for payment in sent_payments]))
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+async def send_pending_reminder(user_id, tariff, enqueued_at=None, tenant=None):
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💳 Попробовать снова", callback_data=tariff)],
+        [InlineKeyboardButton(text="❓ Проблемы с оплатой?", url="https://t.me/razvitie_dety")]
+    ])
+    return await send_safe_funnel_message(user_id, PENDING_REMINDER_TEXT, reply_markup=keyboard,
+                                          kind='pending_reminder', enqueued_at=enqueued_at, tenant=tenant)
+
+async def remind_pending_payments_pass():
+    """Один проход напоминаний о неоплаченных инвойсах"""
+    while True:
+        claimed = claim_pending_reminders()
+        if not claimed:
+            return
+        claimed_at = datetime.now()
+
+        # У пользователя может быть несколько неоплаченных счетов - напоминаем один раз
+        # (с тарифом и клубом последнего), а закрываем все
+        by_user = {}
+        for payment in claimed:
+            by_user.setdefault(payment['user_id'], []).append(payment)
+        latest = {user_id: max(payments, key=lambda p: p['created_at']) for user_id, payments in by_user.items()}
+
+        users = [user_id for user_id in by_user if tenant_of(latest[user_id])]
+        results = await asyncio.gather(
+            *(send_pending_reminder(user_id, latest[user_id]['tariff'], claimed_at,
+                                    tenants.get(latest[user_id]['tenant_id']))
+              for user_id in users),
+            return_exceptions=True
+        )
+
+        sent_payments = []
+        for user_id, result in zip(users, results):
+            if result is True:
+                sent_payments.extend(by_user[user_id])
+            elif isinstance(result, Exception):
+                logging.error(f"Error sending pending reminder to {user_id}: {result}")
+
+        finish_pending_reminders(sent_payments)
+        logging.info(f"Pending reminders: {len(sent_payments)} payments of {len(claimed)} claimed")
+
+        if len(claimed) < PENDING_REMINDER_BATCH:
+            return
+
+async def analytics_partitions_pass():
+    """Секции funnel_events на месяцы вперёд и удаление старых по ANALYTICS_RETENTION_MONTHS"""
+    await asyncio.to_thread(analytics.maintain_partitions, get_db_connection)
+
+async def stats_counters_pass():
+    """Дописать счётчики приблизительной статистики (события, отзывы) от водяного знака"""
+    await asyncio.to_thread(approx_stats.refresh_counters, get_db_connection)
+
+async def undeliverable_reload_pass():
+    """Перечитать список недоставляемых: его пополняют и другие экземпляры бота"""
+    count = await asyncio.to_thread(delivery.load_suppressed, get_db_connection)
+    logging.info(f"Undeliverable users loaded: {count}")
+
+async def delivery_ledger_pass():
+    """Дописать накопленные строки журнала доставки"""
+    count = await asyncio.to_thread(delivery.flush_ledger, get_db_connection)
+    if count:
+        logging.debug(f"Delivery ledger: {count} rows written")
+
+def flush_delivery_ledger():
+    """Остаток журнала доставки при остановке"""
+    delivery.flush_ledger(get_db_connection)
+
+async def delivery_ledger_prune_pass():
+    """Удалить строки журнала доставки старше DELIVERY_LEDGER_DAYS"""
+    deleted = await asyncio.to_thread(delivery.prune_ledger, get_db_connection)
+    logging.info(f"Delivery ledger: {deleted} old rows deleted")
+
+async def invite_pool_pass():
+    """Отозвать устаревшие невыданные инвайт-ссылки и долить пул каждого клуба до INVITE_POOL_SIZE"""
+    for tenant in tenants.all_tenants():
+        if tenant.channel_id:
+            await invite_pool.maintain(tenant.bot, get_db_connection, tenant.channel_id)
+
+# ========================================
+# РАСПИСАНИЕ ФОНОВЫХ ЗАДАЧ
+# ========================================
+
+# Проверка истекших подписок - сразу после старта, затем раз в час
+supervisor.add(Job('check_and_remove_expired', check_and_remove_expired_pass,
+                   interval=3600, initial_delay=0, max_runtime=1800))
+# Воронка продаж - каждые 30 минут
+supervisor.add(Job('sales_funnel', sales_funnel_pass, interval=1800, max_runtime=1500))
+# Отметки об отправленных приветствиях - пачкой раз в 10 секунд
+supervisor.add(Job('flush_welcome_marks', flush_welcome_marks_job,
+                   interval=10, jitter=0.2, max_runtime=30))
+# Напоминания о неоплаченных счетах - каждые 5 минут
+supervisor.add(Job('remind_pending_payments', remind_pending_payments_pass,
+                   interval=300, max_runtime=240))
+# Секции аналитики: создание на месяцы вперёд и удаление старых - раз в сутки
+# (первый проход сразу после старта: init_db при актуальной схеме секции не трогает)
+supervisor.add(Job('analytics_partitions', analytics_partitions_pass,
+                   interval=86400, initial_delay=0, max_runtime=600))
+# Счётчики для /alltime ~ и /feedback_stats ~ - каждые 5 минут (первый проход догоняет историю)
+supervisor.add(Job('stats_counters', stats_counters_pass, interval=300, max_runtime=3600))
+# Пул инвайт-ссылок - сразу после старта, затем каждую минуту
+supervisor.add(Job('invite_pool', invite_pool_pass, interval=60, initial_delay=0, max_runtime=300))
+# Список недоставляемых в памяти - сразу после старта, затем раз в 10 минут
+supervisor.add(Job('undeliverable_reload', undeliverable_reload_pass,
+                   interval=600, initial_delay=0, max_runtime=120))
+# Журнал доставки - пачкой раз в 10 секунд, старые строки удаляются раз в сутки
+supervisor.add(Job('delivery_ledger', delivery_ledger_pass, interval=10, jitter=0.2, max_runtime=60))
+supervisor.add(Job('delivery_ledger_prune', delivery_ledger_prune_pass, interval=86400, max_runtime=600))
@@ -0,0 +1,46 @@
+"""
+Инлайн-клавиатуры главного меню и тарифов
+"""
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from config import TARIFFS
+
+# ========================================
+# КЛАВИАТУРЫ
+# ========================================
+
+def get_main_menu():
+    """Главное меню для СУЩЕСТВУЮЩИХ пользователей"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💳 Выбрать подписку", callback_data="show_tariffs")],
+        [InlineKeyboardButton(text="ℹ️ Мой статус", callback_data="status")],
+        [InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq")]
+    ])
+    return keyboard
+
+def get_new_user_menu():
+    """🆕 Меню для НОВЫХ пользователей (с прогревом)"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⭐ 4.9/5 - Почему 87% продлевают?", callback_data="show_reviews")],
+        [InlineKeyboardButton(text="🎥 Посмотреть примеры материалов", callback_data="show_demo")],
+        [InlineKeyboardButton(text="💰 Что входит в подписку?", callback_data="faq_5")],
+        [InlineKeyboardButton(text="🎁 Попробовать 7 дней БЕСПЛАТНО", callback_data="ready_for_trial")]
+    ])
+    return keyboard
+
+def get_tariffs_menu():
+    """Меню выбора тарифов"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=f"💎 1 месяц - {TARIFFS['1month']['price']}₽",
+            callback_data="1month"
+        )],
+        [InlineKeyboardButton(
+            text=f"🔥 НАВСЕГДА - {TARIFFS['forever']['price']}₽ (Экономия 1789₽!)",
+            callback_data="forever"
+        )],
+        [InlineKeyboardButton(text="❓ Вопросы", callback_data="faq")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="back")]
+    ])
+    return keyboard
@@ -0,0 +1,142 @@
+"""
+Жизненный цикл процесса бота
+Регистрирует фоновые задачи и хендлеры в работе, по SIGTERM/SIGINT
+останавливает polling, даёт работе завершиться в пределах дедлайна,
+сбрасывает буферизованные записи и закрывает ресурсы
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import signal
+import time
+
+# Платформа обычно ждёт ~30 секунд между SIGTERM и SIGKILL
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 25))
+
+class Lifecycle:
+    """Реестр фоновых задач, хендлеров в работе и хуков остановки"""
+
+    def __init__(self, shutdown_timeout=SHUTDOWN_TIMEOUT):
+        self.shutdown_timeout = shutdown_timeout
+        self.stopping = asyncio.Event()
+        self._force = asyncio.Event()
+        self._tasks = set()
+        self._inflight = set()
+        self._flush_callbacks = []
+        self._close_callbacks = []
+        self._dp = None
+
+    # ============================================
+    # РЕГИСТРАЦИЯ
+    # ============================================
+
+    def create_task(self, coro, name=None):
+        """Запуск фоновой задачи, которую дождутся (или отменят) при остановке"""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error(f"Background task {task.get_name()} crashed: {task.exception()}")
+
+    def on_flush(self, callback):
+        """Сброс буферов (sync или async) - выполняется после остановки задач"""
+        self._flush_callbacks.append(callback)
+        return callback
+
+    def on_close(self, callback):
+        """Закрытие ресурсов (сессии, пулы) - выполняется последним"""
+        self._close_callbacks.append(callback)
+        return callback
+
+    async def sleep(self, seconds):
+        """Пауза, которая прерывается остановкой. Возвращает True, если пора выходить"""
+        try:
+            await asyncio.wait_for(self.stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self.stopping.is_set()
+
+    async def inflight_middleware(self, handler, event, data):
+        """Outer-middleware апдейтов: учитывает хендлеры, которые ещё работают"""
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        try:
+            return await handler(event, data)
+        finally:
+            self._inflight.discard(task)
+
+    def setup(self, dp):
+        """Подключение к диспетчеру и обработка сигналов платформы"""
+        self._dp = dp
+        dp.update.outer_middleware(self.inflight_middleware)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_shutdown, sig)
+            except NotImplementedError:
+                pass
+
+    # ============================================
+    # ОСТАНОВКА
+    # ============================================
+
+    def request_shutdown(self, sig=None):
+        """Начать остановку; повторный сигнал - не ждать дедлайна"""
+        if self.stopping.is_set():
+            logging.warning("Second shutdown signal, cancelling remaining work")
+            self._force.set()
+            return
+        logging.warning(f"Shutdown requested ({sig.name if sig else 'manual'})")
+        self.stopping.set()
+        if self._dp is not None:
+            asyncio.create_task(self._stop_polling())
+
+    async def _stop_polling(self):
+        try:
+            await self._dp.stop_polling()
+        except RuntimeError:
+            # polling сейчас не запущен (например, между перезапусками)
+            pass
+
+    async def _drain(self, deadline):
+        current = asyncio.current_task()
+        while True:
+            pending = {task for task in self._tasks | self._inflight if task is not current and not task.done()}
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0 or self._force.is_set():
+                return pending
+            force_wait = asyncio.create_task(self._force.wait())
+            await asyncio.wait(pending | {force_wait}, timeout=remaining,
+                               return_when=asyncio.FIRST_COMPLETED)
+            force_wait.cancel()
+
+    async def shutdown(self):
+        """Дождаться работы в пределах дедлайна, сбросить буферы и закрыть ресурсы"""
+        self.stopping.set()
+        started = time.monotonic()
+        logging.info(f"Draining {len(self._inflight)} handlers and {len(self._tasks)} background tasks "
+                     f"(deadline {self.shutdown_timeout:.0f}s)")
+
+        pending = await self._drain(started + self.shutdown_timeout)
+        if pending:
+            logging.warning(f"Cancelling {len(pending)} unfinished tasks: "
+                            f"{', '.join(sorted(task.get_name() for task in pending))}")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for callback in self._flush_callbacks + self._close_callbacks:
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Error in shutdown hook {getattr(callback, '__name__', callback)}: {e}")
+
+        logging.info(f"Shutdown complete in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,36 @@
+"""
+Общие объекты процесса: боты клубов, диспетчер, жизненный цикл и планировщик задач
+"""
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import db_profiler
+import tenants
+from api_session import TunedSession
+from lifecycle import Lifecycle
+from scheduler import Supervisor
+from throttle import callback_throttle
+
+# По боту на клуб (tenants) с одним пулом соединений с Bot API: таймауты и повторы - в TunedSession
+session = TunedSession()
+for tenant in tenants.all_tenants():
+    tenants.bind(tenant, Bot(token=tenant.bot_token, session=session))
+bots = [tenant.bot for tenant in tenants.all_tenants()]
+# Бот клуба по умолчанию
+bot = tenants.get(tenants.DEFAULT_TENANT).bot
+storage = MemoryStorage()
+dp = Dispatcher(storage=storage)
+
+# Фоновые задачи, хендлеры в работе и корректная остановка по SIGTERM
+lifecycle = Lifecycle()
+supervisor = Supervisor(lifecycle)
+
+# Клуб апдейта - по боту, который его получил
+tenants.setup(dp)
+
+# Профилирование SQL: имя хендлера для каждого запроса
+db_profiler.setup_middleware(dp)
+
+# Повторные нажатия кнопок отсекаются до поиска хендлера
+callback_throttle.setup(dp)
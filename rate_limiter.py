@@ -0,0 +1,63 @@
+"""
+Ограничение скорости отправки сообщений
+Token bucket для воронки, напоминаний и рассылок: Telegram допускает около
+30 сообщений в секунду на бота, поэтому циклы не делают sleep между отправками
+сами, а берут токен здесь и могут отправлять параллельно.
+
+Лимиты и flood control у Telegram - на токен бота, поэтому у каждого бота
+(клуба, см. tenants) свой bucket: RetryAfter одного бота останавливает только
+его отправки, и каждый бот получает весь бюджет SEND_RATE
+"""
+
+import asyncio
+import os
+import time
+
+# Сообщений в секунду и сколько можно отправить сразу после простоя
+SEND_RATE = float(os.getenv('SEND_RATE', 25))
+SEND_BURST = int(os.getenv('SEND_BURST', 5))
+
+class TokenBucket:
+    """Token bucket: ожидающие обслуживаются по очереди, пауза останавливает всех"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Дождаться разрешения на одну отправку"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Остановить все отправки этого лимита (например, после flood control от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+# bot.id -> лимит этого бота
+_limiters = {}
+
+def send_limiter(bot):
+    """Лимит отправок бота; создаётся при первом обращении"""
+    limiter = _limiters.get(bot.id)
+    if limiter is None:
+        limiter = _limiters[bot.id] = TokenBucket(SEND_RATE, SEND_BURST)
+    return limiter
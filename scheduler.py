@@ -0,0 +1,162 @@
+"""
+Супервизор фоновых задач
+Каждая задача объявляется с интервалом, джиттером, лимитом времени выполнения,
+политикой перекрытия и back-off после ошибок. Запуски разнесены по времени,
+история выполнения хранится в памяти, админ может запустить задачу вручную
+"""
+
+import asyncio
+import html
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime
+
+import db_profiler
+
+# Что делать с ручным запуском, пока задача уже выполняется
+OVERLAP_SKIP = 'skip'      # проигнорировать
+OVERLAP_QUEUE = 'queue'    # выполнить ещё раз сразу после текущего прохода
+
+class Job:
+    """Описание периодической задачи"""
+
+    def __init__(self, name, func, interval, jitter=0.1, max_runtime=None,
+                 overlap=OVERLAP_SKIP, backoff_base=30, initial_delay=None, history_size=20):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.max_runtime = max_runtime
+        self.overlap = overlap
+        self.backoff_base = backoff_base
+        # По умолчанию первый запуск через интервал (как было с sleep в начале цикла),
+        # но со случайным сдвигом, чтобы задачи не стартовали одновременно
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self.history = deque(maxlen=history_size)
+        self.running = False
+        self.failures = 0
+        self.runs = 0
+        self.next_run_at = None
+        self._wakeup = asyncio.Event()
+
+    def next_delay(self):
+        """Интервал ± джиттер, а после ошибок - растущий back-off (но не больше интервала)"""
+        if self.failures:
+            base = min(self.interval, self.backoff_base * 2 ** (self.failures - 1))
+        else:
+            base = self.interval
+        return max(0.0, base + random.uniform(-self.jitter, self.jitter) * base)
+
+class Supervisor:
+    """Запускает задачи, следит за ошибками и таймаутами, хранит историю запусков"""
+
+    def __init__(self, lifecycle):
+        self.lifecycle = lifecycle
+        self.jobs = {}
+
+    def add(self, job):
+        self.jobs[job.name] = job
+        return job
+
+    def start(self):
+        for job in self.jobs.values():
+            self.lifecycle.create_task(self._runner(job), name=f"job:{job.name}")
+            logging.info(f"Job {job.name} scheduled every {job.interval}s "
+                         f"(±{int(job.jitter * 100)}%, max {job.max_runtime}s)")
+
+    # ============================================
+    # ВЫПОЛНЕНИЕ
+    # ============================================
+
+    async def _wait(self, job, delay):
+        """Ждём следующего запуска, ручного триггера или остановки"""
+        job.next_run_at = time.time() + delay
+        waiters = [asyncio.create_task(self.lifecycle.stopping.wait()),
+                   asyncio.create_task(job._wakeup.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        manual = job._wakeup.is_set()
+        job._wakeup.clear()
+        return manual
+
+    async def _runner(self, job):
+        delay = job.initial_delay + random.uniform(0, job.jitter * max(job.interval, 1))
+        while not self.lifecycle.stopping.is_set():
+            manual = await self._wait(job, delay)
+            if self.lifecycle.stopping.is_set():
+                return
+            await self._run(job, 'manual' if manual else 'schedule')
+            delay = 0 if job._wakeup.is_set() else job.next_delay()
+
+    async def _run(self, job, trigger):
+        job.running = True
+        job.next_run_at = None
+        started_at = datetime.now()
+        started = time.perf_counter()
+        try:
+            with db_profiler.profile_scope(job.name):
+                if job.max_runtime:
+                    await asyncio.wait_for(job.func(), job.max_runtime)
+                else:
+                    await job.func()
+            outcome = 'ok'
+            job.failures = 0
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            job.failures += 1
+            logging.error(f"Job {job.name} exceeded {job.max_runtime}s and was cancelled")
+        except Exception as e:
+            outcome = f'error: {e}'
+            job.failures += 1
+            logging.error(f"Error in job {job.name}: {e}")
+        finally:
+            job.running = False
+        duration = time.perf_counter() - started
+        job.runs += 1
+        job.history.append({'started_at': started_at, 'duration': duration,
+                            'outcome': outcome, 'trigger': trigger})
+        if duration > 1:
+            logging.info(f"Job {job.name} finished in {duration:.1f}s: {outcome}")
+
+    # ============================================
+    # УПРАВЛЕНИЕ
+    # ============================================
+
+    def trigger(self, name):
+        """Ручной запуск. Возвращает текст для ответа админу"""
+        job = self.jobs.get(name)
+        if not job:
+            return f"❌ Нет задачи {name}. Доступны: {', '.join(self.jobs)}"
+        if job.running and job.overlap == OVERLAP_SKIP:
+            return f"⏳ {name} уже выполняется, запуск пропущен"
+        job._wakeup.set()
+        if job.running:
+            return f"🔁 {name} выполняется, повторный запуск поставлен в очередь"
+        return f"▶️ {name} запущена"
+
+    def format_status(self):
+        """Состояние задач и последние запуски"""
+        text = "⚙️ <b>Фоновые задачи</b>\n\n"
+        for job in self.jobs.values():
+            if job.running:
+                state = "▶️ выполняется"
+            elif job.next_run_at:
+                state = f"⏰ через {max(0, int(job.next_run_at - time.time()))}с"
+            else:
+                state = "—"
+            text += f"<b>{job.name}</b> ({state})\n"
+            text += f"  каждые {job.interval}с, запусков: {job.runs}, ошибок подряд: {job.failures}\n"
+            if job.history:
+                durations = [run['duration'] for run in job.history]
+                last = job.history[-1]
+                text += (f"  последний: {last['started_at'].strftime('%H:%M:%S')} "
+                         f"{last['duration']:.1f}с {html.escape(last['outcome'][:60])}\n"
+                         f"  среднее {sum(durations) / len(durations):.1f}с, "
+                         f"макс {max(durations):.1f}с\n")
+            text += "\n"
+        return text
@@ -0,0 +1,114 @@
+"""
+Профиль запуска бота
+Время от старта процесса до импортов, проверки схемы БД, начала polling
+и первого обработанного апдейта (после старта и после каждого перезапуска polling).
+Импортируется первым в bot.py, чтобы время импортов тоже попало в отчёт
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+# Апдейт, пришедший раньше готовности схемы, ждёт её не дольше этого
+READY_TIMEOUT = float(os.getenv('STARTUP_READY_TIMEOUT', 60))
+
+def _process_age():
+    """Сколько секунд назад запущен процесс (Linux, /proc), иначе 0"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+class StartupProfile:
+    """Отметки фаз запуска и время до первого ответа"""
+
+    def __init__(self):
+        self._started = time.monotonic() - _process_age()
+        self._last = self._started
+        self.phases = []
+        self.ready = asyncio.Event()
+        self.polling_started_at = None
+        self.polling_starts = 0
+        self.ready_to_reply = None
+        self.first_update = None
+        self.last_restart_reply = None
+        self._waiting_first = False
+
+    def mark(self, phase):
+        """Закончилась фаза phase: записываем её длительность"""
+        now = time.monotonic()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+        logging.info(f"Startup: {phase} {(now - self._started) * 1000:.0f} ms from process start")
+
+    def set_ready(self):
+        """Схема БД проверена - хендлеры могут работать"""
+        self.ready.set()
+        self.mark('schema')
+        self._check_ready_to_reply()
+
+    def _check_ready_to_reply(self):
+        """Готов отвечать = polling запущен и схема готова"""
+        if self.ready_to_reply is None and self.ready.is_set() and self.polling_starts:
+            self.ready_to_reply = time.monotonic() - self._started
+            logging.info(f"Startup: ready to reply {self.ready_to_reply * 1000:.0f} ms from process start")
+
+    async def on_polling_start(self):
+        """dp.startup: вызывается при каждом запуске polling, в том числе после падения"""
+        self.polling_starts += 1
+        self.polling_started_at = time.monotonic()
+        self._waiting_first = True
+        if self.polling_starts == 1:
+            self.mark('polling')
+            self._check_ready_to_reply()
+
+    async def middleware(self, handler, event, data):
+        """Outer-middleware апдейтов: ждёт схему БД и замеряет первый обработанный апдейт"""
+        received = time.monotonic()
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), READY_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.warning("Startup: schema is not ready, handling update anyway")
+        try:
+            return await handler(event, data)
+        finally:
+            if self._waiting_first:
+                self._waiting_first = False
+                now = time.monotonic()
+                self.last_restart_reply = now - self.polling_started_at
+                if self.first_update is None:
+                    # (через сколько после старта процесса, сколько занял сам апдейт)
+                    self.first_update = (now - self._started, now - received)
+                    logging.info(f"Startup: first update handled in {(now - received) * 1000:.0f} ms, "
+                                 f"{self.first_update[0]:.1f} s from process start")
+
+    def setup(self, dp):
+        dp.update.outer_middleware(self.middleware)
+        dp.startup.register(self.on_polling_start)
+
+    def format_report(self):
+        lines = ["🚀 <b>Запуск бота</b>", ""]
+        for phase, seconds in self.phases:
+            lines.append(f"• {phase}: {seconds * 1000:.0f} мс")
+        if self.ready_to_reply is not None:
+            lines.append(f"\n⏱ Готов отвечать через {self.ready_to_reply * 1000:.0f} мс от старта процесса")
+        if self.first_update is not None:
+            lines.append(f"📨 Первый апдейт: через {self.first_update[0]:.1f} с, "
+                         f"обработан за {self.first_update[1] * 1000:.0f} мс")
+        else:
+            lines.append("📨 Апдейтов после запуска ещё не было")
+        if self.polling_starts > 1:
+            lines.append(f"🔁 Перезапусков polling: {self.polling_starts - 1}")
+            if self.last_restart_reply is not None:
+                lines.append(f"   первый апдейт после последнего перезапуска: через "
+                             f"{self.last_restart_reply * 1000:.0f} мс")
+        return "\n".join(lines)
+
+# Один профиль на процесс
+boot = StartupProfile()
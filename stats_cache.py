@@ -0,0 +1,65 @@
+"""
+Кэш админских отчётов
+Каждый отчёт (/stats, /alltime, /checkdb, /feedback_stats) считается не чаще
+раза в STATS_CACHE_TTL секунд. Одновременные запросы одного отчёта ждут одно
+общее вычисление, а сами запросы к базе выполняются в отдельном потоке.
+Ключ отчёта начинается с tenant_id клуба ('<tenant_id>:stats') - у каждого
+клуба (tenants) свои цифры
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 60))
+
+class StatsCache:
+    """Отчёты по ключу: значение, момент вычисления и общее вычисление в процессе"""
+
+    def __init__(self, ttl=STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._inflight = {}
+
+    async def get(self, key, compute):
+        """(значение, возраст в секундах). compute - синхронная функция без аргументов"""
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0], time.monotonic() - entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            # Отдельная задача: если первый запросивший отменится, остальные всё равно дождутся
+            task = asyncio.create_task(self._compute(key, compute), name=f"stats:{key}")
+            self._inflight[key] = task
+        value, computed = await asyncio.shield(task)
+        return value, time.monotonic() - computed
+
+    async def _compute(self, key, compute):
+        try:
+            value = await asyncio.to_thread(compute)
+            self._entries[key] = (value, time.monotonic())
+            return self._entries[key]
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, key=None, prefix=None):
+        """Сбросить отчёт key, все отчёты с префиксом prefix (например, клуба) или весь кэш"""
+        if key is not None:
+            self._entries.pop(key, None)
+        elif prefix is not None:
+            for stale in [entry for entry in self._entries if entry.startswith(prefix)]:
+                del self._entries[stale]
+        else:
+            self._entries.clear()
+
+def age_footer(age):
+    """Подпись о свежести данных"""
+    computed_at = datetime.fromtimestamp(time.time() - age)
+    if age < 1:
+        return f"\n🕐 Данные на {computed_at:%H:%M:%S} (только что)"
+    return f"\n🕐 Данные на {computed_at:%H:%M:%S} ({int(age)} с назад)"
+
+# Один кэш на процесс
+stats_cache = StatsCache()
@@ -0,0 +1,103 @@
+"""
+Клубы (тенанты) одного процесса
+У каждого клуба свой бот, закрытая группа, администраторы и токен платёжного
+провайдера. Клуб по умолчанию ('default') собирается из прежних переменных
+окружения (BOT_TOKEN, CHANNEL_ID, ADMIN_IDS, YOOKASSA_PROVIDER_TOKEN),
+остальные задаются JSON-списком в TENANTS:
+
+    TENANTS='[{"id": "club2", "bot_token": "...", "channel_id": "-100...",
+               "admin_ids": [1, 2], "provider_token": "..."}]'
+
+Все клубы обслуживает один процесс: общие база, HTTP-сессия Bot API
+(api_session), диспетчер и фоновые задачи; лимит отправок у каждого бота свой
+(rate_limiter - flood control Telegram считается на токен). Клуб апдейта
+определяется по боту, который его получил (middleware), и доступен хендлерам
+через current(); фоновые задачи берут клуб из tenant_id строки в базе (get).
+
+Пользователь принадлежит одному клубу - тому, чей бот он запустил первым:
+users.user_id остаётся первичным ключом
+"""
+
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+
+from config import ADMIN_IDS, BOT_TOKEN, CHANNEL_ID, YOOKASSA_PROVIDER_TOKEN
+
+DEFAULT_TENANT = 'default'
+
+class Tenant:
+    """Настройки одного клуба; бота назначает loader (bind)"""
+
+    def __init__(self, tenant_id, bot_token, channel_id, admin_ids, provider_token):
+        self.tenant_id = tenant_id
+        self.bot_token = bot_token
+        self.channel_id = channel_id
+        self.admin_ids = frozenset(admin_ids)
+        self.provider_token = provider_token
+        self.bot = None
+
+    def __repr__(self):
+        return f"Tenant({self.tenant_id!r})"
+
+def load_tenants(raw=None):
+    """{tenant_id: Tenant}: клуб по умолчанию и клубы из JSON raw"""
+    tenants = {DEFAULT_TENANT: Tenant(DEFAULT_TENANT, BOT_TOKEN, CHANNEL_ID, ADMIN_IDS,
+                                      YOOKASSA_PROVIDER_TOKEN)}
+    for item in json.loads(raw or '[]'):
+        tenant_id = str(item['id'])
+        if tenant_id in tenants:
+            raise ValueError(f"Duplicate tenant id: {tenant_id}")
+        if any(tenant.bot_token == item['bot_token'] for tenant in tenants.values()):
+            raise ValueError(f"Tenant {tenant_id} reuses another tenant's bot token")
+        tenants[tenant_id] = Tenant(
+            tenant_id,
+            item['bot_token'],
+            str(item['channel_id']),
+            {int(admin_id) for admin_id in item.get('admin_ids', ())},
+            item.get('provider_token', YOOKASSA_PROVIDER_TOKEN),
+        )
+    return tenants
+
+registry = load_tenants(os.getenv('TENANTS'))
+_by_bot_id = {}
+_current = contextvars.ContextVar('tenant', default=registry[DEFAULT_TENANT])
+
+def current():
+    """Клуб текущего апдейта (или задачи внутри use)"""
+    return _current.get()
+
+def get(tenant_id):
+    """Клуб по tenant_id из базы; None, если его убрали из настроек"""
+    return registry.get(tenant_id)
+
+def all_tenants():
+    return list(registry.values())
+
+def for_bot(bot):
+    """Клуб бота; неизвестный бот - клуб по умолчанию"""
+    return _by_bot_id.get(bot.id, registry[DEFAULT_TENANT])
+
+def bind(tenant, bot):
+    tenant.bot = bot
+    _by_bot_id[bot.id] = tenant
+
+@contextmanager
+def use(tenant):
+    """Выполнить блок от имени клуба (фоновые задачи)"""
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+async def middleware(handler, event, data):
+    """Outer-middleware апдейтов: клуб по боту, получившему апдейт"""
+    tenant = for_bot(data['bot'])
+    data['tenant'] = tenant
+    with use(tenant):
+        return await handler(event, data)
+
+def setup(dp):
+    dp.update.outer_middleware(middleware)
@@ -0,0 +1,72 @@
+"""
+Общие настройки тестов: корень репозитория в sys.path, фиктивный токен бота
+(loader создаёт Bot при импорте) и соединение-заглушка для кода, который
+получает get_db_connection аргументом. Postgres и Bot API не нужны
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('BOT_TOKEN', '123456:TEST')
+
+import pytest
+
+class FakeCursor:
+    """Курсор: запоминает запросы, отдаёт заготовленные строки (словари, как RealDictCursor)"""
+
+    def __init__(self, db):
+        self.db = db
+        self.connection = db
+        self.rowcount = 0
+
+    def execute(self, query, vars=None):
+        if self.db.fail_execute:
+            raise self.db.fail_execute
+        self.db.queries.append((query, vars))
+
+    def mogrify(self, query, vars=None):
+        return repr(vars).encode()
+
+    def fetchone(self):
+        return self.db.rows.pop(0) if self.db.rows else None
+
+    def fetchall(self):
+        rows, self.db.rows = self.db.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+class FakeDB:
+    """Соединение и get_db_connection сразу. fail - ошибка при подключении,
+    fail_execute - при выполнении запроса"""
+
+    encoding = 'UTF8'
+
+    def __init__(self):
+        self.queries = []
+        self.rows = []
+        self.commits = 0
+        self.fail = None
+        self.fail_execute = None
+
+    def __call__(self):
+        if self.fail:
+            raise self.fail
+        return self
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def fake_db():
+    return FakeDB()
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import (TelegramEntityTooLarge, TelegramNetworkError, TelegramRetryAfter,
+                                TelegramServerError)
+from aiogram.methods import GetMe, SendMessage
+
+import api_session
+import rate_limiter
+
+def _server_error(method):
+    return TelegramServerError(method=method, message='Bad Gateway')
+
+@pytest.mark.parametrize('name, retry', [
+    ('getChatMember', True),
+    ('answerCallbackQuery', True),
+    ('sendMessage', False),
+    ('copyMessage', False),
+    ('createChatInviteLink', False),
+    ('approveChatJoinRequest', False),
+])
+def test_network_errors_retry_only_safe_methods(name, retry):
+    assert api_session.retryable(name, TelegramNetworkError(method=GetMe(), message='timeout')) is retry
+
+def test_server_error_retries_any_method_except_sends():
+    assert api_session.retryable('approveChatJoinRequest', _server_error(GetMe()))
+    assert not api_session.retryable('sendMessage', _server_error(GetMe()))
+
+def test_too_large_file_is_not_retried():
+    assert not api_session.retryable('getFile', TelegramEntityTooLarge(method=GetMe(), message='too large'))
+
+def test_quantile_is_bucket_upper_bound():
+    stats = api_session.MethodStats()
+    for ms in (10, 20, 30, 300, 100000):
+        stats.observe(ms)
+    assert stats.quantile(0.5) == 50
+    assert stats.quantile(0.95) is None
+
+def _session(monkeypatch, errors):
+    calls = []
+
+    async def make_request(self, bot, method, timeout=None):
+        calls.append(method)
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    monkeypatch.setattr(AiohttpSession, 'make_request', make_request)
+    monkeypatch.setattr(api_session, 'RETRY_BASE', 0)
+    return api_session.TunedSession(), calls
+
+def test_get_method_is_retried_after_server_error(monkeypatch):
+    session, calls = _session(monkeypatch, [_server_error(GetMe()), _server_error(GetMe())])
+    assert asyncio.run(session.make_request(None, GetMe())) == 'ok'
+    assert len(calls) == 3
+    assert session.stats['getMe'].retries == 2
+
+def test_send_is_not_retried_after_server_error(monkeypatch):
+    method = SendMessage(chat_id=1, text='hi')
+    session, calls = _session(monkeypatch, [_server_error(method)])
+    with pytest.raises(TelegramServerError):
+        asyncio.run(session.make_request(None, method))
+    assert len(calls) == 1
+    assert session.stats['sendMessage'].errors == 1
+
+def test_flood_control_pauses_only_that_bots_limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    method = SendMessage(chat_id=1, text='hi')
+    error = TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=60)
+    session, calls = _session(monkeypatch, [error])
+    flooded, other = SimpleNamespace(id=1), SimpleNamespace(id=2)
+    with pytest.raises(TelegramRetryAfter):
+        asyncio.run(session.make_request(flooded, method))
+    assert rate_limiter.send_limiter(flooded)._paused_until > time.monotonic() + 50
+    assert rate_limiter.send_limiter(other)._paused_until == 0
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import Router
+
+from callback_index import CallbackIndex
+
+def _index():
+    index = CallbackIndex(Router())
+
+    @index.exact('menu')
+    async def menu(callback):
+        return 'menu'
+
+    @index.exact(['pay_1month', 'pay_3months'])
+    async def pay_known(callback):
+        return 'pay_known'
+
+    @index.prefix('pay_')
+    async def pay_any(callback):
+        return 'pay_any'
+
+    @index.prefix('pay_admin_', lambda callback: callback.from_user == 1)
+    async def pay_admin(callback):
+        return 'pay_admin'
+
+    return index
+
+def _route(index, data, user=2):
+    async def main():
+        callback = SimpleNamespace(data=data, from_user=user)
+        matched = await index._match(callback)
+        if not matched:
+            return None
+        return await index._dispatch(callback, **matched)
+    return asyncio.run(main())
+
+def test_exact_value_wins_over_prefix():
+    index = _index()
+    assert _route(index, 'menu') == 'menu'
+    assert _route(index, 'pay_1month') == 'pay_known'
+
+def test_longest_prefix_is_checked_first():
+    assert _route(_index(), 'pay_admin_x', user=1) == 'pay_admin'
+
+def test_failed_filter_falls_back_to_shorter_prefix():
+    assert _route(_index(), 'pay_admin_x', user=2) == 'pay_any'
+
+def test_unknown_data_is_left_for_other_routers():
+    index = _index()
+    assert _route(index, 'unknown') is None
+    assert _route(index, None) is None
+
+def test_routes_are_listed_in_check_order():
+    kinds = [(kind, value) for kind, value, entry in _index().routes()]
+    assert kinds == [('exact', 'menu'), ('exact', 'pay_1month'), ('exact', 'pay_3months'),
+                     ('prefix', 'pay_admin_'), ('prefix', 'pay_')]
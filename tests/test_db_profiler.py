@@ -0,0 +1,43 @@
+import time
+
+import db_profiler
+
+class _Cursor:
+    """Только то, что нужно _after: rowcount и соединение с explain"""
+    _after = db_profiler.ProfilingCursor._after
+    rowcount = 1
+
+    class connection:
+        @staticmethod
+        def explain(query, vars=None):
+            return 'plan'
+
+def test_fingerprint_replaces_literals_and_params():
+    query = "SELECT * FROM users WHERE id = 42 AND name = 'Ann' AND x IN (%s, %s)"
+    assert db_profiler.fingerprint(query) == "SELECT * FROM users WHERE id = ? AND name = ? AND x IN (?)"
+
+def test_fast_query_is_counted_without_fingerprint(monkeypatch):
+    db_profiler.reset()
+    monkeypatch.setattr(db_profiler, 'PROFILE_ALL_QUERIES', False)
+    monkeypatch.setattr(db_profiler, 'SLOW_QUERY_MS', 10_000)
+    with db_profiler.profile_scope('test') as scope:
+        _Cursor()._after('SELECT 1', None, time.perf_counter())
+    assert db_profiler.total_queries() == 1
+    assert scope.queries == 1
+    assert db_profiler.top_queries() == []
+
+def test_slow_query_is_fingerprinted(monkeypatch):
+    db_profiler.reset()
+    monkeypatch.setattr(db_profiler, 'PROFILE_ALL_QUERIES', False)
+    monkeypatch.setattr(db_profiler, 'SLOW_QUERY_MS', 0)
+    _Cursor()._after('SELECT 1', None, time.perf_counter())
+    [(fp, stats)] = db_profiler.top_queries()
+    assert fp == 'SELECT ?'
+    assert stats['calls'] == 1
+
+def test_profile_all_queries_fingerprints_fast_queries(monkeypatch):
+    db_profiler.reset()
+    monkeypatch.setattr(db_profiler, 'PROFILE_ALL_QUERIES', True)
+    monkeypatch.setattr(db_profiler, 'SLOW_QUERY_MS', 10_000)
+    _Cursor()._after('SELECT 1', None, time.perf_counter())
+    assert len(db_profiler.top_queries()) == 1
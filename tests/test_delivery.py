@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import (TelegramBadRequest, TelegramEntityTooLarge, TelegramForbiddenError,
+                                TelegramNetworkError, TelegramNotFound, TelegramRetryAfter,
+                                TelegramServerError)
+from aiogram.methods import SendMessage
+
+import delivery
+import rate_limiter
+
+METHOD = SendMessage(chat_id=1, text='hi')
+
+class FakeBot:
+    """Бот, который по очереди бросает ошибки из errors, а потом отправляет"""
+
+    def __init__(self, *errors, bot_id=1):
+        self.id = bot_id
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, user_id, text, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(user_id)
+        return SimpleNamespace(message_id=len(self.sent))
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(delivery, 'undeliverable', delivery.SuppressionIndex())
+    monkeypatch.setattr(delivery, '_ledger', [])
+
+@pytest.mark.parametrize('error, outcome', [
+    (TelegramRetryAfter(method=METHOD, message='Too Many Requests', retry_after=3), delivery.RATE_LIMITED),
+    (TelegramForbiddenError(method=METHOD, message='Forbidden: bot was blocked by the user'), delivery.BLOCKED),
+    (TelegramNotFound(method=METHOD, message='Not Found'), delivery.GONE),
+    (TelegramBadRequest(method=METHOD, message='Bad Request: chat not found'), delivery.GONE),
+    (TelegramBadRequest(method=METHOD, message="Bad Request: can't parse entities"), delivery.BAD_REQUEST),
+    (TelegramEntityTooLarge(method=METHOD, message='Request Entity Too Large'), delivery.BAD_REQUEST),
+    (TelegramServerError(method=METHOD, message='Bad Gateway'), delivery.TRANSIENT),
+    (TelegramNetworkError(method=METHOD, message='timeout'), delivery.TRANSIENT),
+    (RuntimeError('boom'), delivery.FAILED),
+])
+def test_classify_send_error(error, outcome):
+    assert delivery.classify_send_error(error) == outcome
+
+def test_blocked_user_is_suppressed(fake_db):
+    bot = FakeBot(TelegramForbiddenError(method=METHOD, message='Forbidden: bot was blocked by the user'))
+    assert asyncio.run(delivery.send(bot, fake_db, 7, 'hi')) == delivery.BLOCKED
+    assert 7 in delivery.undeliverable
+    assert 'INSERT INTO undeliverable' in fake_db.queries[0][0]
+
+def test_transient_error_is_not_retried_or_suppressed(fake_db):
+    bot = FakeBot(TelegramServerError(method=METHOD, message='Bad Gateway'))
+    assert asyncio.run(delivery.send(bot, fake_db, 7, 'hi')) == delivery.TRANSIENT
+    assert bot.sent == []
+    assert 7 not in delivery.undeliverable
+    assert fake_db.queries == []
+
+def test_flood_control_is_retried(fake_db):
+    bot = FakeBot(TelegramRetryAfter(method=METHOD, message='Too Many Requests', retry_after=0))
+    assert asyncio.run(delivery.send(bot, fake_db, 7, 'hi')) == delivery.SENT
+    assert bot.sent == [7]
+
+def test_suppression_index_membership():
+    index = delivery.SuppressionIndex([5, 1, 3, 3])
+    assert len(index) == 3
+    assert [user_id in index for user_id in (0, 1, 2, 3, 5, 6)] == [False, True, False, True, True, False]
+
+def test_suppression_index_add_and_discard_keep_order():
+    index = delivery.SuppressionIndex([10, 30])
+    for user_id in (20, 40, 5, 20):
+        index.add(user_id)
+    index.discard(30)
+    index.discard(99)
+    assert list(index._ids) == [5, 10, 20, 40]
+
+def test_suppression_index_replace_and_reachable():
+    index = delivery.SuppressionIndex([1])
+    index.replace([2, 4])
+    users = [{'user_id': user_id} for user_id in (1, 2, 3, 4)]
+    assert index.reachable(users) == [{'user_id': 1}, {'user_id': 3}]
+
+def test_suppressed_user_is_skipped_without_sending(fake_db):
+    delivery.undeliverable.add(7)
+    bot = FakeBot()
+    assert asyncio.run(delivery.send(bot, fake_db, 7, 'hi')) == delivery.SKIPPED
+    assert bot.sent == []
+
+def test_load_suppressed_replaces_index(fake_db):
+    delivery.undeliverable.add(1)
+    fake_db.rows = [{'user_id': 2}, {'user_id': 3}]
+    assert delivery.load_suppressed(fake_db) == 2
+    assert 1 not in delivery.undeliverable and 3 in delivery.undeliverable
+
+def test_restore_makes_user_reachable(fake_db):
+    delivery.undeliverable.add(7)
+    delivery.restore(fake_db, 7)
+    assert 7 not in delivery.undeliverable
+    assert fake_db.queries == [('DELETE FROM undeliverable WHERE user_id = %s', (7,))]
+
+def test_send_is_recorded_in_ledger(fake_db):
+    bot = FakeBot(TelegramRetryAfter(method=METHOD, message='Too Many Requests', retry_after=0))
+    asyncio.run(delivery.send(bot, fake_db, 7, 'hi', kind='funnel'))
+    [(tenant_id, kind, user_id, message_id, enqueued_at, sent_at, outcome, retries)] = delivery._ledger
+    assert (tenant_id, kind, user_id, message_id, outcome, retries) == (
+        'default', 'funnel', 7, 1, delivery.SENT, 1)
+    assert enqueued_at <= sent_at
+
+def test_flush_ledger_writes_all_rows(fake_db):
+    for user_id in (1, 2, 3):
+        delivery._record('default', 'message', user_id, None, None, None, delivery.SENT, 0)
+    assert delivery.flush_ledger(fake_db) == 3
+    assert delivery._ledger == []
+    assert b'INSERT INTO delivery_ledger' in fake_db.queries[0][0]
+    assert fake_db.commits == 1
+
+def test_failed_flush_keeps_rows_before_new_ones(fake_db):
+    delivery._record('default', 'message', 1, None, None, None, delivery.SENT, 0)
+    fake_db.fail = RuntimeError('db down')
+    with pytest.raises(RuntimeError):
+        delivery.flush_ledger(fake_db)
+    delivery._record('default', 'message', 2, None, None, None, delivery.SENT, 0)
+    assert [row[2] for row in delivery._ledger] == [1, 2]
+
+def test_ledger_buffer_drops_oldest_rows(monkeypatch):
+    monkeypatch.setattr(delivery, 'LEDGER_MAX_BUFFER', 2)
+    for user_id in (1, 2, 3):
+        delivery._record('default', 'message', user_id, None, None, None, delivery.SENT, 0)
+    assert [row[2] for row in delivery._ledger] == [2, 3]
+
+def test_flood_control_pauses_only_the_sending_bot(fake_db, monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setattr(delivery, 'SEND_ATTEMPTS', 1)
+    flooded = FakeBot(TelegramRetryAfter(method=METHOD, message='Too Many Requests', retry_after=60))
+    other = FakeBot(bot_id=2)
+    assert asyncio.run(delivery.send(flooded, fake_db, 7, 'hi')) == delivery.RATE_LIMITED
+    assert asyncio.run(asyncio.wait_for(delivery.send(other, fake_db, 7, 'hi'), 1)) == delivery.SENT
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+import exporter
+import tenants
+
+def test_parse_defaults():
+    assert exporter.parse_export_args(None) == ('stats', None, None, False)
+
+def test_parse_table_dates_and_gzip():
+    assert exporter.parse_export_args('events 2024-01-01 2024-01-31 gz') == (
+        'events', date(2024, 1, 1), date(2024, 1, 31), True)
+
+def test_parse_single_date_is_lower_bound():
+    assert exporter.parse_export_args('2024-03-05 payments') == (
+        'payments', date(2024, 3, 5), None, False)
+
+@pytest.mark.parametrize('args', ['2024-01-01 2024-01-02 2024-01-03', 'unknown', '2024-13-01'])
+def test_parse_rejects_bad_args(args):
+    with pytest.raises(ValueError):
+        exporter.parse_export_args(args)
+
+def test_build_query_filters_by_current_tenant():
+    query, params = exporter.build_query('users')
+    assert 'WHERE tenant_id = %(tenant)s' in query
+    assert 'created_at' not in query.split('WHERE')[1].split('ORDER')[0]
+    assert params['tenant'] == tenants.DEFAULT_TENANT
+
+def test_build_query_date_range_is_inclusive():
+    query, params = exporter.build_query('events', date(2024, 1, 1), date(2024, 1, 31), tenant_id='club2')
+    assert 'created_at >= %(date_from)s' in query
+    assert "created_at < %(date_to)s::date + INTERVAL '1 day'" in query
+    assert params == {'date_from': date(2024, 1, 1), 'date_to': date(2024, 1, 31), 'tenant': 'club2'}
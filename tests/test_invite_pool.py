@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import invite_pool
+
+class FakeBot:
+    def __init__(self):
+        self.created = []
+
+    async def create_chat_invite_link(self, chat_id, member_limit=None, expire_date=None):
+        self.created.append((chat_id, member_limit, expire_date))
+        return SimpleNamespace(invite_link=f'https://t.me/+new{len(self.created)}')
+
+@pytest.fixture(autouse=True)
+def pool_stats(monkeypatch):
+    monkeypatch.setattr(invite_pool, 'stats', dict.fromkeys(invite_pool.stats, 0))
+    return invite_pool.stats
+
+def test_link_classes_follow_tariffs():
+    assert invite_pool.link_class('trial') == '7d'
+    assert invite_pool.link_class('forever') == 'forever'
+    assert invite_pool.link_classes()['forever'] is None
+
+def test_claim_takes_fresh_link_of_tariff_class(fake_db):
+    fake_db.rows = [{'invite_link': 'https://t.me/+pooled'}]
+    assert invite_pool.claim_link(fake_db, -100, 'trial', 7) == 'https://t.me/+pooled'
+    [(query, params)] = fake_db.queries
+    assert 'FOR UPDATE SKIP LOCKED' in query
+    user_id, claimed_at, chat_id, link_class, fresh_since = params
+    assert (user_id, chat_id, link_class) == (7, '-100', '7d')
+    assert datetime.now() - invite_pool.INVITE_MAX_AGE - fresh_since < timedelta(seconds=5)
+    assert fake_db.commits == 1
+
+def test_claim_from_empty_pool(fake_db):
+    assert invite_pool.claim_link(fake_db, -100, 'trial', 7) is None
+
+def test_get_invite_link_uses_pool(fake_db, pool_stats):
+    fake_db.rows = [{'invite_link': 'https://t.me/+pooled'}]
+    bot = FakeBot()
+    link = asyncio.run(invite_pool.get_invite_link(bot, fake_db, -100, 'trial', 7))
+    assert link == 'https://t.me/+pooled'
+    assert bot.created == []
+    assert pool_stats['claimed'] == 1
+
+def test_get_invite_link_creates_link_when_pool_is_empty(fake_db, pool_stats):
+    bot = FakeBot()
+    link = asyncio.run(invite_pool.get_invite_link(bot, fake_db, -100, '1month', 7))
+    assert link == 'https://t.me/+new1'
+    [(chat_id, member_limit, expire_date)] = bot.created
+    assert (chat_id, member_limit) == (-100, 1)
+    assert timedelta(days=29) < expire_date - datetime.now() <= timedelta(days=30)
+    assert pool_stats['fallback'] == 1
+
+def test_get_invite_link_survives_db_failure(fake_db, pool_stats):
+    fake_db.fail = RuntimeError('db down')
+    bot = FakeBot()
+    link = asyncio.run(invite_pool.get_invite_link(bot, fake_db, -100, 'forever', 7))
+    assert link == 'https://t.me/+new1'
+    assert bot.created[0][2] is None
+    assert pool_stats['fallback'] == 1
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import rate_limiter
+from rate_limiter import TokenBucket
+
+def _timed(coro_factory):
+    async def main():
+        started = time.monotonic()
+        await coro_factory()
+        return time.monotonic() - started
+    return asyncio.run(main())
+
+def test_burst_is_served_immediately():
+    bucket = TokenBucket(rate=10, burst=5)
+
+    async def take():
+        for _ in range(5):
+            await bucket.acquire()
+
+    assert _timed(take) < 0.05
+
+def test_rate_is_enforced_after_burst():
+    bucket = TokenBucket(rate=50, burst=1)
+
+    async def take():
+        for _ in range(11):
+            await bucket.acquire()
+
+    # Первый токен из запаса, остальные 10 - по 20 мс
+    assert 0.18 < _timed(take) < 0.5
+
+def test_pause_blocks_until_it_ends():
+    bucket = TokenBucket(rate=1000, burst=5)
+    bucket.pause(0.2)
+    assert 0.18 < _timed(bucket.acquire) < 0.4
+
+def test_shorter_pause_does_not_shorten_longer_one():
+    bucket = TokenBucket(rate=1000, burst=5)
+    bucket.pause(0.2)
+    bucket.pause(0.01)
+    assert _timed(bucket.acquire) > 0.18
+
+def test_each_bot_has_its_own_limiter(monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    first, second = SimpleNamespace(id=1), SimpleNamespace(id=2)
+    assert rate_limiter.send_limiter(first) is rate_limiter.send_limiter(first)
+    assert rate_limiter.send_limiter(first) is not rate_limiter.send_limiter(second)
+
+    # Пауза одного бота не задерживает отправки другого
+    rate_limiter.send_limiter(first).pause(5)
+    assert _timed(rate_limiter.send_limiter(second).acquire) < 0.05
@@ -0,0 +1,25 @@
+import scheduler
+
+def _job(**kwargs):
+    return scheduler.Job('test', None, interval=600, jitter=0, **kwargs)
+
+def test_interval_without_failures():
+    assert _job().next_delay() == 600
+
+def test_backoff_grows_after_failures():
+    job = _job(backoff_base=30)
+    delays = []
+    for failures in (1, 2, 3):
+        job.failures = failures
+        delays.append(job.next_delay())
+    assert delays == [30, 60, 120]
+
+def test_backoff_is_capped_by_interval():
+    job = _job(backoff_base=30)
+    job.failures = 10
+    assert job.next_delay() == 600
+
+def test_jitter_stays_within_bounds():
+    job = scheduler.Job('test', None, interval=100, jitter=0.1)
+    for _ in range(200):
+        assert 90 <= job.next_delay() <= 110
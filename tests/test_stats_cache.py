@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+from stats_cache import StatsCache
+
+def test_concurrent_requests_share_one_computation():
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    async def main():
+        cache = StatsCache(ttl=60)
+        waiting = [asyncio.create_task(cache.get('default:stats', compute)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*waiting)
+
+    results = asyncio.run(main())
+    assert [value for value, age in results] == [42] * 5
+    assert len(calls) == 1
+
+def test_value_is_reused_within_ttl_and_recomputed_after():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        cache = StatsCache(ttl=60)
+        first, _ = await cache.get('default:stats', compute)
+        second, age = await cache.get('default:stats', compute)
+        cache.ttl = 0
+        third, _ = await cache.get('default:stats', compute)
+        return first, second, age, third
+
+    first, second, age, third = asyncio.run(main())
+    assert (first, second, third) == (1, 1, 2)
+    assert age >= 0
+
+def test_failed_computation_is_not_cached():
+    outcomes = [RuntimeError('db down'), 7]
+
+    def compute():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def main():
+        cache = StatsCache(ttl=60)
+        try:
+            await cache.get('default:stats', compute)
+        except RuntimeError:
+            pass
+        return await cache.get('default:stats', compute)
+
+    assert asyncio.run(main())[0] == 7
+
+def test_invalidate_by_prefix_keeps_other_clubs():
+    async def main():
+        cache = StatsCache(ttl=60)
+        for key in ('default:stats', 'default:alltime', 'club2:stats'):
+            await cache.get(key, lambda: key)
+        cache.invalidate(prefix='default:')
+        return set(cache._entries)
+
+    assert asyncio.run(main()) == {'club2:stats'}
+
+def test_invalidate_key_and_all():
+    async def main():
+        cache = StatsCache(ttl=60)
+        for key in ('default:stats', 'club2:stats'):
+            await cache.get(key, lambda: key)
+        cache.invalidate('default:stats')
+        left = set(cache._entries)
+        cache.invalidate()
+        return left, set(cache._entries)
+
+    assert asyncio.run(main()) == ({'club2:stats'}, set())
@@ -0,0 +1,42 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import tenants
+
+CLUB2 = {'id': 'club2', 'bot_token': '456:def', 'channel_id': -100, 'admin_ids': ['2']}
+
+def test_default_club_only():
+    assert list(tenants.load_tenants(None)) == [tenants.DEFAULT_TENANT]
+
+def test_extra_club_from_json():
+    club = tenants.load_tenants(json.dumps([CLUB2]))['club2']
+    assert (club.bot_token, club.channel_id, club.admin_ids) == ('456:def', '-100', frozenset({2}))
+    assert club.provider_token == tenants.YOOKASSA_PROVIDER_TOKEN
+
+@pytest.mark.parametrize('clubs', [
+    [CLUB2, dict(CLUB2, bot_token='789:ghi')],
+    [dict(CLUB2, id=tenants.DEFAULT_TENANT)],
+    [dict(CLUB2, bot_token=tenants.BOT_TOKEN)],
+])
+def test_duplicate_ids_and_tokens_are_rejected(clubs):
+    with pytest.raises(ValueError):
+        tenants.load_tenants(json.dumps(clubs))
+
+def test_unknown_bot_falls_back_to_default_club():
+    assert tenants.for_bot(SimpleNamespace(id=-1)).tenant_id == tenants.DEFAULT_TENANT
+
+def test_bound_bot_resolves_to_its_club(monkeypatch):
+    club = tenants.Tenant('club2', '456:def', '-100', [2], None)
+    bot = SimpleNamespace(id=456)
+    monkeypatch.setattr(tenants, '_by_bot_id', {})
+    tenants.bind(club, bot)
+    assert tenants.for_bot(bot) is club
+    assert club.bot is bot
+
+def test_use_sets_current_club_for_the_block():
+    club = tenants.Tenant('club2', '456:def', '-100', [2], None)
+    with tenants.use(club):
+        assert tenants.current() is club
+    assert tenants.current().tenant_id == tenants.DEFAULT_TENANT
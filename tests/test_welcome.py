@@ -0,0 +1,36 @@
+import pytest
+
+import jobs
+
+@pytest.fixture(autouse=True)
+def welcome_buffer(monkeypatch, fake_db):
+    monkeypatch.setattr(jobs, 'get_db_connection', fake_db)
+    jobs._welcome_sent_buffer.clear()
+    yield jobs._welcome_sent_buffer
+    jobs._welcome_sent_buffer.clear()
+
+def test_flush_marks_all_buffered_users_in_one_query(welcome_buffer, fake_db):
+    welcome_buffer.extend([1, 2, 3])
+    jobs.flush_welcome_marks()
+    assert welcome_buffer == []
+    [(query, params)] = fake_db.queries
+    assert 'UPDATE welcome_messages' in query
+    assert params == ([1, 2, 3],)
+    assert fake_db.commits == 1
+
+def test_flush_without_marks_does_not_touch_db(fake_db):
+    jobs.flush_welcome_marks()
+    assert fake_db.queries == []
+
+def test_failed_flush_keeps_marks_in_order(welcome_buffer, fake_db):
+    welcome_buffer.extend([1, 2])
+    fake_db.fail_execute = RuntimeError('db down')
+    with pytest.raises(RuntimeError):
+        jobs.flush_welcome_marks()
+    # Отметки, добавленные после сбоя, идут за возвращёнными
+    welcome_buffer.append(3)
+    assert welcome_buffer == [1, 2, 3]
+
+    fake_db.fail_execute = None
+    jobs.flush_welcome_marks()
+    assert fake_db.queries[-1][1] == ([1, 2, 3],)
@@ -0,0 +1,105 @@
+"""
+Защита от повторных нажатий кнопок
+Outer-middleware callback_query, до поиска хендлера:
+- такой же callback того же пользователя, пока первый ещё обрабатывается, -
+  склеивается с ним (не выполняется второй раз);
+- повтор той же кнопки в течение THROTTLE_WINDOW секунд после обработки -
+  отбрасывается;
+- кнопки с побочными эффектами (пробный период, счёт на оплату) одного
+  пользователя выполняются строго по очереди, а их повтор отбрасывается
+  в течение EXCLUSIVE_WINDOW.
+
+Отброшенным нажатиям не отвечаем: это был бы лишний вызов Bot API, а часики
+на кнопке клиент снимет сам
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+THROTTLE_WINDOW = float(os.getenv('THROTTLE_WINDOW', 1.0))
+EXCLUSIVE_WINDOW = float(os.getenv('THROTTLE_EXCLUSIVE_WINDOW', 5.0))
+# Сколько недавних нажатий хранить, прежде чем вычищать устаревшие
+PRUNE_AT = 10000
+
+class CallbackThrottle:
+    """Склейка, антидребезг и очередь кнопок с побочными эффектами по пользователю"""
+
+    def __init__(self, window=THROTTLE_WINDOW, exclusive_window=EXCLUSIVE_WINDOW):
+        self.window = window
+        self.exclusive_window = exclusive_window
+        self._exclusive = set()
+        self._inflight = set()
+        self._recent = {}
+        self._locks = {}
+        self.stats = {'passed': 0, 'coalesced': 0, 'debounced': 0, 'lock_waits': 0}
+
+    def exclusive(self, *values):
+        """callback_data, чьи хендлеры меняют состояние (БД, счета) и не должны идти параллельно"""
+        self._exclusive.update(values)
+
+    async def middleware(self, handler, event, data):
+        if event.data is None or event.from_user is None:
+            return await handler(event, data)
+        user_id = event.from_user.id
+        key = (user_id, event.data)
+
+        if key in self._inflight:
+            self.stats['coalesced'] += 1
+            return None
+        exclusive = event.data in self._exclusive
+        finished = self._recent.get(key)
+        window = self.exclusive_window if exclusive else self.window
+        if finished is not None and time.monotonic() - finished < window:
+            self.stats['debounced'] += 1
+            return None
+
+        self.stats['passed'] += 1
+        self._inflight.add(key)
+        try:
+            if not exclusive:
+                return await handler(event, data)
+            async with self._user_lock(user_id):
+                return await handler(event, data)
+        finally:
+            self._inflight.discard(key)
+            self._remember(key)
+
+    @asynccontextmanager
+    async def _user_lock(self, user_id):
+        """Блокировка пользователя; убирается из словаря, когда её никто не ждёт"""
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        elif entry[0].locked():
+            self.stats['lock_waits'] += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(user_id, None)
+
+    def _remember(self, key):
+        now = time.monotonic()
+        self._recent[key] = now
+        if len(self._recent) > PRUNE_AT:
+            horizon = now - max(self.window, self.exclusive_window)
+            self._recent = {k: t for k, t in self._recent.items() if t >= horizon}
+
+    def setup(self, dp):
+        dp.callback_query.outer_middleware(self.middleware)
+
+    def format_report(self):
+        stats = self.stats
+        suppressed = stats['coalesced'] + stats['debounced']
+        return (f"🛡 <b>Повторные нажатия</b>\n"
+                f"Обработано: {stats['passed']}, отброшено: {suppressed} "
+                f"(склеено {stats['coalesced']}, антидребезг {stats['debounced']})\n"
+                f"Ожидали очереди пользователя: {stats['lock_waits']}\n")
+
+# Один на процесс
+callback_throttle = CallbackThrottle()